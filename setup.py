@@ -26,6 +26,9 @@ setup(
     entry_points={"console_scripts": ["xfind = xfind.__main__:main"]},
     install_requires=install_requires,
     tests_require=tests_require,
-    extras_require={"test": tests_require},  # to make pip happy
+    extras_require={
+        "test": tests_require,  # to make pip happy
+        "zstd": ["zstandard"],
+    },
     zip_safe=False,  # to make mypy happy
 )
@@ -0,0 +1,335 @@
+"""
+Benchmarks of the stages of a run, on synthetic trees generated in a temporary
+directory:
+
+- walk: `iglob_with_omits` over deep, wide and large trees, with and without
+  many omit patterns, and with a warm walk cache
+- match: omit pattern matching alone, over generated paths
+- render: `CommandTemplate.render` alone
+- dispatch: `run()` end to end, with a no-op command, on each engine
+
+Usage, from the repo root:
+
+    python test/bench.py --scale small --out bench.json
+    python test/bench.py --scale small --compare bench.json
+
+Each result is the best of `--repeat` runs. With `--compare`, results slower
+than the baseline by more than `--threshold` are reported, and the exit
+status is 1. The `full` scale generates over a million entries; allow a few
+minutes and a few GB of inodes.
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from functools import partial
+import gc
+import json
+import logging
+import os
+import os.path
+import platform
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from xfind.__main__ import APP_NAME, iglob_with_omits, run  # noqa: E402
+from xfind.adapter.walk_cache import WalkCache  # noqa: E402
+from xfind.model.config import Config  # noqa: E402
+from xfind.model.template import CommandTemplate  # noqa: E402
+from xfind.util.fnmatch_ import PatternSet  # noqa: E402
+
+SCALES: Dict[str, Dict[str, int]] = {
+    # files in one dir; depth of chain; fanout and levels of large tree;
+    # number of omit patterns; number of paths to match / render; dispatch files
+    "tiny": dict(
+        wide=200, deep=20, fanout=3, levels=3, omits=20, paths=2000, tasks=20
+    ),
+    "small": dict(
+        wide=20_000, deep=200, fanout=8, levels=4, omits=200, paths=100_000, tasks=500
+    ),
+    "full": dict(
+        wide=200_000,
+        deep=1000,
+        fanout=10,
+        levels=5,
+        omits=1000,
+        paths=1_000_000,
+        tasks=5000,
+    ),
+}
+
+FILES_PER_DIR = 10
+
+
+class Result(NamedTuple):
+    name: str
+    n: int
+    seconds: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "n": self.n,
+            "seconds": self.seconds,
+            "per_second": self.n / self.seconds if self.seconds > 0 else None,
+        }
+
+
+def main(argv: List[str] = sys.argv[1:]):
+    cli = ArgumentParser(description="xfind benchmarks")
+    cli.add_argument("--scale", choices=list(SCALES), default="small")
+    cli.add_argument("--repeat", type=int, default=3)
+    cli.add_argument("--only", help="Run only benchmarks whose name starts with this")
+    cli.add_argument("--out", help="Write results as JSON to this file")
+    cli.add_argument("--compare", help="Compare with results from this JSON file")
+    cli.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Fraction slower than --compare that counts as a regression",
+    )
+    cli.add_argument("--tmp-dir", help="Where to generate trees (default: system)")
+    args = cli.parse_args(argv)
+
+    report = run_benchmarks(
+        SCALES[args.scale], repeat=args.repeat, only=args.only, tmp_dir=args.tmp_dir
+    )
+    report["scale"] = args.scale
+
+    for r in report["results"]:
+        print(
+            f"{r['name']:<32} {r['n']:>10} in {r['seconds']:8.3f}s "
+            f"({r['per_second'] or 0:,.0f}/s)"
+        )
+    if args.out is not None:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare is not None:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+def run_benchmarks(
+    scale: Dict[str, int],
+    *,
+    repeat: int = 3,
+    only: Optional[str] = None,
+    tmp_dir: Optional[str] = None,
+) -> Dict[str, Any]:
+    results: List[Result] = []
+
+    def bench(name: str, n: int, fn: Callable[[], Any]):
+        if only is not None and not name.startswith(only):
+            return
+        results.append(Result(name, n, best_of(repeat, fn)))
+
+    with TemporaryDirectory(prefix="xfind-bench-", dir=tmp_dir) as root:
+        wide = os.path.join(root, "wide")
+        deep = os.path.join(root, "deep")
+        large = os.path.join(root, "large")
+        tasks = os.path.join(root, "tasks")
+        n_wide = make_wide(wide, scale["wide"])
+        n_deep = make_deep(deep, scale["deep"])
+        n_large = make_large(large, scale["fanout"], scale["levels"])
+        n_tasks = make_wide(tasks, scale["tasks"])
+        omits = omit_patterns(scale["omits"])
+
+        for name, tree, n in [
+            ("walk.wide", wide, n_wide),
+            ("walk.deep", deep, n_deep),
+            ("walk.large", large, n_large),
+        ]:
+            bench(name, n, partial(walk, tree, []))
+        bench("walk.large.omits", n_large, lambda: walk(large, omits))
+        bench("walk.large.parallel", n_large, lambda: walk(large, [], workers=8))
+        cache = WalkCache(os.path.join(root, "walk-cache.sqlite"))
+        age_dirs(large)  # else too recently changed to cache
+        walk(large, [], cache=cache)  # warm it
+        bench("walk.large.cached", n_large, lambda: walk(large, [], cache=cache))
+        cache.close()
+
+        paths = [
+            os.path.join(large, *(f"d{j}" for j in range(i % 6)), f"f{i}.txt")
+            for i in range(scale["paths"])
+        ]
+        compiled = PatternSet(os.path.join(large, o) for o in omits)
+        bench("match.omits", len(paths), lambda: sum(map(compiled.match, paths)))
+
+        command = 'echo "{file_name}" "{base_name}" "{ext_name}" "{utc_timestamp}"'
+        template = CommandTemplate(command, time())
+        bench(
+            "render.command",
+            len(paths),
+            lambda: [template.render(p) for p in paths],
+        )
+
+        for engine in ("thread", "asyncio"):
+            bench(
+                f"dispatch.{engine}",
+                n_tasks,
+                partial(dispatch, tasks, engine),
+            )
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": scale,
+        "results": [r.to_dict() for r in results],
+    }
+
+
+def best_of(repeat: int, fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(max(repeat, 1)):
+        gc.collect()
+        t = perf_counter()
+        fn()
+        best = min(best, perf_counter() - t)
+    return best
+
+
+def walk(
+    root: str,
+    omits: List[str],
+    workers: int = 1,
+    cache: Optional[WalkCache] = None,
+) -> int:
+    return sum(
+        1
+        for _ in iglob_with_omits(
+            os.path.join(root, "**", "*"),
+            PatternSet(os.path.join(root, o) for o in omits),
+            find_files=True,
+            find_dirs=False,
+            workers=workers,
+            scandir=None if cache is None else cache.scandir,
+        )
+    )
+
+
+def dispatch(root: str, engine: str):
+    logger = logging.getLogger(APP_NAME)
+    level = logger.level
+    logger.setLevel(logging.WARNING)  # measure dispatch, not logging
+    try:
+        run(
+            Config(
+                root_dir=root,
+                pattern="*",
+                command="true" if sys.platform != "win32" else "cmd /c rem",
+                concurrency=8,
+                engine=engine,
+            ),
+            time(),
+        )
+    finally:
+        logger.setLevel(level)
+
+
+# Tree generators: each returns the number of files created
+
+
+def make_wide(root: str, n: int) -> int:
+    os.makedirs(root)
+    for i in range(n):
+        touch(os.path.join(root, f"f{i}.txt"))
+    return n
+
+
+def make_deep(root: str, depth: int) -> int:
+    d = root
+    for i in range(depth):
+        d = os.path.join(d, f"d{i}")
+        os.makedirs(d)
+        for j in range(FILES_PER_DIR):
+            touch(os.path.join(d, f"f{j}.txt"))
+    return depth * FILES_PER_DIR
+
+
+def make_large(root: str, fanout: int, levels: int) -> int:
+    """A balanced tree, with `fanout` subdirs and FILES_PER_DIR files per dir"""
+    n = 0
+    dirs = [root]
+    for level in range(levels + 1):
+        next_dirs: List[str] = []
+        for d in dirs:
+            os.makedirs(d, exist_ok=True)
+            for j in range(FILES_PER_DIR):
+                touch(os.path.join(d, f"f{j}.txt"))
+            n += FILES_PER_DIR
+            if level < levels:
+                next_dirs.extend(os.path.join(d, f"d{k}") for k in range(fanout))
+        dirs = next_dirs
+    return n
+
+
+def age_dirs(root: str):
+    """Set directory mtimes an hour back"""
+    t = time() - 3600
+    for d, _, _ in os.walk(root):
+        os.utime(d, (t, t))
+
+
+def omit_patterns(n: int) -> List[str]:
+    """A mix of subtree, extension and name patterns, most matching nothing"""
+    kinds = [
+        lambda i: f"**/skip{i}/**",
+        lambda i: f"*.tmp{i}",
+        lambda i: f"**/d{i % 10}/f{i}.txt",
+        lambda i: f"**/cache{i}*",
+    ]
+    return [kinds[i % len(kinds)](i) for i in range(n)]
+
+
+def touch(path: str):
+    os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o644))
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Descriptions of the results slower than baseline by more than threshold"""
+    before = {r["name"]: r for r in baseline["results"]}
+    out = []
+    for r in current["results"]:
+        b = before.get(r["name"])
+        if b is None or b["n"] != r["n"] or b["seconds"] <= 0:
+            continue
+        ratio = r["seconds"] / b["seconds"]
+        if ratio > 1 + threshold:
+            out.append(
+                f"{r['name']}: {r['seconds']:.3f}s vs {b['seconds']:.3f}s "
+                f"({ratio:.2f}x)"
+            )
+    return out
+
+
+if __name__ == "__main__":
+    main()
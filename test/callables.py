@@ -0,0 +1,27 @@
+"""Functions for test_call.py to call, by `callables:name`"""
+
+import os
+import sys
+
+
+def mark(data):
+    """Write the worker pid next to the file"""
+    with open(data["file_name"] + ".done", "w") as f:
+        f.write(str(os.getpid()))
+
+
+def fail_some(data):
+    if data["base_name"].startswith("fail"):
+        print("about to fail")
+        raise RuntimeError(f"failed on {data['base_name']}")
+
+
+def exit_code(data):
+    return 3
+
+
+def exit_message(data):
+    sys.exit("bad input")
+
+
+not_a_function = 1
@@ -0,0 +1,96 @@
+import logging
+import os.path
+import re
+import shlex
+import sys
+
+import pytest
+
+from xfind.__main__ import main
+
+PRINT_ARGS = f"{shlex.quote(sys.executable)} -c 'import sys; print(sys.argv[1:])'"
+
+
+@pytest.fixture
+def files(tmp_path):
+    names = [f"f{i}.txt" for i in range(25)] + ["it's here.txt"]
+    for name in names:
+        (tmp_path / name).touch()
+    return (str(tmp_path), names)
+
+
+@pytest.mark.func
+def test_batch_size(files, caplog):
+    caplog.set_level(logging.DEBUG)
+    root_dir, names = files
+
+    main(
+        [
+            "-x",
+            PRINT_ARGS + " {file_names}",
+            "-n",
+            "2",
+            "--root-dir",
+            root_dir,
+            "--batch-size",
+            "10",
+        ]
+    )
+
+    running = [r.message for r in caplog.records if r.message.startswith("Running:")]
+    assert len(running) == 3
+
+    args = [
+        a
+        for r in running
+        for a in shlex.split(r[len("Running: `") : -1])[3:]
+    ]
+    assert sorted(args) == sorted(os.path.join(root_dir, n) for n in names)
+
+    last_msg = caplog.records[-1].message
+    assert re.search(f"{len(names)} total files processed", last_msg) is not None
+
+
+@pytest.mark.func
+def test_batch_max_bytes(files, caplog):
+    caplog.set_level(logging.DEBUG)
+    root_dir, names = files
+
+    main(
+        [
+            "-x",
+            PRINT_ARGS + " {file_names}",
+            "--root-dir",
+            root_dir,
+            "--batch-max-bytes",
+            "200",
+        ]
+    )
+
+    running = [r.message for r in caplog.records if r.message.startswith("Running:")]
+    assert len(running) > 3
+
+    last_msg = caplog.records[-1].message
+    assert re.search(f"{len(names)} total files processed", last_msg) is not None
+
+
+@pytest.mark.unit
+def test_batch_rejects_per_file_placeholders(files):
+    root_dir, _ = files
+    with pytest.raises(ValueError):
+        main(["-x", "echo {file_name} {file_names}", "--root-dir", root_dir])
+
+
+@pytest.mark.func
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux limit")
+def test_batch_within_one_argument(tmp_path, caplog):
+    # more than 128 KiB of names, all in one `sh -c` argument per batch
+    caplog.set_level(logging.INFO)
+    for i in range(3000):
+        (tmp_path / f"{i:04d}-{'x' * 60}.txt").touch()
+
+    main(["-x", 'sh -c "echo {file_names} | wc -c"', "--root-dir", str(tmp_path)])
+
+    successes = [r for r in caplog.records if r.message.startswith("Success")]
+    assert len(successes) > 1
+    assert "3000 succeeded, 0 failed" in caplog.text
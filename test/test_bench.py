@@ -0,0 +1,40 @@
+import json
+import os.path
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench  # noqa: E402
+
+
+@pytest.mark.unit
+def test_compare():
+    baseline = {"results": [{"name": "a", "n": 10, "seconds": 1.0}]}
+    same = {"results": [{"name": "a", "n": 10, "seconds": 1.1}]}
+    slower = {"results": [{"name": "a", "n": 10, "seconds": 1.5}]}
+    other_n = {"results": [{"name": "a", "n": 20, "seconds": 5.0}]}
+    assert bench.compare(baseline, same, 0.2) == []
+    assert len(bench.compare(baseline, slower, 0.2)) == 1
+    assert bench.compare(baseline, other_n, 0.2) == []
+
+
+@pytest.mark.unit
+def test_make_large(tmp_path):
+    n = bench.make_large(str(tmp_path / "t"), fanout=2, levels=2)
+    assert n == (1 + 2 + 4) * bench.FILES_PER_DIR
+    assert bench.walk(str(tmp_path / "t"), []) == n
+
+
+@pytest.mark.perf
+def test_bench_tiny(tmp_path):
+    out = tmp_path / "bench.json"
+    bench.main(["--scale", "tiny", "--repeat", "1", "--out", str(out)])
+    with open(out) as f:
+        report = json.load(f)
+    names = {r["name"] for r in report["results"]}
+    assert {"walk.large", "match.omits", "render.command", "dispatch.thread"} <= names
+    for r in report["results"]:
+        assert r["n"] > 0
+        assert r["seconds"] > 0
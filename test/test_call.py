@@ -0,0 +1,105 @@
+import logging
+import os
+import os.path
+import re
+import sys
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.adapter.call import load, run_callable
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def files(tmp_path):
+    for name in ["a.txt", "b.txt", "c.txt", "d.txt", "fail.txt"]:
+        (tmp_path / name).touch()
+    return tmp_path
+
+
+def call(target: str, file_name: str = "/x/a.txt"):
+    data = {"file_name": file_name, "base_name": os.path.basename(file_name)}
+    return run_callable(
+        target, data, relay_stdout=False, relay_stderr=False, tail_bytes=1024
+    )
+
+
+@pytest.mark.unit
+def test_load_errors():
+    with pytest.raises(ValueError):
+        load("callables.mark")
+    with pytest.raises(ValueError):
+        load("callables:not_a_function")
+    with pytest.raises(AttributeError):
+        load("callables:missing")
+    with pytest.raises(ImportError):
+        load("no_such_module_here:f")
+
+
+@pytest.mark.unit
+def test_run_callable_results():
+    result = call("callables:fail_some", "/x/fail.txt")
+    assert result.returncode == 1
+    assert result.args == ["callables:fail_some", "/x/fail.txt"]
+    assert str(result.stdout) == "about to fail\n"
+    assert "RuntimeError: failed on fail.txt" in str(result.stderr)
+
+    assert call("callables:fail_some").returncode == 0
+    assert call("callables:exit_code").returncode == 3
+
+    result = call("callables:exit_message")
+    assert result.returncode == 1
+    assert str(result.stderr) == "bad input\n"
+
+
+@pytest.mark.func
+def test_callable(files, caplog):
+    caplog.set_level(logging.INFO)
+    main(
+        [
+            "--callable",
+            "callables:mark",
+            "-p",
+            "*.txt",
+            "-n",
+            "2",
+            "--root-dir",
+            str(files),
+        ]
+    )
+    pids = set()
+    for name in ["a.txt", "b.txt", "c.txt", "d.txt", "fail.txt"]:
+        with open(files / f"{name}.done") as f:
+            pids.add(f.read())
+    assert 1 <= len(pids) <= 2  # workers are reused
+    assert str(os.getpid()) not in pids
+    assert re.search("5 total files processed", caplog.records[-1].message)
+
+
+@pytest.mark.func
+def test_callable_failure_logged(files, caplog):
+    caplog.set_level(logging.INFO)
+    main(
+        [
+            "--callable",
+            "callables:fail_some",
+            "-p",
+            "*.txt",
+            "--root-dir",
+            str(files),
+        ]
+    )
+    failures = [r.message for r in caplog.records if r.message.startswith("Failure")]
+    assert failures == [f"Failure (1): `callables:fail_some {files / 'fail.txt'}`"]
+    assert any("RuntimeError: failed on fail.txt" in r.message for r in caplog.records)
+    successes = [r for r in caplog.records if r.message.startswith("Success")]
+    assert len(successes) == 4
+    assert re.search("5 total files processed", caplog.records[-1].message)
+
+
+@pytest.mark.func
+def test_callable_not_importable(files):
+    with pytest.raises(ImportError):
+        main(["--callable", "no_such_module_here:f", "--root-dir", str(files)])
@@ -3,9 +3,11 @@ from itertools import chain, product
 import logging
 import os.path
 import re
+from time import monotonic, sleep
 from typing import List
 
 from xfind.__main__ import main
+from xfind.util import glob_
 
 FIXTURE_ROOT = os.path.join("test", "fixture", "test_command")
 
@@ -237,6 +239,26 @@ def test_no_omits_no_files(caplog):
     ), f"Expected log to report {expected_total} total files, was {last_msg}"
 
 
+def test_stop_after_ends_walk_without_matches(tmp_path, monkeypatch, caplog):
+    caplog.set_level(logging.INFO)
+    for i in range(40):
+        (tmp_path / f"d{i}").mkdir()
+    listed: List[str] = []
+    scandir = glob_._scandir
+
+    def _slow_scandir(dirname):
+        listed.append(dirname)
+        sleep(0.05)
+        return scandir(dirname)
+
+    monkeypatch.setattr(glob_, "_scandir", _slow_scandir)
+    t0 = monotonic()
+    main(["--stop-after", "300ms", "-p", str(tmp_path / "**" / "*.none")])
+    assert monotonic() - t0 < 1.5
+    assert len(listed) < 20
+    assert re.search("0 total files processed", caplog.records[-1].message)
+
+
 def main_sleep(
     secs, *, stop_after, glob, omits=[], find_files=True, find_dirs=True, concurrency=1
 ):
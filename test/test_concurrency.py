@@ -0,0 +1,140 @@
+import logging
+import re
+import shlex
+import sys
+from threading import Thread
+from time import sleep
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.util import concurrency
+from xfind.util.concurrency import AdjustableSemaphore, AimdController, DoneCounter
+from xfind.util.metrics import Metrics
+
+PYTHON = shlex.quote(sys.executable)
+
+
+def controller(limit: int = 4, min_limit: int = 1, max_limit: int = 16):
+    return AimdController(
+        AdjustableSemaphore(limit),
+        Metrics(),
+        min_limit=min_limit,
+        max_limit=max_limit,
+        interval=1.0,
+        on_change=lambda old, new, reason: None,
+        pressure=lambda: None,
+    )
+
+
+@pytest.fixture
+def files(tmp_path):
+    for i in range(40):
+        (tmp_path / f"f{i}.txt").touch()
+    return str(tmp_path)
+
+
+@pytest.mark.unit
+def test_done_counter():
+    done = DoneCounter()
+    assert not done.wait_for(1, timeout=0.01)
+
+    def _finish():
+        for _ in range(3):
+            sleep(0.01)
+            done.add(2)
+
+    t = Thread(target=_finish)
+    t.start()
+    assert done.wait_for(5, timeout=5)
+    t.join()
+    assert done.count == 6
+
+
+@pytest.mark.unit
+def test_semaphore_set_limit():
+    sem = AdjustableSemaphore(1)
+    assert sem.acquire(timeout=0)
+    assert not sem.acquire(timeout=0)
+
+    acquired = []
+    t = Thread(target=lambda: acquired.append(sem.acquire(timeout=5)))
+    t.start()
+    sleep(0.1)
+    sem.set_limit(2)
+    t.join()
+    assert acquired == [True]
+
+    sem.set_limit(1)
+    sem.release()
+    assert not sem.acquire(timeout=0)  # still 1 held, at the new limit
+    sem.release()
+    assert sem.acquire(timeout=0)
+
+
+@pytest.mark.unit
+def test_slow_start_then_additive():
+    c = controller(limit=2)
+    assert c.decide(2, 10.0, 2, None)[0] == 4
+    c._slow_start = False
+    assert c.decide(4, 20.0, 4, None)[0] == 5
+
+
+@pytest.mark.unit
+def test_increase_capped():
+    c = controller(limit=12, max_limit=16)
+    assert c.decide(12, 10.0, 12, None)[0] == 16
+
+
+@pytest.mark.unit
+def test_hold_when_not_busy():
+    c = controller()
+    assert c.decide(4, 10.0, 2, None)[0] == 4
+
+
+@pytest.mark.unit
+def test_decrease_on_pressure():
+    c = controller()
+    new, reason = c.decide(8, 10.0, 8, ("io", 55.0))
+    assert new == 6
+    assert reason == "io pressure 55%"
+    assert c.decide(1, 10.0, 1, ("cpu", 90.0))[0] == 1  # not below min
+
+
+@pytest.mark.unit
+def test_hold_on_moderate_pressure():
+    c = controller()
+    assert c.decide(8, 10.0, 8, ("cpu", 25.0))[0] == 8
+
+
+@pytest.mark.unit
+def test_decrease_when_throughput_falls_after_increase():
+    c = controller()
+    c.decide(4, 20.0, 4, None)
+    c._increased = True
+    new, reason = c.decide(8, 10.0, 8, None)
+    assert new == 6
+    assert "throughput fell" in reason
+
+
+@pytest.mark.func
+def test_auto_concurrency(files, caplog, monkeypatch):
+    monkeypatch.setattr(concurrency, "system_pressure", lambda: None)
+    caplog.set_level(logging.INFO)
+    main(
+        [
+            "-x",
+            f"{PYTHON} -c 'import time; time.sleep(0.2)' {{file_name}}",
+            "-n",
+            "auto",
+            "--max-concurrency",
+            "8",
+            "--auto-interval",
+            "200ms",
+            "--root-dir",
+            files,
+        ]
+    )
+    changes = [r.message for r in caplog.records if r.message.startswith("Concurrency")]
+    assert any(m.startswith("Concurrency 1 -> 2") for m in changes)
+    assert re.search("40 total files processed", caplog.records[-1].message)
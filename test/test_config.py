@@ -1,4 +1,8 @@
 import os.path
+
+import pytest
+
+from xfind.adapter.config_file import parse
 from xfind.__main__ import build_cli, args_to_config
 
 
@@ -48,5 +52,63 @@ def test_flag_specified_override():
     assert config.find_dirs == True
 
 
+def test_max_pending_default():
+    cli = build_cli()
+    args = cli.parse_args(["-c", fixture_file("defaults.toml"), "-n", "3"])
+    config, _ = args_to_config(args)
+
+    assert config.max_pending is None
+    assert config.pending_limit == 12
+
+
+def test_max_pending_not_below_concurrency():
+    cli = build_cli()
+    args = cli.parse_args(["-n", "8", "--max-pending", "2"])
+    config, _ = args_to_config(args)
+
+    assert config.pending_limit == 8
+
+
+def test_concurrency_auto():
+    cli = build_cli()
+    args = cli.parse_args(["-n", "auto", "--max-concurrency", "16"])
+    config, _ = args_to_config(args)
+
+    assert config.auto_concurrency == True
+    assert config.max_workers == 16
+    assert config.pending_limit == 64
+
+
+def test_concurrency_auto_from_file():
+    cli = build_cli()
+    args = cli.parse_args(["-c", fixture_file("auto_concurrency.toml")])
+    config, _ = args_to_config(args)
+
+    assert config.auto_concurrency == True
+    assert config.max_workers == 32
+
+
+def test_concurrency_number_overrides_auto():
+    cli = build_cli()
+    args = cli.parse_args(["-c", fixture_file("auto_concurrency.toml"), "-n", "3"])
+    config, _ = args_to_config(args)
+
+    assert config.auto_concurrency == False
+    assert config.max_workers == 3
+
+
+def test_choices_from_file():
+    config, _ = parse({"xfind": {"engine": "asyncio", "schedule": "longest-first"}})
+
+    assert config.engine == "asyncio"
+    assert config.schedule == "longest-first"
+
+
+@pytest.mark.parametrize("key", ["engine", "schedule"])
+def test_bad_choice_from_file(key):
+    with pytest.raises(ValueError, match=key):
+        parse({"xfind": {key: "bogus"}})
+
+
 def fixture_file(fname: str) -> str:
     return os.path.join(FIXTURE_ROOT, fname)
@@ -0,0 +1,159 @@
+import logging
+import os
+import re
+import shlex
+import sys
+import threading
+from time import perf_counter, sleep
+
+import pytest
+
+from xfind.__main__ import main
+
+PYTHON = shlex.quote(sys.executable)
+
+
+@pytest.fixture
+def files(tmp_path):
+    for i in range(20):
+        (tmp_path / f"f{i}.txt").touch()
+    return str(tmp_path)
+
+
+@pytest.mark.func
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_engine_processes_all(files, engine, caplog):
+    caplog.set_level(logging.DEBUG)
+    main(
+        [
+            "-x",
+            f"{PYTHON} -c \"import sys; sys.exit(sys.argv[1].endswith('3.txt'))\" "
+            "{file_name}",
+            "-n",
+            "8",
+            "--engine",
+            engine,
+            "--root-dir",
+            files,
+        ]
+    )
+
+    failures = [r for r in caplog.records if r.message.startswith("Failure (1)")]
+    assert len(failures) == 2  # f3 and f13
+
+    last_msg = caplog.records[-1].message
+    assert re.search("20 total files processed", last_msg) is not None
+
+
+@pytest.mark.func
+def test_asyncio_engine_stop_after_cancels_pending(files, caplog):
+    caplog.set_level(logging.DEBUG)
+    main(
+        [
+            "-x",
+            f"{PYTHON} -c \"import time; time.sleep(1)\"",
+            "-n",
+            "4",
+            "--engine",
+            "asyncio",
+            "--stop-after",
+            "1500ms",
+            "--root-dir",
+            files,
+        ]
+    )
+
+    cancelled = [r for r in caplog.records if r.message.startswith("Task cancelled")]
+    assert len(cancelled) > 0
+    assert all(rec.levelno < logging.WARNING for rec in caplog.records)
+
+    dur = caplog.records[-1].created - caplog.records[0].created
+    assert dur <= 3, f"Execution time was {dur} seconds, expected <= 3"
+
+    last_msg = caplog.records[-1].message
+    assert re.search("8 total files processed", last_msg) is not None
+
+
+@pytest.mark.func
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_errors_count_as_done(tmp_path, engine, caplog):
+    caplog.set_level(logging.DEBUG)
+    for i in range(2):
+        (tmp_path / f"f{i}.txt").touch()
+    t = perf_counter()
+    main(
+        [
+            *("-x", "no-such-command-xfind {file_name}"),
+            *("--engine", engine, "--stop-after", "6s"),
+            *("--root-dir", str(tmp_path)),
+        ]
+    )
+
+    # the spawn errors must not leave the run waiting for the stop time
+    assert perf_counter() - t < 3
+    last_msg = caplog.records[-1].message
+    assert re.search("2 total files processed", last_msg) is not None
+
+
+@pytest.mark.perf
+@pytest.mark.skipif(sys.platform != "linux", reason="Reads /proc/self/status")
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_engine_high_concurrency(tmp_path, engine, caplog):
+    caplog.set_level(logging.WARNING)
+    n = 400
+    for i in range(n):
+        (tmp_path / f"f{i}").touch()
+
+    sampler = Sampler()
+    sampler.start()
+    t = perf_counter()
+    main(
+        [
+            "-x",
+            "sleep 0.5",
+            "-n",
+            str(n),
+            "--engine",
+            engine,
+            "--root-dir",
+            str(tmp_path),
+        ]
+    )
+    elapsed = perf_counter() - t
+    sampler.stop()
+
+    print(
+        f"\n{engine}: {n} tasks at concurrency {n} in {elapsed:.2f}s "
+        f"({n / elapsed:.0f} tasks/s), peak threads {sampler.peak_threads}, "
+        f"peak RSS +{(sampler.peak_rss - sampler.base_rss) // 1024} MB"
+    )
+    assert elapsed < 30
+    if engine == "asyncio":
+        assert sampler.peak_threads < 10
+
+
+class Sampler(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self._stop_event = threading.Event()
+        self.base_rss = rss_kb()
+        self.peak_rss = self.base_rss
+        self.peak_threads = threading.active_count()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak_rss = max(self.peak_rss, rss_kb())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            sleep(0.01)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def rss_kb() -> int:
+    with open(f"/proc/{os.getpid()}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
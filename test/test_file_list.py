@@ -0,0 +1,83 @@
+import io
+import logging
+import re
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.adapter.file_list import read_names
+
+
+def processed(caplog) -> int:
+    m = re.search(r"(\d+) total files processed", caplog.records[-1].message)
+    assert m is not None, caplog.records[-1].message
+    return int(m[1])
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / "root"
+    for name in ["a.txt", "b.txt", "skip/c.txt", "new\nline.txt"]:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x")
+    return root
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_read_names(chunk_size):
+    data = b"a.txt\nb c.txt\r\n\n/abs/d.txt"
+    names = list(read_names(io.BytesIO(data), chunk_size=chunk_size))
+    assert names == ["a.txt", "b c.txt", "/abs/d.txt"]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("chunk_size", [1, 4, 1024])
+def test_read_names_null(chunk_size):
+    data = b"a\nb.txt\0\0c\r\0\xff.txt\0"
+    names = list(read_names(io.BytesIO(data), null=True, chunk_size=chunk_size))
+    assert names == ["a\nb.txt", "c\r", "\udcff.txt"]
+
+
+@pytest.mark.func
+def test_files_from_file(files, tmp_path, caplog):
+    caplog.set_level(logging.DEBUG)
+    listing = tmp_path / "list.txt"
+    listing.write_text(f"a.txt\nskip/c.txt\nmissing.txt\nskip\n{files / 'b.txt'}\n")
+
+    main(
+        [
+            *("--root-dir", str(files), "--files-from", str(listing)),
+            *("--omit", "skip/*", "--no-dirs", "-x", "true"),
+        ]
+    )
+    found = [r.message for r in caplog.records if r.message.startswith("Found:")]
+    assert found == [f"Found: {files / 'a.txt'}", f"Found: {files / 'b.txt'}"]
+    assert processed(caplog) == 2
+
+
+@pytest.mark.func
+def test_files_from_stdin_null(files, monkeypatch, caplog):
+    caplog.set_level(logging.INFO)
+    data = b"a.txt\0new\nline.txt\0b.txt\0"
+    stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(data)))
+    monkeypatch.setattr("sys.stdin", stdin)
+
+    main(["--root-dir", str(files), "--files-from", "-", "-0", "-x", "true"])
+    assert processed(caplog) == 3
+
+
+@pytest.mark.func
+def test_files_from_limit(files, tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    listing = tmp_path / "list.txt"
+    listing.write_text("a.txt\n" * 1000)
+
+    main(
+        [
+            *("--root-dir", str(files), "--files-from", str(listing)),
+            *("--limit", "2", "-n", "2", "-x", "true"),
+        ]
+    )
+    assert processed(caplog) == 4
@@ -0,0 +1,102 @@
+from fnmatch import fnmatch
+from itertools import product
+import os.path
+from time import perf_counter
+
+import pytest
+
+from xfind.util.fnmatch_ import PatternSet
+
+NAMES = [
+    "",
+    "a",
+    "a.txt",
+    "A.TXT",
+    "src/a.py",
+    "src/node_modules/x/index.js",
+    "node_modules",
+    "build/",
+    "build/out.o",
+    "docs/[draft].md",
+    "docs/d.md",
+    "x.tar.gz",
+    ".git/config",
+    "deep/a/b/c/d.log",
+    "*",
+]
+
+PATTERNS = [
+    "*",
+    "a",
+    "a*",
+    "*.txt",
+    "**/node_modules/**",
+    "build/*",
+    "*.o",
+    "*/*.md",
+    "docs/[[]draft].md",
+    "docs/[!d]*",
+    "?.txt",
+    "deep/**/*.log",
+    "*.tar.*",
+    ".git*",
+    "*a*",
+    "[",
+    "[a-c]",
+    "x**gz",
+]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_single_pattern_same_as_fnmatch(pattern):
+    patterns = PatternSet([pattern])
+    for name in NAMES:
+        assert patterns.match(name) == fnmatch(name, pattern), (name, pattern)
+
+
+@pytest.mark.unit
+def test_pattern_pairs_same_as_fnmatch():
+    for p1, p2 in product(PATTERNS, PATTERNS):
+        patterns = PatternSet([p1, p2])
+        for name in NAMES:
+            expected = fnmatch(name, p1) or fnmatch(name, p2)
+            assert patterns.match(name) == expected, (name, p1, p2)
+
+
+@pytest.mark.unit
+def test_empty_matches_nothing():
+    patterns = PatternSet([])
+    assert len(patterns) == 0
+    assert not any(patterns.match(name) for name in NAMES)
+
+
+@pytest.mark.perf
+def test_faster_than_fnmatch_loop():
+    root = os.path.join("data", "root")
+    omits = (
+        [os.path.join(root, "**", f"vendor{i}", "**") for i in range(20)]
+        + [os.path.join(root, "**", f"*.ext{i}") for i in range(20)]
+        + [f"*.tmp{i}" for i in range(5)]
+        + [os.path.join(root, f"cache{i}*") for i in range(5)]
+    )
+    names = [
+        os.path.join(root, f"d{i % 37}", f"sub{i % 11}", f"file{i}.ext{i % 60}")
+        for i in range(10000)
+    ]
+    patterns = PatternSet(omits)
+
+    t = perf_counter()
+    expected = [any(fnmatch(n, o) for o in omits) for n in names]
+    before = perf_counter() - t
+
+    t = perf_counter()
+    actual = [patterns.match(n) for n in names]
+    after = perf_counter() - t
+
+    print(f"\n{len(omits)} omits x {len(names)} names")
+    print(f"any(fnmatch(...)): {before:.4f}s")
+    print(f"PatternSet.match: {after:.4f}s")
+
+    assert actual == expected
+    assert after < before
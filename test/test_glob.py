@@ -0,0 +1,319 @@
+from fnmatch import fnmatch
+import glob
+import os
+import os.path
+from typing import Dict, List
+
+import pytest
+
+from xfind.__main__ import iglob_with_omits
+from xfind.util import glob_
+from xfind.util.fnmatch_ import PatternSet
+
+TREE = [
+    "a.txt",
+    "b.log",
+    ".hidden",
+    "one/a.txt",
+    "one/c.txt",
+    "one/.hidden/x.txt",
+    "one/two/a.txt",
+    "one/two/three/d.log",
+    "one/two/three/four/e.txt",
+    "other/[x].txt",
+    "other/a.txt",
+    "empty/",
+    ".dot/a.txt",
+]
+
+PATTERNS = [
+    "*",
+    "**",
+    "*.txt",
+    "**/*.txt",
+    "**/a.txt",
+    "one/**",
+    "one/**/",
+    "one/**/*.log",
+    "*/a.txt",
+    "*/*/a.txt",
+    "o*/**/t*",
+    "**/two/**",
+    "one/*/three/**",
+    ".*",
+    "**/.*",
+    ".dot/**",
+    "other/[[]x].txt",
+    "other/?.txt",
+    "one/",
+    "one/two",
+    "missing/**",
+    "missing/*.txt",
+    "a.txt",
+    "*/",
+    "**/",
+]
+
+
+@pytest.fixture
+def tree(tmp_path):
+    make_tree(str(tmp_path), TREE)
+    os.symlink(os.path.join(str(tmp_path), "one", "two"), tmp_path / "link")
+    os.symlink(os.path.join(str(tmp_path), "nowhere"), tmp_path / "broken")
+    return str(tmp_path)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_matches_iglob_absolute(tree, pattern):
+    full = os.path.join(tree, pattern)
+    expected = list(glob.iglob(full, recursive=True))
+    actual = [e.path for e in glob_.iglob(full, recursive=True)]
+    assert actual == expected
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_matches_iglob_relative(tree, pattern, monkeypatch):
+    monkeypatch.chdir(tree)
+    expected = list(glob.iglob(pattern, recursive=True))
+    actual = [e.path for e in glob_.iglob(pattern, recursive=True)]
+    assert actual == expected
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("pattern", ["**", "one/**", "*.txt"])
+def test_matches_iglob_not_recursive(tree, pattern):
+    full = os.path.join(tree, pattern)
+    expected = list(glob.iglob(full, recursive=False))
+    actual = [e.path for e in glob_.iglob(full, recursive=False)]
+    assert actual == expected
+
+
+@pytest.mark.unit
+def test_entry_file_types(tree):
+    for e in glob_.iglob(os.path.join(tree, "**"), recursive=True):
+        assert e.is_file() == os.path.isfile(e.path), e.path
+        assert e.is_dir() == os.path.isdir(e.path), e.path
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_parallel_ordered_matches_iglob(tree, pattern):
+    full = os.path.join(tree, pattern)
+    expected = list(glob.iglob(full, recursive=True))
+    actual = [
+        e.path for e in glob_.iglob(full, recursive=True, workers=4, ordered=True)
+    ]
+    assert actual == expected
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_parallel_unordered_matches_iglob(tree, pattern, monkeypatch):
+    monkeypatch.chdir(tree)
+    expected = sorted(glob.iglob(pattern, recursive=True))
+    actual = [e.path for e in glob_.iglob(pattern, recursive=True, workers=4)]
+    assert len(actual) == len(expected)
+    assert sorted(actual) == expected
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "pattern", [p for p in PATTERNS if not p.endswith("/") and p != "**"]
+)
+def test_path_matcher_agrees_with_iglob(tree, pattern):
+    full = os.path.join(tree, pattern)
+    # a trailing `**` also matches the directory itself, with a trailing slash
+    expected = {p.rstrip(os.sep) for p in glob.iglob(full, recursive=True)}
+    paths = set(glob.iglob(os.path.join(tree, "**"), recursive=True))
+    paths |= {os.path.join(tree, p.rstrip("/")) for p in TREE}
+    matcher = glob_.PathMatcher(full)
+    for path in paths - {os.path.join(tree, ""), tree}:
+        assert matcher.match(path) == (path in expected), path
+    for path in expected:
+        d = os.path.dirname(path)
+        while len(d) > len(tree):
+            assert matcher.could_contain(d), (path, d)
+            d = os.path.dirname(d)
+
+
+@pytest.mark.unit
+def test_path_matcher_could_contain(tree):
+    matcher = glob_.PathMatcher(os.path.join(tree, "one", "*", "*.txt"))
+    assert matcher.could_contain(tree)
+    assert matcher.could_contain(os.path.join(tree, "one"))
+    assert matcher.could_contain(os.path.join(tree, "one", "two"))
+    assert not matcher.could_contain(os.path.join(tree, "one", "two", "three"))
+    assert not matcher.could_contain(os.path.join(tree, "other"))
+    assert not matcher.could_contain(os.path.join(tree, "one", ".hidden"))
+    recursive = glob_.PathMatcher(os.path.join(tree, "**", "*.txt"))
+    assert recursive.could_contain(os.path.join(tree, "one", "two", "three"))
+    assert not recursive.could_contain(os.path.join(tree, ".dot"))
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("workers", [1, 4])
+def test_symlink_loops(tree, workers):
+    os.symlink(tree, os.path.join(tree, "one", "two", "up"))
+    os.symlink(os.path.join(tree, "one"), os.path.join(tree, "other", "across"))
+    found = [
+        e.path
+        for e in glob_.iglob(
+            os.path.join(tree, "**", "*.txt"), recursive=True, workers=workers
+        )
+    ]
+    assert len(found) == len(set(found))
+    assert os.path.join(tree, "one", "two", "a.txt") in found
+    assert os.path.join(tree, "other", "across", "two", "a.txt") in found
+    assert not any(os.path.join("two", "up", "") in f for f in found)
+
+
+OMITS = [
+    "**/three/**",
+    "one/two*",
+    "*.log",
+    "other/*",
+    "empty",
+]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("pattern", ["**", "**/*.txt", "one/**", "*/*/a.txt"])
+@pytest.mark.parametrize("find_files,find_dirs", [(True, True), (True, False)])
+def test_pruned_matches_filtered(tree, pattern, find_files, find_dirs):
+    full = os.path.join(tree, pattern)
+    omits = [os.path.join(tree, o) for o in OMITS]
+    expected = [
+        f
+        for f in glob.iglob(full, recursive=True)
+        if (
+            (find_files and find_dirs)
+            or (find_files and os.path.isfile(f))
+            or (find_dirs and os.path.isdir(f))
+        )
+        and not any(fnmatch(f, o) for o in omits)
+    ]
+    actual = list(
+        iglob_with_omits(
+            full, PatternSet(omits), find_files=find_files, find_dirs=find_dirs
+        )
+    )
+    assert actual == expected
+
+
+@pytest.mark.unit
+def test_prune_skips_listing(tree):
+    listed = []
+
+    def _prune(prefix):
+        listed.append(prefix)
+        return prefix.endswith(os.path.join("one", ""))
+
+    found = [
+        e.path
+        for e in glob_.iglob(os.path.join(tree, "**"), recursive=True, prune=_prune)
+    ]
+    assert os.path.join(tree, "one") in found
+    assert not any(f.startswith(os.path.join(tree, "one", "")) for f in found)
+    assert os.path.join(tree, "other", "") in listed
+
+
+@pytest.mark.perf
+def test_prune_omitted_dirs(tree, monkeypatch):
+    make_tree(
+        tree,
+        [f"proj{i}/node_modules/pkg{j}/index.js" for i in range(10) for j in range(30)]
+        + [f"proj{i}/src/main.js" for i in range(10)],
+    )
+    pattern = os.path.join(tree, "**", "*.js")
+    omits = [os.path.join(tree, "**", "node_modules", "**")]
+
+    def filtered():
+        return [
+            f
+            for f in glob.iglob(pattern, recursive=True)
+            if not any(fnmatch(f, o) for o in omits)
+        ]
+
+    def pruned():
+        return list(
+            iglob_with_omits(
+                pattern, PatternSet(omits), find_files=True, find_dirs=True
+            )
+        )
+
+    before = count_syscalls(filtered, monkeypatch)
+    after = count_syscalls(pruned, monkeypatch)
+    print(f"\nsyscalls filtering omits after iglob: {before}")
+    print(f"syscalls pruning omitted dirs: {after}")
+
+    assert before["result"] == after["result"] == 10
+    assert after["scandir"] * 10 < before["scandir"]
+
+
+@pytest.mark.perf
+def test_fewer_syscalls_than_iglob(tree, monkeypatch):
+    make_tree(
+        tree,
+        [f"wide/{i}/{j}.dat" for i in range(20) for j in range(20)],
+    )
+    pattern = os.path.join(tree, "**")
+
+    def baseline():
+        return [
+            f
+            for f in glob.iglob(pattern, recursive=True)
+            if os.path.isfile(f) or os.path.isdir(f)
+        ]
+
+    def walker():
+        return [
+            e.path
+            for e in glob_.iglob(pattern, recursive=True)
+            if e.is_file() or e.is_dir()
+        ]
+
+    before = count_syscalls(baseline, monkeypatch)
+    after = count_syscalls(walker, monkeypatch)
+    print(f"\nsyscalls via iglob + isfile/isdir: {before}")
+    print(f"syscalls via glob_.iglob: {after}")
+
+    assert before["result"] == after["result"]
+    assert after["stat"] < before["stat"]
+    assert after["scandir"] < before["scandir"]
+
+
+def count_syscalls(fn, monkeypatch) -> Dict[str, int]:
+    """
+    Note: counts calls made through the `os` module. Any stat that `DirEntry`
+    needs internally (e.g. for symlinks, or where `d_type` is not available)
+    is not counted.
+    """
+    counts = {"stat": 0, "scandir": 0}
+
+    def counting(name, real):
+        def _wrapped(*args, **kwargs):
+            counts[name] += 1
+            return real(*args, **kwargs)
+
+        return _wrapped
+
+    with monkeypatch.context() as m:
+        m.setattr(os, "stat", counting("stat", os.stat))
+        m.setattr(os, "lstat", counting("stat", os.lstat))
+        m.setattr(os, "scandir", counting("scandir", os.scandir))
+        result = fn()
+    counts["result"] = len(result)
+    return counts
+
+
+def make_tree(root: str, paths: List[str]):
+    for p in paths:
+        full = os.path.join(root, *p.split("/"))
+        if p.endswith("/"):
+            os.makedirs(full, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, "w"):
+                pass
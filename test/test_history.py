@@ -0,0 +1,157 @@
+from contextlib import closing
+import logging
+import os
+import re
+import shlex
+import sqlite3
+import sys
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.adapter.history import History
+
+PYTHON = shlex.quote(sys.executable)
+PRINT_ARGS = f"{PYTHON} -c 'import sys; print(sys.argv[1:])'"
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / "files"
+    root.mkdir()
+    for name, size in [("small.txt", 10), ("big.txt", 1000), ("mid.txt", 100)]:
+        (root / name).write_bytes(b"x" * size)
+    return (str(root), str(tmp_path / "history.sqlite"))
+
+
+def started(caplog):
+    running = [r.message for r in caplog.records if r.message.startswith("Running:")]
+    return [os.path.basename(shlex.split(r[len("Running: `") : -1])[-1]) for r in running]
+
+
+@pytest.mark.unit
+def test_estimates(files):
+    root, db = files
+    h = History(db)
+    big = os.path.join(root, "big.txt")
+    assert h.estimate(big, 1000) is None
+    h.record(big, 2.0)
+    h.record(big, 4.0)
+    assert h.estimate(big, 1000) == pytest.approx(3.0)
+    # a new .txt file, at the .txt rate: 6s per 2000 bytes
+    assert h.estimate(os.path.join(root, "new.txt"), 500) == pytest.approx(1.5)
+    # a new extension, at the rate over all extensions
+    assert h.estimate(os.path.join(root, "new.dat"), 100) == pytest.approx(0.3)
+    h.close()
+
+    h = History(db)
+    assert h.estimate(big, 1000) == pytest.approx(3.0)
+    assert h.estimate(os.path.join(root, "new.dat"), None) == pytest.approx(3.0)
+    h.close()
+
+
+@pytest.mark.func
+def test_longest_first_by_size(files, caplog):
+    root, _ = files
+    caplog.set_level(logging.DEBUG)
+    main(["-x", PRINT_ARGS + " {file_name}", "--root-dir", root])
+    main(
+        [
+            *("-x", PRINT_ARGS + " {file_name}", "--root-dir", root),
+            *("--schedule", "longest-first"),
+        ]
+    )
+    assert started(caplog)[-3:] == ["big.txt", "mid.txt", "small.txt"]
+
+
+@pytest.mark.func
+def test_longest_first_by_history(files, caplog):
+    root, db = files
+    h = History(db)
+    h.record(os.path.join(root, "small.txt"), 5.0)
+    h.record(os.path.join(root, "mid.txt"), 0.01)
+    h.record(os.path.join(root, "big.txt"), 0.1)
+    h.close()
+    caplog.set_level(logging.DEBUG)
+
+    main(
+        [
+            *("-x", PRINT_ARGS + " {file_name}", "--root-dir", root),
+            *("--schedule", "longest-first", "--history", db),
+        ]
+    )
+    assert started(caplog) == ["small.txt", "big.txt", "mid.txt"]
+
+
+@pytest.mark.func
+def test_skips_tasks_past_stop_time(files, caplog):
+    root, db = files
+    h = History(db)
+    h.record(os.path.join(root, "big.txt"), 3600.0)
+    h.record(os.path.join(root, "mid.txt"), 0.01)
+    h.record(os.path.join(root, "small.txt"), 0.01)
+    h.close()
+    caplog.set_level(logging.DEBUG)
+
+    main(
+        [
+            *("-x", PRINT_ARGS + " {file_name}", "--root-dir", root),
+            *("--schedule", "longest-first", "--history", db),
+            *("--stop-after", "1m"),
+        ]
+    )
+    assert sorted(started(caplog)) == ["mid.txt", "small.txt"]
+    m = re.search(
+        r"(\d+) total files processed, (\d+) files skipped, not expected",
+        caplog.records[-1].message,
+    )
+    assert m is not None and (m[1], m[2]) == ("2", "1")
+
+    # and the durations of those run are recorded
+    with closing(sqlite3.connect(db)) as conn:
+        counts = dict(conn.execute("SELECT key, count FROM durations"))
+    assert counts[os.path.join(root, "small.txt")] == 2
+    assert counts[os.path.join(root, "big.txt")] == 1
+
+
+@pytest.mark.func
+def test_rechecks_stop_time_once_a_worker_is_free(tmp_path, caplog):
+    root = tmp_path / "files"
+    root.mkdir()
+    db = str(tmp_path / "history.sqlite")
+    h = History(db)
+    for name in ["a.txt", "b.txt"]:
+        (root / name).write_bytes(b"x")
+        h.record(str(root / name), 1.5)
+    h.close()
+    caplog.set_level(logging.DEBUG)
+
+    # Both are expected to finish in time when first in order, but the second
+    # is not, once the first has finished and freed the worker
+    main(
+        [
+            *("-x", f"{PYTHON} -c 'import time; time.sleep(1.5)' {{file_name}}"),
+            *("--root-dir", str(root), "-n", "1"),
+            *("--schedule", "longest-first", "--history", db),
+            *("--stop-after", "2500ms"),
+        ]
+    )
+    assert len(started(caplog)) == 1
+    m = re.search(
+        r"(\d+) total files processed, (\d+) files skipped, not expected",
+        caplog.records[-1].message,
+    )
+    assert m is not None and (m[1], m[2]) == ("1", "1")
+
+
+@pytest.mark.func
+def test_warns_stop_time_without_history(files, caplog):
+    root, _ = files
+    main(
+        [
+            *("-x", PRINT_ARGS + " {file_name}", "--root-dir", root),
+            *("--schedule", "longest-first", "--stop-after", "1m"),
+        ]
+    )
+    warnings = [r for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(warnings) == 1 and "--history" in warnings[0].message
@@ -0,0 +1,62 @@
+from itertools import count, islice
+import threading
+
+import pytest
+
+from xfind.util.itertools import background, chunk_by_size, largest_first
+
+
+@pytest.mark.unit
+def test_background_yields_all_in_order():
+    assert list(background(iter(range(100)), 3)) == list(range(100))
+
+
+@pytest.mark.unit
+def test_background_raises_errors():
+    def _failing():
+        yield 1
+        raise ValueError("boom")
+
+    it = background(_failing(), 3)
+    assert next(it) == 1
+    with pytest.raises(ValueError):
+        next(it)
+
+
+@pytest.mark.unit
+def test_background_stops_thread_when_closed():
+    it = background(count(), 3)
+    assert list(islice(it, 5)) == [0, 1, 2, 3, 4]
+    it.close()
+    assert not any(t.name == "background" for t in threading.enumerate())
+
+
+@pytest.mark.unit
+def test_chunk_by_size_limits_count_and_size():
+    words = ["aa", "b", "cccc", "dd", "e", "ffffff", "g"]
+    chunks = list(chunk_by_size(words, 3, 5, len))
+    assert chunks == [["aa", "b"], ["cccc"], ["dd", "e"], ["ffffff"], ["g"]]
+    assert list(chunk_by_size(words, 2, 100, len)) == [
+        ["aa", "b"],
+        ["cccc", "dd"],
+        ["e", "ffffff"],
+        ["g"],
+    ]
+
+
+@pytest.mark.unit
+def test_largest_first_within_window():
+    items = [3, 1, 4, 1, 5, 9, 2, 6]
+    out = [x for (_, x) in largest_first(items, 3, lambda x: x)]
+    assert sorted(out) == sorted(items)
+    assert out[:4] == [4, 3, 5, 9]
+    assert [x for (_, x) in largest_first(items, 100, lambda x: x)] == sorted(
+        items, reverse=True
+    )
+
+
+@pytest.mark.unit
+def test_largest_first_keeps_order_of_equal_keys():
+    items = ["a1", "b1", "a2", "b2"]
+    out = [x for (_, x) in largest_first(items, 10, lambda x: x[0])]
+    assert out == ["b1", "b2", "a1", "a2"]
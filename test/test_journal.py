@@ -0,0 +1,92 @@
+import logging
+import os.path
+import re
+import shlex
+import sys
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.adapter import journal as journal_
+from xfind.adapter.journal import Journal, load_hashes, path_hash
+
+PYTHON = shlex.quote(sys.executable)
+SLEEP = f'{PYTHON} -c "import time; time.sleep(0.4)" {{file_name}}'
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / "files"
+    root.mkdir()
+    for i in range(6):
+        (root / f"f{i}.txt").touch()
+    return (str(root), str(tmp_path / "journal"))
+
+
+def running_files(caplog):
+    return [
+        shlex.split(m[1])[-1]
+        for r in caplog.records
+        if (m := re.match(r"Running: `(.*)`", r.message)) is not None
+    ]
+
+
+@pytest.mark.func
+def test_resume_after_stop(files, caplog):
+    caplog.set_level(logging.DEBUG)
+    root_dir, journal = files
+    args = ["-x", SLEEP, "--root-dir", root_dir, "--journal", journal]
+
+    main(args + ["--stop-after", "1s"])
+    first = running_files(caplog)
+    assert 0 < len(first) < 6
+    caplog.clear()
+
+    main(args + ["--resume"])
+    second = running_files(caplog)
+    assert sorted(first + second) == sorted(
+        os.path.join(root_dir, f"f{i}.txt") for i in range(6)
+    )
+    assert re.search(
+        f"{len(second)} total files processed, {len(first)} already done files skipped",
+        caplog.records[-1].message,
+    )
+    caplog.clear()
+
+    main(args + ["--resume"])
+    assert running_files(caplog) == []
+    caplog.clear()
+
+    main(args)
+    assert len(running_files(caplog)) == 6
+
+
+@pytest.mark.unit
+def test_journal_ignores_partial_entry(tmp_path):
+    fname = str(tmp_path / "journal")
+    root_dir = str(tmp_path)
+    journal = Journal(fname, root_dir)
+    journal.append([os.path.join(root_dir, "a"), os.path.join(root_dir, "b\nc")])
+    journal.close()
+    with open(fname, "ab") as f:
+        f.write(b"partial")
+
+    journal = Journal(fname, root_dir, resume=True)
+    assert len(journal) == 2
+    assert os.path.join(root_dir, "a") in journal
+    assert os.path.join(root_dir, "b\nc") in journal
+    assert os.path.join(root_dir, "partial") not in journal
+    journal.close()
+
+
+@pytest.mark.unit
+def test_load_hashes_in_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal_, "READ_CHUNK_SIZE", 64)
+    monkeypatch.setattr(journal_, "SORT_RUN", 10)
+    fname = str(tmp_path / "journal")
+    paths = [f"dir/f{i}.txt".encode() for i in range(100)]
+    with open(fname, "wb") as f:
+        f.write(b"".join(p + b"\0" for p in paths))
+
+    hashes = load_hashes(fname)
+    assert list(hashes) == sorted(path_hash(p) for p in paths)
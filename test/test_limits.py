@@ -0,0 +1,230 @@
+import logging
+import os
+import shlex
+import subprocess
+import sys
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.adapter.config_file import parse_size
+from xfind.util import cgroup as cgroup_
+from xfind.util.cgroup import Cgroup
+from xfind.util.limits import (
+    ChildLimits,
+    check_ioprio,
+    check_nice,
+    check_rlimit,
+    ioprio_get,
+    parse_ioprio,
+)
+
+PYTHON = shlex.quote(sys.executable)
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+posix_only = pytest.mark.skipif(sys.platform == "win32", reason="POSIX only")
+
+
+def ioprio_supported() -> bool:
+    try:
+        ioprio_get()
+        return True
+    except OSError:
+        return False
+
+
+def report(out: str, expr: str) -> str:
+    """A command writing the value of `expr` in the task's process to `out`"""
+    code = (
+        f"import os, resource, sys; sys.path.insert(0, {PACKAGE_DIR!r}); "
+        "from xfind.util.limits import ioprio_get; "
+        f"open({out!r}, 'w').write(repr({expr}))"
+    )
+    return f"{PYTHON} -c {shlex.quote(code)}"
+
+
+@pytest.fixture
+def file(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "a.txt").touch()
+    return root
+
+
+@pytest.mark.unit
+def test_parse_ioprio():
+    assert parse_ioprio("idle") == 3 << 13
+    assert parse_ioprio("best-effort") == (2 << 13) | 4
+    assert parse_ioprio("best-effort:7") == (2 << 13) | 7
+    assert parse_ioprio("realtime:0") == 1 << 13
+    for bad in ["low", "best-effort:8", "idle:1", "realtime:x"]:
+        with pytest.raises(ValueError):
+            parse_ioprio(bad)
+
+
+@pytest.mark.unit
+def test_parse_size():
+    assert parse_size("512") == 512
+    assert parse_size("4k") == 4096
+    assert parse_size("2G") == 2 * 1024**3
+    assert parse_size("1MB") == 1024**2
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+@pytest.mark.unit
+@posix_only
+def test_checks_unprivileged(monkeypatch):
+    monkeypatch.setattr(os, "geteuid", lambda: 1000)
+    check_nice(os.getpriority(os.PRIO_PROCESS, 0) + 1)
+    with pytest.raises(OSError):
+        check_nice(os.getpriority(os.PRIO_PROCESS, 0) - 1)
+    if ioprio_supported():
+        check_ioprio(parse_ioprio("idle"))
+        with pytest.raises(OSError):
+            check_ioprio(parse_ioprio("realtime"))
+
+
+@pytest.mark.unit
+@posix_only
+def test_check_rlimit():
+    import resource
+
+    res, soft, _ = check_rlimit("RLIMIT_CPU", 60)
+    assert (res, soft) == (resource.RLIMIT_CPU, 60)
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY:
+        with pytest.raises(OSError):
+            check_rlimit("RLIMIT_NOFILE", hard + 1)
+    with pytest.raises(OSError):
+        check_rlimit("RLIMIT_NOSUCH", 1)
+
+
+@pytest.mark.unit
+@posix_only
+def test_wrap(tmp_path):
+    import resource
+
+    procs = tmp_path / "cgroup.procs"
+    procs.touch()
+    nice = os.getpriority(os.PRIO_PROCESS, 0) + 2
+    limits = ChildLimits(
+        nice=nice,
+        rlimits=((resource.RLIMIT_CPU, 30, 60), (resource.RLIMIT_AS, 2**36, -1)),
+        cgroup_procs=str(procs),
+    )
+    code = (
+        "import os, resource; print(os.getpriority(os.PRIO_PROCESS, 0), "
+        "resource.getrlimit(resource.RLIMIT_CPU)[0], "
+        "resource.getrlimit(resource.RLIMIT_AS)[0])"
+    )
+    out = subprocess.run(
+        limits.wrap([sys.executable, "-c", code]), capture_output=True, check=True
+    )
+    assert out.stdout.split() == [str(nice).encode(), b"30", str(2**36).encode()]
+    # the shell moved itself, so the command, into the cgroup before it ran
+    assert procs.read_text() == "0\n"
+    assert os.getpriority(os.PRIO_PROCESS, 0) == nice - 2
+
+
+@pytest.mark.unit
+@posix_only
+def test_wrap_ignores_errors(tmp_path):
+    limits = ChildLimits(cgroup_procs=str(tmp_path / "gone" / "cgroup.procs"))
+    out = subprocess.run(limits.wrap(["echo", "a b"]), capture_output=True, check=True)
+    assert (out.stdout, out.stderr) == (b"a b\n", b"")
+
+
+@pytest.mark.func
+@posix_only
+def test_main_nice_rlimits(file, tmp_path):
+    out = str(tmp_path / "out")
+    expr = (
+        "(os.getpriority(os.PRIO_PROCESS, 0), "
+        "resource.getrlimit(resource.RLIMIT_AS)[0], "
+        "resource.getrlimit(resource.RLIMIT_CPU)[0])"
+    )
+    nice = os.getpriority(os.PRIO_PROCESS, 0) + 3
+    main(
+        [
+            *("--root-dir", str(file), "-x", report(out, expr)),
+            *("--nice", str(nice), "--rlimit-as", "64G", "--rlimit-cpu", "1m"),
+        ]
+    )
+    with open(out) as f:
+        assert f.read() == repr((nice, 64 * 1024**3, 60))
+    assert os.getpriority(os.PRIO_PROCESS, 0) == nice - 3
+
+
+@pytest.mark.func
+@pytest.mark.skipif(not ioprio_supported(), reason="no ioprio")
+def test_main_ionice(file, tmp_path):
+    out = str(tmp_path / "out")
+    main(
+        [
+            *("--root-dir", str(file), "-x", report(out, "ioprio_get()")),
+            *("--ionice", "best-effort:6", "--engine", "asyncio"),
+        ]
+    )
+    with open(out) as f:
+        assert f.read() == repr((2 << 13) | 6)
+
+
+@pytest.mark.func
+def test_main_warns_and_carries_on(file, tmp_path, monkeypatch, caplog):
+    caplog.set_level(logging.INFO)
+    monkeypatch.setattr(cgroup_, "CGROUP_ROOT", str(tmp_path / "no-cgroup2"))
+    main(
+        [
+            *("--root-dir", str(file), "-x", "true"),
+            *("--cgroup", "xfind.slice", "--cgroup-memory-max", "1G"),
+        ]
+    )
+    assert "Not running tasks in a cgroup" in caplog.text
+    assert "1 total files processed" in caplog.records[-1].message
+
+
+@pytest.mark.func
+def test_main_bad_config_makes_no_cgroup(file, tmp_path, monkeypatch):
+    monkeypatch.setattr(cgroup_, "CGROUP_ROOT", str(tmp_path))
+    (tmp_path / "cgroup.controllers").write_text("cpu io memory pids\n")
+    (tmp_path / "xfind.slice").mkdir()
+    with pytest.raises(ValueError):
+        main(
+            [
+                *("--root-dir", str(file), "-x", "echo {bogus}"),
+                *("--cgroup", "xfind.slice"),
+            ]
+        )
+    assert os.listdir(tmp_path / "xfind.slice") == []
+
+
+@pytest.mark.func
+def test_main_cgroup_limits_without_cgroup(file, caplog):
+    caplog.set_level(logging.INFO)
+    main(["--root-dir", str(file), "-x", "true", "--cgroup-cpu-max", "max"])
+    assert "Cgroup limits ignored: no --cgroup" in caplog.text
+
+
+@pytest.mark.unit
+def test_cgroup(tmp_path, monkeypatch):
+    # a stand-in for cgroupfs, whose files the kernel would create
+    monkeypatch.setattr(cgroup_, "CGROUP_ROOT", str(tmp_path))
+    (tmp_path / "cgroup.controllers").write_text("cpu io memory pids\n")
+    parent = tmp_path / "xfind.slice"
+    (parent / "run").mkdir(parents=True)
+    (parent / "cgroup.subtree_control").write_text("")
+    for name in ["cgroup.procs", "cpu.max", "memory.max"]:
+        (parent / "run" / name).write_text("")
+    (parent / "run" / "cgroup.controllers").write_text("memory\n")
+
+    cg = Cgroup("/xfind.slice", "run")
+    assert cg.path == str(parent / "run")
+    cg.set_limit("memory.max", "1G")
+    assert (parent / "cgroup.subtree_control").read_text() == ""
+    cg.set_limit("cpu.max", "200000 100000")
+    assert (parent / "cgroup.subtree_control").read_text() == "+cpu"
+    assert (parent / "run" / "cpu.max").read_text() == "200000 100000"
+    assert (parent / "run" / "memory.max").read_text() == "1G"
+    with pytest.raises(OSError):
+        cg.close()  # not empty, as a real cgroup would be
@@ -0,0 +1,146 @@
+import logging
+import shlex
+import sys
+from threading import Thread
+from typing import List
+
+import pytest
+
+from xfind.__main__ import APP_NAME, main
+from xfind.util.logging_ import SAMPLE_KEY, Joined, SampleFilter, queued, sampled
+
+PYTHON = shlex.quote(sys.executable)
+
+
+class Counted(Joined):
+    formatted = 0
+
+    def __str__(self) -> str:
+        Counted.formatted += 1
+        return super().__str__()
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    for i in range(40):
+        (root / f"{i}.txt").touch()
+    (root / "fail.txt").touch()
+    return root
+
+
+@pytest.fixture
+def app_logger():
+    logger = logging.getLogger(APP_NAME)
+    yield logger
+    logger.setLevel(logging.NOTSET)
+
+
+def record(level: int, key=None) -> logging.LogRecord:
+    r = logging.LogRecord(APP_NAME, level, __file__, 1, "msg", None, None)
+    if key is not None:
+        setattr(r, SAMPLE_KEY, key)
+    return r
+
+
+@pytest.mark.unit
+def test_sampled():
+    keys = [f"dir/{i}.txt" for i in range(10_000)]
+    assert all(sampled(k, 1) for k in keys)
+    n = sum(sampled(k, 10) for k in keys)
+    assert 800 < n < 1200
+    assert [sampled(k, 10) for k in keys] == [sampled(k, 10) for k in keys]
+
+
+@pytest.mark.unit
+def test_sample_filter():
+    f = SampleFilter(1_000_000)
+    key = next(f"{i}.txt" for i in range(100) if not sampled(f"{i}.txt", 1_000_000))
+    assert f.filter(record(logging.INFO))
+    assert not f.filter(record(logging.INFO, key))
+    assert f.filter(record(logging.WARNING, key))
+
+
+@pytest.mark.unit
+def test_joined_lazy(caplog):
+    caplog.set_level(logging.INFO)
+    logger = logging.getLogger(APP_NAME)
+    Counted.formatted = 0
+    logger.debug("Running: `%s`", Counted(["echo", "a b"]))
+    assert Counted.formatted == 0
+    logger.info("Running: `%s`", Counted(["echo", "a b"]))
+    assert caplog.records[-1].message == "Running: `echo 'a b'`"
+
+
+@pytest.mark.unit
+def test_queued():
+    logger = logging.getLogger(f"{APP_NAME}.test_queued")
+    logger.propagate = False
+    records: List[logging.LogRecord] = []
+    handler = logging.Handler()
+    handler.emit = records.append  # type: ignore
+    logger.addHandler(handler)
+    try:
+        with queued([logger]):
+            assert logger.handlers != [handler]
+
+            def _log():
+                for i in range(100):
+                    logger.warning("%d", i)
+
+            threads = [Thread(target=_log) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        assert logger.handlers == [handler]
+        assert len(records) == 400
+    finally:
+        logger.removeHandler(handler)
+
+
+@pytest.mark.unit
+def test_queued_unformatted():
+    logger = logging.getLogger(f"{APP_NAME}.test_queued_unformatted")
+    logger.propagate = False
+    records: List[logging.LogRecord] = []
+    handler = logging.Handler()
+    handler.emit = records.append  # type: ignore
+    logger.addHandler(handler)
+    Counted.formatted = 0
+    try:
+        command = Counted(["echo", "a b"])
+        with queued([logger]):
+            logger.warning("Running: `%s`", command)
+        # left for the listener's handlers to format, if they handle it
+        assert Counted.formatted == 0
+        assert records[0].args == (command,)
+        assert records[0].getMessage() == "Running: `echo 'a b'`"
+    finally:
+        logger.removeHandler(handler)
+
+
+@pytest.mark.func
+def test_main_log_sample(files, caplog):
+    caplog.set_level(logging.DEBUG)
+    main(
+        [
+            *("--root-dir", str(files), "-n", "4", "--log-sample", "4"),
+            "-x",
+            f"{PYTHON} -c 'import sys; sys.exit(\"fail\" in sys.argv[1])' "
+            "{file_name}",
+        ]
+    )
+    found = [r for r in caplog.records if r.message.startswith("Found:")]
+    assert 0 < len(found) < 41
+    assert "Failure (1)" in caplog.text
+    assert caplog.records[0].message.startswith("Config: Config(")
+
+
+@pytest.mark.func
+def test_main_log_level(files, caplog, app_logger):
+    caplog.set_level(logging.DEBUG)
+    main(["--root-dir", str(files), "-x", "true", "--log-level", "warning"])
+    assert app_logger.level == logging.WARNING
+    assert [r for r in caplog.records if r.levelno < logging.WARNING] == []
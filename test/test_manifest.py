@@ -0,0 +1,114 @@
+import logging
+import os
+import re
+import shlex
+import sys
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.adapter.manifest import Manifest
+
+PYTHON = shlex.quote(sys.executable)
+SUCCEED = f'{PYTHON} -c "import sys" {{file_name}}'
+FAIL_B = f"{PYTHON} -c \"import sys; sys.exit(sys.argv[1].endswith('b.txt'))\" "
+FAIL_B += "{file_name}"
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / "files"
+    root.mkdir()
+    for name in ["a.txt", "b.txt", "c.txt"]:
+        (root / name).write_text(name)
+    return (str(root), str(tmp_path / "manifest.sqlite"))
+
+
+def run_xfind(root_dir, manifest, command, *args):
+    main(
+        ["-x", command, "--root-dir", root_dir, "--manifest", manifest] + list(args)
+    )
+
+
+def last_counts(caplog):
+    m = re.search(
+        r"(\d+) total files processed, (\d+) unchanged files skipped",
+        caplog.records[-1].message,
+    )
+    assert m is not None, caplog.records[-1].message
+    caplog.clear()
+    return (int(m[1]), int(m[2]))
+
+
+@pytest.mark.func
+def test_skips_unchanged(files, caplog):
+    caplog.set_level(logging.INFO)
+    root_dir, manifest = files
+
+    run_xfind(root_dir, manifest, SUCCEED)
+    assert last_counts(caplog) == (3, 0)
+
+    run_xfind(root_dir, manifest, SUCCEED)
+    assert last_counts(caplog) == (0, 3)
+
+    fname = os.path.join(root_dir, "a.txt")
+    st = os.stat(fname)
+    os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    run_xfind(root_dir, manifest, SUCCEED)
+    assert last_counts(caplog) == (1, 2)
+
+    run_xfind(root_dir, manifest, SUCCEED + " --changed")
+    assert last_counts(caplog) == (3, 0)
+
+
+@pytest.mark.func
+def test_failures_not_recorded(files, caplog):
+    caplog.set_level(logging.INFO)
+    root_dir, manifest = files
+
+    run_xfind(root_dir, manifest, FAIL_B)
+    assert last_counts(caplog) == (3, 0)
+
+    run_xfind(root_dir, manifest, FAIL_B)
+    assert last_counts(caplog) == (1, 2)
+
+
+@pytest.mark.func
+def test_hash_mode_ignores_mtime(files, caplog):
+    caplog.set_level(logging.INFO)
+    root_dir, manifest = files
+
+    run_xfind(root_dir, manifest, SUCCEED, "--manifest-hash")
+    assert last_counts(caplog) == (3, 0)
+
+    fname = os.path.join(root_dir, "a.txt")
+    st = os.stat(fname)
+    os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    run_xfind(root_dir, manifest, SUCCEED, "--manifest-hash")
+    assert last_counts(caplog) == (0, 3)
+
+    with open(os.path.join(root_dir, "b.txt"), "w") as f:
+        f.write("B.TXT")
+    run_xfind(root_dir, manifest, SUCCEED, "--manifest-hash")
+    assert last_counts(caplog) == (1, 2)
+
+
+@pytest.mark.func
+def test_forgets_files_not_started(files, monkeypatch):
+    root_dir, manifest = files
+    left: list = []
+    close = Manifest.close
+
+    def _close(self):
+        left.extend(self._pending)
+        close(self)
+
+    monkeypatch.setattr(Manifest, "close", _close)
+    # a.txt runs past the stop time, so b.txt never gets a slot
+    run_xfind(
+        root_dir,
+        manifest,
+        f"{PYTHON} -c 'import time; time.sleep(1)' {{file_name}}",
+        *("-n", "1", "--max-pending", "1", "--stop-after", "300ms"),
+    )
+    assert left == []
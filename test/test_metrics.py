@@ -0,0 +1,108 @@
+import asyncio
+import json
+import logging
+import os.path
+import shlex
+import sys
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.adapter.metrics_file import MetricsWriter, to_prometheus
+from xfind.util.metrics import Histogram, Metrics
+
+PYTHON = shlex.quote(sys.executable)
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    for name in ["a.txt", "b.txt", "c.txt", "fail.txt"]:
+        (root / name).touch()
+    return tmp_path
+
+
+@pytest.mark.unit
+def test_histogram():
+    h = Histogram((1.0, 2.0, 5.0))
+    for v in [0.5, 0.5, 1.5, 3.0, 10.0]:
+        h.observe(v)
+    assert h.cumulative() == [(1.0, 2), (2.0, 3), (5.0, 4), (float("inf"), 5)]
+    assert h.count == 5
+    assert h.sum == 15.5
+    assert h.quantile(0.4) == 1.0
+    assert h.quantile(0.6) == 2.0
+    assert h.quantile(1.0) == 10.0
+
+
+@pytest.mark.unit
+def test_timed_task():
+    metrics = Metrics()
+
+    def task(x):
+        return x * 2
+
+    async def task_async(x):
+        return x * 3
+
+    assert metrics.timed_task(task)(2) == 4
+    assert asyncio.run(metrics.timed_task(task_async)(2)) == 6
+    snapshot = metrics.snapshot()
+    assert snapshot["task_seconds"].count == 2
+    assert snapshot["tasks_running"] == 0
+
+
+@pytest.mark.unit
+def test_prometheus_format():
+    metrics = Metrics()
+    metrics.add_files("discovered", 3)
+    metrics.add_files("succeeded", 2)
+    metrics.add_tasks("submitted", 3)
+    text = to_prometheus(metrics.snapshot())
+    assert 'xfind_files_total{state="discovered"} 3' in text
+    assert 'xfind_files_total{state="succeeded"} 2' in text
+    assert "xfind_tasks_pending 3" in text
+    assert 'xfind_task_duration_seconds_bucket{le="+Inf"} 0' in text
+    assert "# TYPE xfind_task_duration_seconds histogram" in text
+
+
+@pytest.mark.unit
+def test_writer_extension(tmp_path):
+    with pytest.raises(ValueError):
+        MetricsWriter(str(tmp_path / "metrics.csv"), Metrics(), 1.0)
+
+
+@pytest.mark.func
+def test_metrics_file(files, caplog):
+    caplog.set_level(logging.INFO)
+    metrics_file = str(files / "metrics.json")
+    main(
+        [
+            "-x",
+            f"{PYTHON} -c 'import sys; sys.exit(\"fail\" in sys.argv[1])' "
+            "{base_name}",
+            "-n",
+            "2",
+            "--root-dir",
+            str(files / "root"),
+            "--metrics",
+            metrics_file,
+        ]
+    )
+    assert os.path.exists(metrics_file)
+    with open(metrics_file) as f:
+        data = json.load(f)
+    assert data["files"] == {
+        "discovered": 4,
+        "dispatched": 4,
+        "succeeded": 3,
+        "failed": 1,
+        "cancelled": 0,
+    }
+    assert data["tasks_running"] == 0
+    assert data["task_seconds"]["count"] == 4
+
+    summary = [r.message for r in caplog.records if r.message.startswith("Metrics:")]
+    assert len(summary) == 1
+    assert "3 succeeded, 1 failed" in summary[0]
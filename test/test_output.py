@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import shlex
+import sys
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.adapter.output import (
+    Output,
+    RingBuffer,
+    run_captured,
+    run_captured_async,
+)
+
+PYTHON = shlex.quote(sys.executable)
+
+# Writes 1 MB of "x" then "END" to stdout, and "ERR" to stderr, then fails
+CHATTY = (
+    f"{PYTHON} -c "
+    "'import sys; sys.stdout.write(\"x\" * 1048576 + \"END\"); "
+    "sys.stderr.write(\"ERR\"); sys.exit(1)'"
+)
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    for name in ["a.txt", "b.txt"]:
+        (root / name).touch()
+    return tmp_path
+
+
+@pytest.mark.unit
+def test_ring_buffer_keeps_tail():
+    buf = RingBuffer(10)
+    for i in range(100):
+        buf.write(str(i % 10).encode() * 3)
+    assert buf.total == 300
+    assert buf.getvalue() == b"6777888999"
+
+
+@pytest.mark.unit
+def test_ring_buffer_large_write():
+    buf = RingBuffer(4)
+    buf.write(b"ab")
+    buf.write(b"0123456789")
+    buf.write(b"x")
+    assert buf.getvalue() == b"789x"
+    assert buf.total == 13
+
+
+@pytest.mark.unit
+def test_ring_buffer_zero_size():
+    buf = RingBuffer(0)
+    buf.write(b"abc")
+    assert buf.getvalue() == b""
+    assert buf.total == 3
+
+
+@pytest.mark.unit
+def test_output_str():
+    assert str(Output(b"a\r\nb\xff", 4)) == "a\nb"
+    assert str(Output(b"tail", 10)) == "[6 bytes omitted]\ntail"
+    assert str(Output(b"tail", 10, "x.log")) == "[6 bytes omitted, see x.log]\ntail"
+    assert len(Output(b"tail", 10)) == 10
+
+
+@pytest.mark.unit
+def test_run_captured_bounded():
+    result = run_captured(
+        shlex.split(CHATTY),
+        shell=False,
+        relay_stdout=False,
+        relay_stderr=False,
+        tail_bytes=100,
+    )
+    assert result.returncode == 1
+    assert len(result.stdout) == 1048576 + 3
+    assert len(result.stdout.tail) == 100
+    assert str(result.stdout).endswith("xxxEND")
+    assert str(result.stderr) == "ERR"
+
+
+@pytest.mark.unit
+def test_run_captured_async_bounded():
+    result = asyncio.run(
+        run_captured_async(
+            shlex.split(CHATTY),
+            shell=False,
+            relay_stdout=False,
+            relay_stderr=False,
+            tail_bytes=100,
+        )
+    )
+    assert result.returncode == 1
+    assert len(result.stdout) == 1048576 + 3
+    assert len(result.stdout.tail) == 100
+    assert str(result.stderr) == "ERR"
+
+
+@pytest.mark.unit
+def test_run_captured_spool(tmp_path):
+    spool = {
+        "stdout": str(tmp_path / "spool" / "out.log"),
+        "stderr": str(tmp_path / "spool" / "err.log"),
+    }
+    result = run_captured(
+        shlex.split(CHATTY),
+        shell=False,
+        relay_stdout=False,
+        relay_stderr=False,
+        tail_bytes=100,
+        spool=spool,
+    )
+    assert os.path.getsize(spool["stdout"]) == 1048576 + 3
+    assert len(result.stdout.tail) == 100
+    assert result.stdout.spool_path == spool["stdout"]
+    assert str(result.stdout).startswith(
+        f"[{1048576 + 3 - 100} bytes omitted, see {spool['stdout']}]"
+    )
+    assert str(result.stderr) == "ERR"
+
+
+@pytest.mark.func
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_failure_logs_tail_only(files, caplog, engine):
+    caplog.set_level(logging.INFO)
+    main(
+        [
+            "-x",
+            CHATTY,
+            "--root-dir",
+            str(files / "root"),
+            "-p",
+            "*.txt",
+            "--engine",
+            engine,
+            "--output-tail-bytes",
+            "1024",
+        ]
+    )
+    stdout_logs = [r.message for r in caplog.records if r.message.startswith("STDOUT")]
+    assert len(stdout_logs) == 2
+    for msg in stdout_logs:
+        assert len(msg) < 2048
+        assert "bytes omitted" in msg
+        assert msg.endswith("END")
+
+
+@pytest.mark.func
+def test_spool_files(files, caplog):
+    caplog.set_level(logging.INFO)
+    spool_dir = files / "spool"
+    main(
+        [
+            "-x",
+            CHATTY,
+            "--root-dir",
+            str(files / "root"),
+            "-p",
+            "*.txt",
+            "--spool",
+            str(spool_dir / "{base_name}.{stream}.log"),
+        ]
+    )
+    assert sorted(os.listdir(spool_dir)) == [
+        "a.txt.stderr.log",
+        "a.txt.stdout.log",
+        "b.txt.stderr.log",
+        "b.txt.stdout.log",
+    ]
+    assert os.path.getsize(spool_dir / "a.txt.stdout.log") == 1048576 + 3
+    assert (spool_dir / "b.txt.stderr.log").read_bytes() == b"ERR"
+
+
+@pytest.mark.func
+def test_spool_batch_mode_fields(files):
+    with pytest.raises(ValueError):
+        main(
+            [
+                "-x",
+                f"{PYTHON} -c pass {{file_names}}",
+                "--root-dir",
+                str(files / "root"),
+                "--spool",
+                str(files / "{base_name}.{stream}.log"),
+            ]
+        )
@@ -0,0 +1,161 @@
+import logging
+import shlex
+import subprocess
+import sys
+from time import monotonic
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.adapter.output import run_captured
+from xfind.util.reaper import Reaper, Stopped
+
+PYTHON = shlex.quote(sys.executable)
+
+SLEEP = f"{PYTHON} -c 'import time; time.sleep(30)'"
+
+# Ignores SIGTERM, so needs SIGKILL
+STUBBORN = (
+    f"{PYTHON} -c 'import signal, time; "
+    "signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(30)'"
+)
+
+# A shell whose own child holds the output pipe open
+GRANDCHILD = "sleep 30 & wait"
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="process groups are POSIX"
+)
+
+
+def run(command: str, reaper: Reaper, shell: bool = False):
+    return run_captured(
+        [command] if shell else shlex.split(command),
+        shell=shell,
+        relay_stdout=False,
+        relay_stderr=False,
+        tail_bytes=1024,
+        reaper=reaper,
+    )
+
+
+@pytest.fixture
+def files(tmp_path):
+    for name in ["a.txt", "b.txt", "c.txt"]:
+        (tmp_path / name).touch()
+    return str(tmp_path)
+
+
+@pytest.mark.unit
+def test_no_timeout():
+    reaper = Reaper(timeout=10, grace=1)
+    try:
+        result = run(f"{PYTHON} -c 'print(1)'", reaper)
+    finally:
+        reaper.close()
+    assert result.returncode == 0
+    assert str(result.stdout).strip() == "1"
+
+
+@pytest.mark.unit
+def test_timeout_terminates():
+    reaper = Reaper(timeout=0.5, grace=5)
+    start = monotonic()
+    try:
+        with pytest.raises(subprocess.TimeoutExpired):
+            run(SLEEP, reaper)
+    finally:
+        reaper.close()
+    assert monotonic() - start < 5
+
+
+@pytest.mark.unit
+def test_timeout_escalates_to_kill():
+    reaper = Reaper(timeout=0.5, grace=0.5)
+    start = monotonic()
+    try:
+        with pytest.raises(subprocess.TimeoutExpired):
+            run(STUBBORN, reaper)
+    finally:
+        reaper.close()
+    assert monotonic() - start < 5
+
+
+@pytest.mark.unit
+def test_timeout_kills_process_group():
+    reaper = Reaper(timeout=0.5, grace=0.5)
+    start = monotonic()
+    try:
+        with pytest.raises(subprocess.TimeoutExpired):
+            run(GRANDCHILD, reaper, shell=True)
+    finally:
+        reaper.close()
+    assert monotonic() - start < 5
+
+
+@pytest.mark.unit
+def test_stop_all():
+    reaper = Reaper(timeout=None, grace=0.5)
+    start = monotonic()
+    try:
+        reaper.stop_all()
+        with pytest.raises(Stopped):
+            run(SLEEP, reaper)
+    finally:
+        reaper.close()
+    assert monotonic() - start < 5
+
+
+@pytest.mark.func
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_task_timeout(files, caplog, engine):
+    caplog.set_level(logging.INFO)
+    start = monotonic()
+    main(
+        [
+            "-x",
+            SLEEP + " {file_name}",
+            "-n",
+            "3",
+            "--root-dir",
+            files,
+            "--engine",
+            engine,
+            "--task-timeout",
+            "500ms",
+            "--kill-grace",
+            "500ms",
+        ]
+    )
+    assert monotonic() - start < 10
+    timeouts = [r for r in caplog.records if r.message.startswith("Timeout (0.5s)")]
+    assert len(timeouts) == 3
+    assert "3 total files processed" in caplog.records[-1].message
+
+
+@pytest.mark.func
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_hard_stop(files, caplog, engine):
+    caplog.set_level(logging.INFO)
+    start = monotonic()
+    main(
+        [
+            "-x",
+            STUBBORN + " {file_name}",
+            "-n",
+            "2",
+            "--root-dir",
+            files,
+            "--engine",
+            engine,
+            "--stop-after",
+            "1s",
+            "--hard-stop",
+            "--kill-grace",
+            "500ms",
+        ]
+    )
+    assert monotonic() - start < 10
+    killed = [r for r in caplog.records if r.message.startswith("Task killed")]
+    assert len(killed) == 2
+    assert "0 total files processed" in caplog.records[-1].message
@@ -0,0 +1,166 @@
+import csv
+import gzip
+import json
+import shlex
+import sys
+import threading
+
+import pytest
+
+import xfind.__main__
+from xfind.__main__ import main
+from xfind.adapter.results import ResultsWriter, TaskResult, read_failed
+
+PYTHON = shlex.quote(sys.executable)
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    for name in ["a.txt", "b.txt", "c.txt", "fail.txt"]:
+        (root / name).touch()
+    return tmp_path
+
+
+def result(task: int, status: str = "succeeded") -> TaskResult:
+    return TaskResult(
+        task=task,
+        status=status,
+        exit_code=0,
+        attempts=1,
+        start=1_000_000_000.0,
+        end=1_000_000_001.5,
+        seconds=1.5,
+        stdout_bytes=10,
+        stderr_bytes=None,
+        paths=[f"dir/{task} .txt"],
+        argv=["echo", f"dir/{task} .txt"],
+    )
+
+
+def read_jsonl(open_, file_name):
+    with open_(file_name, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("ext,open_", [(".jsonl", open), (".jsonl.gz", gzip.open)])
+def test_jsonl(tmp_path, ext, open_):
+    file_name = str(tmp_path / f"results{ext}")
+    w = ResultsWriter(file_name)
+    for i in range(2500):
+        w.put(result(i))
+    w.close()
+    rows = read_jsonl(open_, file_name)
+    assert [r["task"] for r in rows] == list(range(2500))
+    assert rows[0] == {
+        "task": 0,
+        "status": "succeeded",
+        "exit_code": 0,
+        "attempts": 1,
+        "start": "2001-09-09T01:46:40.000+00:00",
+        "end": "2001-09-09T01:46:41.500+00:00",
+        "seconds": 1.5,
+        "stdout_bytes": 10,
+        "stderr_bytes": None,
+        "paths": ["dir/0 .txt"],
+        "argv": ["echo", "dir/0 .txt"],
+    }
+
+
+@pytest.mark.unit
+def test_csv(tmp_path):
+    file_name = str(tmp_path / "results.csv")
+    w = ResultsWriter(file_name)
+    w.put(result(7, "failed"))
+    w.close()
+    with open(file_name, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 1
+    assert rows[0]["status"] == "failed"
+    assert rows[0]["stderr_bytes"] == ""
+    assert shlex.split(rows[0]["paths"]) == ["dir/7 .txt"]
+    assert shlex.split(rows[0]["argv"]) == ["echo", "dir/7 .txt"]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("ext", [".jsonl", ".csv", ".csv.gz"])
+def test_read_failed(tmp_path, ext):
+    file_name = str(tmp_path / f"results{ext}")
+    w = ResultsWriter(file_name)
+    for i, status in enumerate(
+        ["succeeded", "failed", "cancelled", "timeout", "killed", "error"]
+    ):
+        w.put(result(i, status))
+    w.close()
+    assert list(read_failed(file_name)) == ["dir/1 .txt", "dir/3 .txt", "dir/5 .txt"]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", ["results.json", "results.gz", "results.csv.bz2"])
+def test_extension(tmp_path, name):
+    with pytest.raises(ValueError):
+        ResultsWriter(str(tmp_path / name))
+
+
+@pytest.mark.func
+def test_main_results(files):
+    results_file = str(files / "results.jsonl")
+    main(
+        [
+            "-x",
+            f"{PYTHON} -c 'import sys; sys.exit(\"fail\" in sys.argv[1])' "
+            "{base_name}",
+            *("-n", "2", "--root-dir", str(files / "root")),
+            *("--results", results_file),
+        ]
+    )
+    rows = read_jsonl(open, results_file)
+    assert sorted(r["task"] for r in rows) == [0, 1, 2, 3]
+    statuses = {r["paths"][0].rsplit("/", 1)[-1]: r["status"] for r in rows}
+    assert statuses == {
+        "a.txt": "succeeded",
+        "b.txt": "succeeded",
+        "c.txt": "succeeded",
+        "fail.txt": "failed",
+    }
+    for r in rows:
+        assert r["argv"][-1] == r["paths"][0].rsplit("/", 1)[-1]
+        assert r["seconds"] >= 0 and r["start"] <= r["end"]
+        assert r["stdout_bytes"] == 0
+
+
+@pytest.mark.func
+def test_main_results_at_stop(files):
+    results_file = str(files / "results.csv")
+    main(
+        [
+            *("-x", f"{PYTHON} -c 'import time; time.sleep(1)'"),
+            *("-n", "1", "--max-pending", "4", "--root-dir", str(files / "root")),
+            *("--stop-after", "500ms", "--results", results_file),
+        ]
+    )
+    with open(results_file, newline="") as f:
+        statuses = sorted(r["status"] for r in csv.DictReader(f))
+    assert statuses == ["cancelled", "cancelled", "cancelled", "succeeded"]
+
+
+@pytest.mark.func
+def test_main_closes_on_error(files, monkeypatch):
+    def _fail(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(xfind.__main__, "submit_task", _fail)
+    results_file = str(files / "results.jsonl")
+    with pytest.raises(RuntimeError):
+        main(
+            [
+                *("-x", "true", "--root-dir", str(files / "root")),
+                *("--results", results_file, "--metrics", str(files / "m.json")),
+                *("--task-timeout", "1m"),
+            ]
+        )
+    names = {t.name for t in threading.enumerate()}
+    assert names.isdisjoint({"results", "metrics", "reaper"})
+    assert read_jsonl(open, results_file) == []
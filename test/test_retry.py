@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import pickle
+import re
+import shlex
+import subprocess
+import sys
+from time import time
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.util.retry import backoff_delay, retrying
+
+PYTHON = shlex.quote(sys.executable)
+
+# Exits 75 the first `n` times it is run on a file, then succeeds
+FLAKY = (
+    f"{PYTHON} -c 'import os, sys; p = sys.argv[1] + \".tries\"; "
+    "n = os.path.getsize(p) if os.path.exists(p) else 0; "
+    "open(p, \"a\").write(\"x\"); sys.exit(75 if n < int(sys.argv[2]) else 0)' "
+    "{file_name}"
+)
+
+
+def returning(*codes):
+    calls = []
+
+    def _run(arg):
+        calls.append(arg)
+        return subprocess.CompletedProcess([arg], codes[len(calls) - 1])
+
+    return (_run, calls)
+
+
+def summary(caplog) -> str:
+    m = re.match(r"Done: (.*)\.$", caplog.records[-1].message)
+    assert m is not None, caplog.records[-1].message
+    return m[1]
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    for name in ["a.txt", "b.txt", "c.txt"]:
+        (root / name).touch()
+    return root
+
+
+@pytest.mark.unit
+def test_retries_until_success():
+    fn, calls = returning(75, 75, 0)
+    task = retrying(fn, exit_codes=frozenset([75]), max_retries=3, backoff=0.001)
+    result = task("x")
+    assert (result.returncode, result.attempts) == (0, 3)
+    assert calls == ["x", "x", "x"]
+
+
+@pytest.mark.unit
+def test_gives_up():
+    fn, calls = returning(75, 1, 0)
+    task = retrying(fn, exit_codes=frozenset([75]), max_retries=3, backoff=0.001)
+    assert task("x").returncode == 1  # not retried
+    fn, calls = returning(75, 75, 75)
+    task = retrying(fn, exit_codes=frozenset([75]), max_retries=2, backoff=0.001)
+    assert task("x").attempts == 3
+
+
+@pytest.mark.unit
+def test_no_retry_past_stop_time():
+    fn, calls = returning(75, 0)
+    task = retrying(
+        fn,
+        exit_codes=frozenset([75]),
+        max_retries=3,
+        backoff=10,
+        stop_time=time() + 1,
+    )
+    result = task("x")
+    assert (result.returncode, result.attempts) == (75, 1)
+
+
+@pytest.mark.unit
+def test_retries_async():
+    codes = [75, 0]
+
+    async def _run(arg):
+        return subprocess.CompletedProcess([arg], codes.pop(0))
+
+    task = retrying(_run, exit_codes=frozenset([75]), max_retries=3, backoff=0.001)
+    assert asyncio.iscoroutinefunction(task)
+    assert asyncio.run(task("x")).attempts == 2
+
+
+@pytest.mark.unit
+def test_picklable():
+    task = retrying(subprocess.run, exit_codes=frozenset([75]), max_retries=3, backoff=1)
+    assert pickle.loads(pickle.dumps(task)).keywords["max_retries"] == 3
+
+
+@pytest.mark.unit
+def test_backoff_delay():
+    for attempts, top in [(1, 1.0), (2, 2.0), (3, 4.0)]:
+        d = backoff_delay(1.0, attempts)
+        assert top / 2 <= d <= top
+
+
+@pytest.mark.func
+def test_main_retries(files, caplog):
+    caplog.set_level(logging.INFO)
+    main(
+        [
+            *("--root-dir", str(files), "-p", "*.txt", "-n", "3"),
+            *("-x", f"{FLAKY} 2", "--retry-exit-code", "75"),
+            *("--retry-backoff", "10ms"),
+        ]
+    )
+    assert "3 files retried in the run, 3 succeeded on retry" in summary(caplog)
+    assert "Success (0) after 3 attempts" in caplog.text
+
+
+@pytest.mark.func
+def test_main_retries_exhausted(files, caplog):
+    caplog.set_level(logging.INFO)
+    main(
+        [
+            *("--root-dir", str(files), "-p", "a.txt"),
+            *("-x", f"{FLAKY} 5", "--retry-exit-code", "75"),
+            *("--max-retries", "1", "--retry-backoff", "10ms"),
+        ]
+    )
+    assert "1 files retried in the run, 0 succeeded on retry" in summary(caplog)
+    assert "Failure (75) after 2 attempts" in caplog.text
+
+
+@pytest.mark.func
+def test_main_retry_failed_from(files, tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    results = str(tmp_path / "results.jsonl")
+    main(
+        [
+            *("--root-dir", str(files), "-p", "*.txt", "-n", "2"),
+            *("-x", f"{FLAKY} 1", "--results", results),
+        ]
+    )
+    caplog.clear()
+    main(
+        [
+            *("--root-dir", str(files), "--retry-failed-from", results),
+            *("-x", f"{FLAKY} 1", "--omit", "c.txt"),
+        ]
+    )
+    assert "Note: retrying files which failed in" in caplog.text
+    assert "2 failed files retried, 2 succeeded" in summary(caplog)
+
+
+@pytest.mark.unit
+def test_files_from_and_retry_failed_from(files):
+    with pytest.raises(ValueError, match="--retry-failed-from"):
+        main(["--files-from", "-", "--retry-failed-from", "results.jsonl"])
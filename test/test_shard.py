@@ -0,0 +1,114 @@
+import logging
+import os.path
+
+import pytest
+
+from xfind.__main__ import build_cli, args_to_config, iglob_with_omits, main
+from xfind.util.fnmatch_ import PatternSet
+from xfind.util.shard import Shard, ShardFilter, shard_of
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for d in range(6):
+        for sub in range(3):
+            path = tmp_path / f"d{d}" / f"s{sub}"
+            path.mkdir(parents=True)
+            for f in range(4):
+                (path / f"f{f}.txt").touch()
+    return str(tmp_path)
+
+
+def walk(root: str, shard=None):
+    found = iglob_with_omits(
+        os.path.join(root, "**", "*"),
+        PatternSet([]),
+        find_files=True,
+        find_dirs=False,
+        prune=None if shard is None else shard.pruned,
+    )
+    return set(found if shard is None else filter(shard, found))
+
+
+@pytest.mark.unit
+def test_parse():
+    assert Shard.parse("2/8") == Shard(2, 8)
+    assert str(Shard(2, 8)) == "2/8"
+    for bad in ["0/8", "9/8", "2", "a/b", "2/0", "-1/2"]:
+        with pytest.raises(ValueError):
+            Shard.parse(bad)
+
+
+@pytest.mark.unit
+def test_shard_of_is_stable():
+    # Must never change: runs of different versions would split differently
+    assert [shard_of(k, 8) for k in ["a.txt", "d1/f2.txt", "x"]] == [6, 5, 8]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("depth", [None, 1, 2])
+def test_shards_partition_files(tree, depth):
+    everything = walk(tree)
+    shards = [walk(tree, ShardFilter(Shard(k, 4), tree, depth)) for k in range(1, 5)]
+    assert sum(len(s) for s in shards) == len(everything)
+    assert set().union(*shards) == everything
+
+
+@pytest.mark.unit
+def test_shard_depth_keeps_subtrees_together(tree):
+    for k in range(1, 4):
+        files = walk(tree, ShardFilter(Shard(k, 3), tree, depth=1))
+        top_dirs = {os.path.relpath(f, tree).split(os.sep)[0] for f in files}
+        assert len(files) == len(top_dirs) * 12
+
+
+@pytest.mark.unit
+def test_shard_depth_prunes(tree):
+    shard = ShardFilter(Shard(1, 2), tree, depth=1)
+    listed = []
+    pruned = shard.pruned
+
+    def _pruned(d: str) -> bool:
+        listed.append(d)
+        return pruned(d)
+
+    shard.pruned = _pruned  # type: ignore
+    walk(tree, shard)
+    others = [d for d in listed if pruned(d)]
+    assert len(others) > 0
+    # nothing below a pruned directory is considered
+    assert not any(d.startswith(o) and d != o for o in others for d in listed)
+
+
+@pytest.mark.unit
+def test_relative_root(tree, monkeypatch):
+    monkeypatch.chdir(tree)
+    rel = walk("", ShardFilter(Shard(1, 3), ""))
+    absolute = walk(tree, ShardFilter(Shard(1, 3), tree))
+    assert {os.path.join(tree, f) for f in rel} == absolute
+
+
+@pytest.mark.unit
+def test_shard_config():
+    args = build_cli().parse_args(["--shard", "3/4", "--shard-depth", "2"])
+    config, _ = args_to_config(args)
+    assert config.shard == Shard(3, 4)
+    assert config.shard_depth == 2
+
+
+@pytest.mark.func
+def test_shards_run_every_file_once(tree, caplog):
+    caplog.set_level(logging.INFO)
+    totals = []
+    for k in range(1, 4):
+        caplog.clear()
+        main(
+            [
+                *("--root-dir", tree, "-p", "**/*", "--no-dirs"),
+                *("--shard", f"{k}/3", "--shard-depth", "2", "-x", "true"),
+            ]
+        )
+        assert f"Note: running on shard {k}/3 only" in caplog.text
+        last = caplog.records[-1].message
+        totals.append(int(last.split("Done: ")[1].split(" ")[0]))
+    assert sum(totals) == len(walk(tree))
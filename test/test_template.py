@@ -0,0 +1,118 @@
+import logging
+import os
+import os.path
+import shlex
+import sys
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.model.template import (
+    FILE_PLACEHOLDERS,
+    RUN_PLACEHOLDERS,
+    CommandTemplate,
+    Template,
+    all_placeholders,
+)
+
+PYTHON = shlex.quote(sys.executable)
+PRINT_ARGS = f"{PYTHON} -c 'import sys; print(sys.argv[1:])'"
+
+
+@pytest.mark.unit
+def test_render_file_name_with_quotes_and_spaces(tmp_path):
+    source = str(tmp_path / "it's a \"file\".txt")
+    for command in ["echo {file_name}", 'echo "{file_name}"', "echo '{file_name}'"]:
+        assert CommandTemplate(command, 0).render(source) == ["echo", source]
+
+
+@pytest.mark.unit
+def test_render_within_argument(tmp_path):
+    source = str(tmp_path / "a b.txt")
+    template = CommandTemplate('cp "{file_name}" "{root_name}.bak"', 0)
+    assert template.render(source) == ["cp", source, source[: -len(".txt")] + ".bak"]
+
+
+@pytest.mark.unit
+def test_render_escaped_braces(tmp_path):
+    source = str(tmp_path / "a.txt")
+    template = CommandTemplate(
+        "awk '{{print $1}}' {file_name} '{{}}' x{{{base_name}}}", 0
+    )
+    assert template.render(source) == ["awk", "{print $1}", source, "{}", "x{a.txt}"]
+    batch = CommandTemplate("jq '{{a: .b}}' {file_names}", 0)
+    assert batch.render_batch([source]) == ["jq", "{a: .b}", source]
+
+
+@pytest.mark.unit
+def test_render_computes_only_used_placeholders(tmp_path):
+    # no stat is needed, so a missing file renders
+    source = str(tmp_path / "missing.txt")
+    assert CommandTemplate("echo {base_name}", 0).render(source) == [
+        "echo",
+        "missing.txt",
+    ]
+    with pytest.raises(OSError):
+        CommandTemplate("echo {size}", 0).render(source)
+
+
+@pytest.mark.unit
+def test_render_new_placeholders(tmp_path):
+    (tmp_path / "sub").mkdir()
+    source = tmp_path / "sub" / "a.txt"
+    source.write_bytes(b"12345")
+    os.utime(source, (0, 86400))
+    template = CommandTemplate(
+        "echo {rel_path} {size} {utc_mtime:%Y-%m-%d}", 0, root_dir=str(tmp_path)
+    )
+    assert template.render(str(source)) == [
+        "echo",
+        os.path.join("sub", "a.txt"),
+        "5",
+        "1970-01-02",
+    ]
+
+
+@pytest.mark.unit
+def test_unknown_placeholder():
+    with pytest.raises(ValueError, match=r"\{nope\}"):
+        CommandTemplate("echo {nope}", 0)
+    Template("{task_id}.{stream}", 0, extra_fields={"task_id", "stream"})
+    with pytest.raises(ValueError, match=r"\{task_id\}"):
+        Template("{task_id}", 0)
+
+
+@pytest.mark.unit
+def test_render_batch(tmp_path):
+    files = [str(tmp_path / "a b.txt"), str(tmp_path / "c.txt")]
+    template = CommandTemplate("wc -l {file_names}", 0)
+    assert template.batch
+    assert template.render_batch(files) == ["wc", "-l", *files]
+    template = CommandTemplate('sh -c "wc -l {file_names}"', 0)
+    assert template.render_batch(files) == ["sh", "-c", f"wc -l {shlex.join(files)}"]
+
+
+@pytest.mark.unit
+def test_all_placeholders(tmp_path):
+    source = tmp_path / "a.txt"
+    source.touch()
+    data = all_placeholders(str(source), 0, str(tmp_path))
+    assert set(data) == set(FILE_PLACEHOLDERS) | set(RUN_PLACEHOLDERS)
+    assert data["rel_path"] == "a.txt"
+    assert data["size"] == 0
+
+
+@pytest.mark.func
+def test_file_name_with_quote(tmp_path, caplog):
+    (tmp_path / "it's here.txt").write_bytes(b"123")
+    caplog.set_level(logging.DEBUG)
+
+    main(["-x", PRINT_ARGS + " '{rel_path}' {size}", "--root-dir", str(tmp_path)])
+
+    running = [r.message for r in caplog.records if r.message.startswith("Running:")]
+    assert len(running) == 1
+    assert shlex.split(running[0][len("Running: `") : -1])[3:] == [
+        "it's here.txt",
+        "3",
+    ]
+    assert "1 total files processed" in caplog.records[-1].message
@@ -0,0 +1,138 @@
+import logging
+import os
+import os.path
+
+import pytest
+
+from xfind.__main__ import iglob_with_omits, main
+from xfind.adapter.walk_cache import WalkCache
+from xfind.util.fnmatch_ import PatternSet
+
+TREE = ["a.txt", "one/b.txt", "one/two/c.txt", "one/two/three/d.log", ".hidden/e.txt"]
+OLD = 1_000_000_000  # 2001
+
+
+def age(root: str):
+    """Make every directory old, so its listing is not too recent to cache"""
+    for d, _, _ in os.walk(root):
+        os.utime(d, (OLD, OLD))
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "root"
+    for name in TREE:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x")
+    os.symlink(root / "one", root / "link")
+    age(str(root))
+    return str(root)
+
+
+def walk(root: str, cache: WalkCache, pattern: str = "**/*", workers: int = 1):
+    return list(
+        iglob_with_omits(
+            os.path.join(root, pattern),
+            PatternSet([]),
+            find_files=True,
+            find_dirs=True,
+            workers=workers,
+            ordered=True,
+            scandir=cache.scandir,
+        )
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("pattern", ["**/*", "*/*.txt", "**/", ".*/*", "one/**"])
+@pytest.mark.parametrize("workers", [1, 4])
+def test_same_as_uncached(tree, tmp_path, pattern, workers):
+    expected = list(
+        iglob_with_omits(
+            os.path.join(tree, pattern),
+            PatternSet([]),
+            find_files=True,
+            find_dirs=True,
+        )
+    )
+    db = str(tmp_path / "walk.sqlite")
+    for _ in range(2):
+        cache = WalkCache(db)
+        assert walk(tree, cache, pattern, workers) == expected
+        cache.close()
+    assert cache.hits > 0 and cache.misses == 0
+
+
+@pytest.mark.unit
+def test_relists_changed_dirs(tree, tmp_path):
+    db = str(tmp_path / "walk.sqlite")
+    cache = WalkCache(db)
+    walk(tree, cache)
+    cache.close()
+    listings = cache.hits + cache.misses
+
+    os.remove(os.path.join(tree, "one", "b.txt"))
+    with open(os.path.join(tree, "one", "two", "new.txt"), "w"):
+        pass
+    age(tree)  # the parents changed, but not to the same mtime
+    os.utime(os.path.join(tree, "one"), (OLD + 1, OLD + 1))
+    os.utime(os.path.join(tree, "one", "two"), (OLD + 1, OLD + 1))
+
+    cache = WalkCache(db)
+    found = walk(tree, cache)
+    cache.close()
+    assert os.path.join(tree, "one", "b.txt") not in found
+    assert os.path.join(tree, "one", "two", "new.txt") in found
+    # one and two are relisted, also through the link; a walk lists a
+    # directory twice, the second time from the cache
+    assert cache.misses == 4
+    assert cache.hits == listings - 4
+
+
+@pytest.mark.unit
+def test_recent_dirs_not_cached(tree, tmp_path):
+    db = str(tmp_path / "walk.sqlite")
+    os.utime(os.path.join(tree, "one"))  # now
+    for _ in range(2):
+        cache = WalkCache(db)
+        walk(tree, cache)
+        cache.close()
+    # one, and one through the link, each listed twice by the walk
+    assert cache.misses == 4
+
+
+@pytest.mark.unit
+def test_symlink_target_type_not_cached(tree, tmp_path):
+    db = str(tmp_path / "walk.sqlite")
+    cache = WalkCache(db)
+    walk(tree, cache)
+    cache.close()
+
+    os.rename(os.path.join(tree, "one"), os.path.join(tree, "moved"))
+    with open(os.path.join(tree, "one"), "w"):
+        pass
+    os.utime(tree, (OLD, OLD))  # hide the change from the cache
+
+    cache = WalkCache(db)
+    entries = {e.name: e for e in cache.scandir(tree)}
+    cache.close()
+    assert cache.hits == 1
+    assert entries["link"].is_symlink()
+    assert entries["link"].is_file() and not entries["link"].is_dir()
+
+
+@pytest.mark.func
+def test_main_walk_cache(tree, tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    db = str(tmp_path / "walk.sqlite")
+    args = ["--root-dir", tree, "-p", "**/*.txt", "-x", "true", "--walk-cache", db]
+    # root, one, two, three, and link, link/two, link/two/three
+    main(args)
+    assert "Walk cache: 7 listings reused, 7 directories listed" in caplog.text
+    caplog.clear()
+    main(args)
+    assert "Walk cache: 14 listings reused, 0 directories listed" in caplog.text
+    caplog.clear()
+    main(args + ["--rebuild-walk-cache"])
+    assert "Walk cache: 7 listings reused, 7 directories listed" in caplog.text
@@ -0,0 +1,178 @@
+import logging
+import os
+import re
+import sys
+import threading
+from time import sleep, time
+from typing import List
+
+import pytest
+
+from xfind.__main__ import main
+from xfind.util.fnmatch_ import PatternSet
+from xfind.util.glob_ import iglob
+from xfind.util.watch import Watcher, literal_dir
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is Linux only"
+)
+
+
+def later(fn, delay=0.2):
+    def _later():
+        sleep(delay)
+        fn()
+
+    t = threading.Thread(target=_later)
+    t.start()
+    return t
+
+
+def write(path, data="x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(data)
+
+
+def watch(pattern, **kwargs):
+    kwargs = {"find_files": True, "find_dirs": False, "debounce": 0.1, **kwargs}
+    return Watcher(pattern, **kwargs)
+
+
+@pytest.mark.unit
+def test_literal_dir():
+    assert literal_dir(os.path.join("/a", "b", "**", "*.txt")) == "/a/b"
+    assert literal_dir(os.path.join("/a", "b.txt")) == "/a"
+    assert literal_dir("*.txt") == ""
+    assert literal_dir("/*") == "/"
+
+
+@pytest.mark.unit
+def test_watches_only_dirs_that_could_match(tmp_path):
+    for d in ["src/a/deep", "src/.hidden", "docs"]:
+        (tmp_path / d).mkdir(parents=True)
+    w = watch(str(tmp_path / "src" / "*" / "*.py"))
+    # src and src/a, not docs, src/a/deep (too deep) or src/.hidden
+    assert len(w) == 2
+    w.close()
+
+
+@pytest.mark.unit
+def test_walked_watches_as_listed(tmp_path):
+    for d in ["src/a/deep", "src/b", "src/.hidden", "docs"]:
+        (tmp_path / d).mkdir(parents=True)
+    pattern = str(tmp_path / "src" / "*" / "*.py")
+    w = watch(pattern, walked=True)
+    assert len(w) == 1  # only the literal prefix, until the search lists more
+    listed: List[str] = []
+
+    def _scandir(dirname):
+        listed.append(dirname)
+        return list(os.scandir(dirname))
+
+    assert list(iglob(pattern, recursive=True, scandir=w.watching(_scandir))) == []
+    assert sorted(listed) == [str(tmp_path / d) for d in ["src", "src/a", "src/b"]]
+    assert len(w) == 3
+
+    t = later(lambda: write(str(tmp_path / "src" / "b" / "new.py")))
+    found = list(w.events(time() + 1))
+    t.join()
+    w.close()
+    assert found == [str(tmp_path / "src" / "b" / "new.py")]
+
+
+@pytest.mark.unit
+def test_walked_literal_part_walks_itself(tmp_path):
+    (tmp_path / "a").mkdir()
+    # the search only checks a/setup.py exists, without listing a
+    w = watch(str(tmp_path / "*" / "setup.py"), walked=True)
+    assert len(w) == 2
+    w.close()
+
+
+@pytest.mark.unit
+def test_new_and_changed_files(tmp_path):
+    (tmp_path / "old.txt").write_text("x")
+    w = watch(str(tmp_path / "**" / "*.txt"))
+
+    def _changes():
+        write(str(tmp_path / "old.txt"), "changed")
+        write(str(tmp_path / "new.txt"))
+        write(str(tmp_path / "new.log"))
+        write(str(tmp_path / ".hidden.txt"))
+        write(str(tmp_path / "sub" / "deep" / "a.txt"))
+
+    t = later(_changes)
+    found = list(w.events(time() + 1))
+    t.join()
+    w.close()
+    assert sorted(found) == sorted(
+        str(tmp_path / p) for p in ["old.txt", "new.txt", "sub/deep/a.txt"]
+    )
+
+
+@pytest.mark.unit
+def test_debounce(tmp_path):
+    w = watch(str(tmp_path / "*.txt"), debounce=0.5)
+
+    def _writes():
+        for i in range(5):
+            write(str(tmp_path / "a.txt"), str(i))
+            sleep(0.1)
+
+    t = later(_writes, 0)
+    found = list(w.events(time() + 1.5))
+    t.join()
+    w.close()
+    assert found == [str(tmp_path / "a.txt")]
+
+
+@pytest.mark.unit
+def test_omits_and_moves(tmp_path):
+    (tmp_path / "out").mkdir()
+    write(str(tmp_path / "out" / "moved" / "a.txt"))
+    (tmp_path / "root").mkdir()
+    root = tmp_path / "root"
+    omits = PatternSet([str(root / "skip" / "*")])
+    w = watch(
+        str(root / "**" / "*.txt"),
+        exclude=omits.match,
+        prune=PatternSet([str(root / "skip" / "*")]).match,
+    )
+
+    def _changes():
+        write(str(root / "skip" / "a.txt"))
+        os.rename(tmp_path / "out" / "moved", root / "moved")
+        write(str(root / "moved" / "b.txt"))
+        os.rename(root / "moved", tmp_path / "out" / "away")
+        write(str(tmp_path / "out" / "away" / "c.txt"))
+
+    t = later(_changes)
+    found = list(w.events(time() + 1))
+    t.join()
+    w.close()
+    # a.txt moved in with its dir, but both moved out before the debounce
+    assert found == []
+
+
+@pytest.mark.func
+def test_main_watch(tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    (tmp_path / "a.txt").write_text("x")
+    t = later(lambda: write(str(tmp_path / "sub" / "b.txt")), 0.5)
+    main(
+        [
+            *("--root-dir", str(tmp_path), "-p", "**/*.txt", "-x", "true"),
+            *("--watch", "--watch-debounce", "100ms", "--stop-after", "2s"),
+        ]
+    )
+    t.join()
+    assert "Note: watching 1 directories for new files" in caplog.text
+    m = re.search(r"(\d+) total files processed", caplog.records[-1].message)
+    assert m is not None and m[1] == "2"
+
+
+@pytest.mark.unit
+def test_main_watch_batch(tmp_path):
+    with pytest.raises(ValueError, match="--watch"):
+        main(["--root-dir", str(tmp_path), "-x", "echo {file_names}", "--watch"])
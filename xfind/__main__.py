@@ -1,24 +1,82 @@
 from argparse import ArgumentParser
-from concurrent.futures import ThreadPoolExecutor, Future, CancelledError
-from fnmatch import fnmatch
-from glob import iglob
-from itertools import islice
+from contextlib import ExitStack
+from collections import Counter
+from concurrent.futures import (
+    CancelledError,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from itertools import chain, islice
 import logging.config
+import multiprocessing
 import logging
 import os.path
-from queue import Queue, Empty
 import shlex
 import subprocess
 import sys
-from time import time, sleep
-from typing import Iterable, Optional, Tuple, List
+from threading import BoundedSemaphore
+from time import monotonic, time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Sequence,
+    Tuple,
+    List,
+    Union,
+    cast,
+)
 
 from .adapter import config_file
-from .model.config import Config
-from .util.datetime import utc_from_posix, from_posix
-from .util.itertools import chunk
+from .adapter.call import CompletedCall, load as load_callable, run_callable
+from .adapter.file_list import read_file_list
+from .adapter.history import History, file_size
+from .adapter.call import warm as warm_callable
+from .adapter.journal import Journal
+from .adapter.manifest import Manifest
+from .adapter.metrics_file import MetricsWriter
+from .adapter.results import ResultsWriter, TaskResult, file_format, read_failed
+from .adapter.walk_cache import WalkCache
+from .adapter.output import run_captured, run_captured_async
+from .model.config import ENGINES, LONGEST_FIRST, SCHEDULES, Config
+from .model.template import (
+    BATCH_FIELD,
+    CommandTemplate,
+    Template,
+    all_placeholders,
+)
+from .util.fnmatch_ import PatternSet
+from .util import glob_
+from .util.asyncio_ import AsyncioExecutor
+from .util.concurrency import AdjustableSemaphore, AimdController, DoneCounter
+from .util.logging_ import SAMPLE_KEY, Joined, queued
+from .util.itertools import background, chunk_by_size, largest_first
+from .util.metrics import Metrics, summary as metrics_summary
+from .util.os_ import arg_budget, arg_size, arg_strlen_max, args_size
+from .util.cgroup import Cgroup
+from .util.limits import (
+    ChildLimits,
+    check_ioprio,
+    check_nice,
+    check_rlimit,
+    parse_ioprio,
+)
+from .util.reaper import Reaper, Stopped
+from .util.retry import retrying
+from .util.shard import Shard, ShardFilter
+from .util.watch import Watcher
 
 APP_NAME = "xfind"
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+DEFAULT_LOG_LEVEL = "INFO"
+
+# Placeholders in spool paths, besides those in commands
+SPOOL_FIELDS = {"task_id", "stream"}
 
 
 def main(argv: List[str] = sys.argv[1:]):
@@ -28,17 +86,24 @@ def main(argv: List[str] = sys.argv[1:]):
     args = cli.parse_args(argv)
 
     config, logging_config = args_to_config(args)
-    print(config)
+    configure_logging(config, logging_config)
+
+    logger = logging.getLogger(APP_NAME)
+    with queued([logging.getLogger(), logger], sample_every=config.log_sample):
+        logger.info(f"Config: {config}")
+        run(config, t)
 
+
+def configure_logging(config: Config, logging_config: Optional[dict]):
     if logging_config is None:
         logging.basicConfig(
-            level=logging.DEBUG,
+            level=DEFAULT_LOG_LEVEL,
             format="%(levelname)-1s | %(asctime)s | %(name)s | %(module)s | %(threadName)s | %(message)s",
         )
     else:
         logging.config.dictConfig(logging_config)
-
-    run(config, t)
+    if config.log_level is not None:
+        logging.getLogger(APP_NAME).setLevel(config.log_level.upper())
 
 
 def build_cli() -> ArgumentParser:
@@ -52,18 +117,215 @@ def build_cli() -> ArgumentParser:
         "--omit",
         dest="omits",
         action="append",
-        help="Omit file pattern(s) (glob)",
+        help="Omit file pattern(s) (glob). A pattern ending in * which matches "
+        "a directory path with trailing separator, e.g. **/node_modules/**, skips "
+        "searching that directory",
+    )
+    cli.add_argument(
+        "-x",
+        "--command",
+        help="Command pattern, with placeholders {file_name}, {base_name}, "
+        "{dir_name}, {drive}, {drive_path}, {root_name}, {ext_name}, {rel_path}, "
+        "{size}, {mtime}, {utc_mtime}, {timestamp} and {utc_timestamp}. Each file "
+        "name is one argument, however quoted. Use an unquoted {file_names} to run "
+        "once per batch of files instead of once per file",
+    )
+    cli.add_argument(
+        "--callable",
+        help="Python function to call per file instead of a command, as "
+        "'pkg.module:func'. It is called with the dict of command placeholders, "
+        "on a pool of worker processes",
+    )
+    cli.add_argument(
+        "-n",
+        "--concurrency",
+        type=config_file.parse_concurrency,
+        help="Concurrency, or 'auto' to adjust it while running, between "
+        "--min-concurrency and --max-concurrency",
+    )
+    cli.add_argument(
+        "--min-concurrency",
+        type=int,
+        help="With --concurrency auto, the least workers to use (default 1)",
+    )
+    cli.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="With --concurrency auto, the most workers to use "
+        "(default: 4 x CPUs)",
+    )
+    cli.add_argument(
+        "--auto-interval",
+        type=config_file.parse_duration,
+        help="With --concurrency auto, how often to adjust (default 2s)",
+    )
+    cli.add_argument(
+        "--engine",
+        choices=ENGINES,
+        help="Run tasks on a pool of threads (default), or on one asyncio event "
+        "loop for high concurrency",
+    )
+    cli.add_argument(
+        "--max-pending",
+        type=int,
+        help="Max tasks queued or running at once (default: 4 x concurrency)",
+    )
+    cli.add_argument(
+        "--walk-concurrency",
+        type=int,
+        help="Number of directories to list at once (default: 1)",
+    )
+    cli.add_argument(
+        "--walk-ordered",
+        dest="walk_ordered",
+        action="store_true",
+        help="With --walk-concurrency, keep files in the same order as a serial walk",
+    )
+    cli.add_argument(
+        "--walk-cache",
+        help="File to cache directory listings in, reused by later runs for "
+        "directories whose mtime has not changed",
+    )
+    cli.add_argument(
+        "--rebuild-walk-cache",
+        dest="rebuild_walk_cache",
+        action="store_true",
+        help="Empty the --walk-cache first, and list every directory",
+    )
+    cli.add_argument(
+        "--batch-size",
+        type=int,
+        help="Max files per command, with {file_names} (default: no limit)",
+    )
+    cli.add_argument(
+        "--batch-max-bytes",
+        type=int,
+        help="Max bytes of file names per command, with {file_names} "
+        "(default: as many as the OS allows)",
     )
-    cli.add_argument("-x", "--command", help="Command pattern")
-    cli.add_argument("-n", "--concurrency", type=int, help="Concurrency")
     cli.add_argument(
         "--stop-after",
         type=config_file.parse_duration,
         help="Stop cleanly after specified time, e.g. 2h30m",
     )
+    cli.add_argument(
+        "--hard-stop",
+        dest="hard_stop",
+        action="store_true",
+        help="At --stop-after, also kill tasks still running, instead of waiting "
+        "for them",
+    )
+    cli.add_argument(
+        "--task-timeout",
+        type=config_file.parse_duration,
+        help="Kill any task running longer than this, e.g. 10m",
+    )
+    cli.add_argument(
+        "--retry-exit-code",
+        dest="retry_exit_codes",
+        type=int,
+        action="append",
+        help="Retry a task which exits with this code, as a transient failure "
+        "(may be given more than once)",
+    )
+    cli.add_argument(
+        "--max-retries",
+        type=int,
+        help="With --retry-exit-code, retry a task at most this many times "
+        "(default 3)",
+    )
+    cli.add_argument(
+        "--retry-backoff",
+        type=config_file.parse_duration,
+        help="With --retry-exit-code, wait about this long before the first "
+        "retry, doubling for each retry after (default 1s)",
+    )
+    cli.add_argument(
+        "--kill-grace",
+        type=config_file.parse_duration,
+        help="Time between SIGTERM and SIGKILL when killing a task (default 5s)",
+    )
+    cli.add_argument(
+        "--nice", type=int, help="Run tasks at this CPU niceness, e.g. 10"
+    )
+    cli.add_argument(
+        "--ionice",
+        metavar="CLASS[:LEVEL]",
+        help="Run tasks at this I/O scheduling class and level (Linux), as "
+        "idle, best-effort:0-7 or realtime:0-7",
+    )
+    cli.add_argument(
+        "--rlimit-as",
+        type=config_file.parse_size,
+        metavar="SIZE",
+        help="Limit each task's address space (RLIMIT_AS), e.g. 4G",
+    )
+    cli.add_argument(
+        "--rlimit-cpu",
+        type=config_file.parse_duration,
+        help="Limit each task's CPU time (RLIMIT_CPU), e.g. 10m",
+    )
+    cli.add_argument(
+        "--cgroup",
+        metavar="PARENT",
+        help="Run tasks in a cgroup (v2) created for the run under this parent "
+        "cgroup, e.g. xfind.slice, which must be writable and have no "
+        "processes of its own",
+    )
+    cli.add_argument(
+        "--cgroup-cpu-max",
+        metavar="QUOTA PERIOD",
+        help="With --cgroup, cpu.max for all tasks together, e.g. "
+        "'200000 100000' for two CPUs",
+    )
+    cli.add_argument(
+        "--cgroup-memory-max",
+        help="With --cgroup, memory.max for all tasks together, e.g. 8G",
+    )
+    cli.add_argument(
+        "--cgroup-io-max",
+        help="With --cgroup, io.max for all tasks together, e.g. "
+        "'8:0 rbps=104857600 wbps=max'",
+    )
     cli.add_argument(
         "--limit", type=int, help="Limit number of files (per concurrent task thread)"
     )
+    cli.add_argument(
+        "--files-from",
+        metavar="PATH",
+        help="Read the files to run on from this file, or - for stdin, one per "
+        "line, instead of searching. Relative names are relative to --root-dir. "
+        "--omit, --files and --dirs still apply; --pattern does not",
+    )
+    cli.add_argument(
+        "-0",
+        "--null",
+        dest="files_from_null",
+        action="store_true",
+        help="With --files-from, names are separated by NUL, not newlines (as "
+        "from find -print0 or git ls-files -z)",
+    )
+    cli.add_argument(
+        "--retry-failed-from",
+        metavar="PATH",
+        help="Run only on the files which failed in an earlier run, as recorded "
+        "in its --results file, instead of searching. --omit, --files and --dirs "
+        "still apply; --pattern does not",
+    )
+    cli.add_argument(
+        "--shard",
+        type=Shard.parse,
+        help="Run only on shard K of N, as K/N (from 1/N to N/N). Files are "
+        "assigned to shards by a stable hash of their path relative to "
+        "--root-dir, so N runs with the same settings split the files between "
+        "them",
+    )
+    cli.add_argument(
+        "--shard-depth",
+        type=int,
+        help="With --shard, assign whole directories at this depth below "
+        "--root-dir to shards, so other shards' directories are not searched",
+    )
     cli.add_argument("--root-dir", help="Root directory of file search")
     cli.add_argument(
         "--files",
@@ -83,6 +345,101 @@ def build_cli() -> ArgumentParser:
     cli.add_argument(
         "--no-dirs", dest="find_dirs", action="store_false", help="Omit directories"
     )
+    cli.add_argument(
+        "--manifest",
+        help="SQLite file recording files processed successfully; unchanged files "
+        "are skipped on later runs",
+    )
+    cli.add_argument(
+        "--manifest-hash",
+        dest="manifest_hash",
+        action="store_true",
+        help="With --manifest, compare file contents instead of mtimes",
+    )
+    cli.add_argument(
+        "--watch",
+        dest="watch",
+        action="store_true",
+        help="After the first search, keep watching --root-dir (with Linux "
+        "inotify) and run on new and changed files, until --stop-after",
+    )
+    cli.add_argument(
+        "--watch-debounce",
+        type=config_file.parse_duration,
+        help="With --watch, how long a file must be left alone after writing "
+        "before it is run on (default 1s)",
+    )
+    cli.add_argument(
+        "--schedule",
+        choices=SCHEDULES,
+        help="Order to start tasks in: as files are found (walk, the default), "
+        "or longest-first, of each --schedule-window files found, by their "
+        "--history of durations, or else by size",
+    )
+    cli.add_argument(
+        "--schedule-window",
+        type=int,
+        help="With --schedule longest-first, how many files to read ahead "
+        "(default 1000)",
+    )
+    cli.add_argument(
+        "--history",
+        help="File to record task durations in, to estimate them for --schedule "
+        "longest-first. With --stop-after, tasks not expected to finish in time "
+        "are not started",
+    )
+    cli.add_argument(
+        "--journal",
+        help="File to record each file as its task finishes, for --resume",
+    )
+    cli.add_argument(
+        "--resume",
+        dest="resume",
+        action="store_true",
+        help="Skip files recorded in --journal by earlier runs, instead of "
+        "starting the journal over",
+    )
+    cli.add_argument(
+        "--output-tail-bytes",
+        dest="output_tail_bytes",
+        type=int,
+        help="Bytes kept from the end of each task's captured output, logged on "
+        "failure (default 65536)",
+    )
+    cli.add_argument(
+        "--spool",
+        help="Path template of files to write each task's full captured output "
+        "to, e.g. 'logs/{base_name}.{task_id}.{stream}.log'",
+    )
+    cli.add_argument(
+        "--metrics",
+        help="File to write run metrics to periodically, as a Prometheus "
+        "textfile (.prom) or JSON (.json)",
+    )
+    cli.add_argument(
+        "--metrics-interval",
+        type=config_file.parse_duration,
+        help="How often to write --metrics (default 10s)",
+    )
+    cli.add_argument(
+        "--results",
+        help="File to record each task's outcome to, as JSON lines (.jsonl) or "
+        "CSV (.csv), optionally compressed (.gz, .zst)",
+    )
+    cli.add_argument(
+        "--log-level",
+        type=str.upper,
+        choices=LOG_LEVELS,
+        help=f"Log at this level and above (default {DEFAULT_LOG_LEVEL}, or as "
+        "set in the config file's logging section)",
+    )
+    cli.add_argument(
+        "--log-sample",
+        type=int,
+        metavar="N",
+        help="Log the lines for each file for only about 1 in N files; "
+        "warnings and errors are always logged",
+    )
     cli.add_argument(
         "--stdout", default=False, action="store_true", help="Relay task out to stdout"
     )
@@ -94,104 +451,327 @@ def build_cli() -> ArgumentParser:
     )
 
     cli.set_defaults(
-        find_files=None, find_dirs=None
+        find_files=None,
+        find_dirs=None,
+        walk_ordered=None,
+        rebuild_walk_cache=None,
+        hard_stop=None,
+        watch=None,
+        files_from_null=None,
+        manifest_hash=None,
+        resume=None,
     )  # so these are not defaulted False
     return cli
 
 
 def args_to_config(args) -> Tuple[Config, Optional[dict]]:
     config: Config
+    cli_args = config_file.concurrency_args(vars(args))
     if args.config is None:
-        config = Config.from_args(vars(args))
+        config = Config.from_args(cli_args)
         logging_config = None
     else:
         config, logging_config = config_file.parse_file(args.config)
-        config = config.merge_args(vars(args))
+        config = config.merge_args(cli_args)
     return (config, logging_config)
 
 
 def iglob_with_omits(
-    pattern: str, omits: List[str], *, find_files: bool, find_dirs: bool
+    pattern: str,
+    omits: PatternSet,
+    *,
+    find_files: bool,
+    find_dirs: bool,
+    workers: int = 1,
+    ordered: bool = False,
+    prune: Optional[Callable[[str], bool]] = None,
+    scandir: Optional[glob_.Scandir] = None,
 ) -> Iterable[str]:
+    """
+    Note: omits are matched with `fnmatch` against the whole path, so `*` also
+    matches path separators. An omit pattern ending in `*` (e.g.
+    `**/node_modules/**`) that matches a directory path plus a trailing
+    separator omits everything below that directory, so the directory is not
+    searched at all. The directory itself is only omitted if it also matches.
+    An extra `prune` predicate skips directories the same way.
+    """
+    if len(omits) > 0:
+        omitted = omitted_subtree(omits)
+        prune = omitted if prune is None else any_of(omitted, prune)
+    entries: Iterable[glob_.Entry] = glob_.iglob(
+        pattern,
+        recursive=True,
+        prune=prune,
+        workers=workers,
+        ordered=ordered,
+        scandir=scandir,
+    )
+    if not (find_files and find_dirs):
+        # file type comes from the directory listing, no extra stat needed
+        entries = (
+            e
+            for e in entries
+            if (find_files and e.is_file()) or (find_dirs and e.is_dir())
+        )
     if len(omits) == 0:
-        if find_files and find_dirs:
-            return iglob(pattern, recursive=True)
-        else:
-            return (
-                fname
-                for fname in iglob(pattern, recursive=True)
-                if (find_files and os.path.isfile(fname))
-                or (find_dirs and os.path.isdir(fname))
-            )
+        return (e.path for e in entries)
     else:
-        if find_files and find_dirs:
-            return (
-                fname
-                for fname in iglob(pattern, recursive=True)
-                if not any(fnmatch(fname, o) for o in omits)
-            )
-        else:
-            return (
-                fname
-                for fname in iglob(pattern, recursive=True)
-                if (
-                    (find_files and os.path.isfile(fname))
-                    or (find_dirs and os.path.isdir(fname))
-                )
-                and (not any(fnmatch(fname, o) for o in omits))
-            )
+        return (e.path for e in entries if not omits.match(e.path))
+
+
+def listed_files(paths: Iterable[str], config: Config) -> Iterator[str]:
+    """Files named in a list, filtered as those found would be"""
+    omits = config.compiled_omits()
+    check_type = not (config.find_files and config.find_dirs)
+    for path in paths:
+        if check_type and not (
+            (config.find_files and os.path.isfile(path))
+            or (config.find_dirs and os.path.isdir(path))
+        ):
+            continue
+        if len(omits) > 0 and omits.match(path):
+            continue
+        yield path
+
+
+def omitted_subtree(omits: PatternSet) -> Callable[[str], bool]:
+    # If `x*` matches a prefix, it matches anything that starts with the prefix
+    return PatternSet(o for o in omits.patterns if o.endswith("*")).match
+
+
+def any_of(*predicates: Callable[[str], bool]) -> Callable[[str], bool]:
+    return lambda s: any(p(s) for p in predicates)
 
 
 def run(config: Config, timestamp: float):
     logger = logging.getLogger(APP_NAME)
-    executor = ThreadPoolExecutor(max_workers=config.concurrency)
-    queue = Queue()
-
     stop_time = (
         None
         if config.stop_after is None
         else timestamp + config.stop_after.total_seconds()
     )
-    if config.stop_after is not None:
-        logger.info(f"Note: stopping cleanly after {config.stop_after}")
+    # Everything the config can be rejected for, before any thread, file or
+    # cgroup is made
+    template, spool_template = build_templates(config, timestamp)
+    batch_mode = config.callable is None and template.batch
+    check_config(config, batch_mode=batch_mode)
+    log_stop_note(config, logger)
 
+    metrics = Metrics()
+    skipped: Counter = Counter()
+    estimates: Dict[str, float] = {}
     total_files = 0
-    total_processed = 0
-    pattern = os.path.join(config.root_dir, config.pattern)
-    omits = [os.path.join(config.root_dir, o) for o in config.omits]
-
-    finder = chunk(
-        iglob_with_omits(
-            pattern,
-            omits,
-            find_files=config.find_files,
-            find_dirs=config.find_dirs,
-        ),
-        config.concurrency,
-    )
-    if config.limit is not None:
-        finder = islice(finder, config.limit)
-
-    for source_files in finder:
-        for f in source_files:
-            total_files += 1
-            logger.debug(f"Found: {f}")
-        f_map = {
-            executor.submit(
-                run_in_subprocess,
-                render_command(config.command, f, timestamp),
-                shell=config.shell,
-                relay_stdout=config.stdout,
-                relay_stderr=config.stderr,
-            ): f
-            for f in source_files
-        }
-        for future in f_map:
+    with ExitStack() as stack:
+        # Closed in reverse: the executor first, so that its callbacks have
+        # all run before the files they write to are closed
+        if config.metrics is not None:
+            stack.callback(
+                MetricsWriter(
+                    config.metrics, metrics, config.metrics_interval.total_seconds()
+                ).close
+            )
+        results = None if config.results is None else ResultsWriter(config.results)
+        if results is not None:
+            stack.callback(results.close)
+        journal = open_journal(config, logger)
+        if journal is not None:
+            stack.callback(journal.close)
+        manifest = open_manifest(config, logger)
+        if manifest is not None:
+            stack.callback(manifest.close)
+        history = None if config.history is None else History(config.history)
+        if history is not None:
+            stack.callback(history.close)
+        cgroup = open_cgroup(config, logger)
+        stack.callback(close_cgroup, cgroup, logger)
+        limits = child_limits(config, logger, cgroup)
+        reaper = build_reaper(config)
+        if reaper is not None:
+            stack.callback(reaper.close)
+        walk_cache = open_walk_cache(config, logger)
+        stack.callback(close_walk_cache, walk_cache, logger)
+        watcher = open_watcher(config, logger)
+        if watcher is not None:
+            stack.callback(watcher.close)
+        executor, run_task = build_executor(config)
+        stack.callback(executor.shutdown, wait=True, cancel_futures=True)
+        run_task = with_retries(run_task, config, stop_time)
+        if config.callable is None:
+            run_task = metrics.timed_task(run_task)
+        pending, controller = build_pending_limit(config, metrics, logger)
+        if controller is not None:
+            stack.callback(controller.close)
+        done = DoneCounter()
+
+        finder = find_files(
+            config,
+            journal=journal,
+            manifest=manifest,
+            skipped=skipped,
+            walk_cache=walk_cache,
+            watcher=watcher,
+            stop_time=stop_time,
+        )
+        finder = schedule_files(
+            finder,
+            config,
+            history=history,
+            stop_time=stop_time,
+            skipped=skipped,
+            estimates=estimates,
+        )
+
+        tasks: Iterable[List[str]]
+        if batch_mode:
+            tasks = batch_files(finder, config, template)
+        else:
+            if config.batch_size is not None or config.batch_max_bytes is not None:
+                logger.warning(
+                    f"Batch settings ignored: command has no {{{BATCH_FIELD}}}"
+                )
+            tasks = ([f] for f in finder)
+
+        for task_id, source_files in enumerate(metrics.timed_iter(tasks, "discover")):
+            metrics.add_files("discovered", len(source_files))
+            t0 = monotonic()
+            acquired = acquire_before(pending, stop_time)
+            metrics.add_seconds("dispatch_wait", monotonic() - t0)
+            if not acquired:
+                logger.info("Stop time reached, no more tasks will be started")
+                if manifest is not None:
+                    manifest.forget(source_files)
+                break
+            if past_stop_time(source_files, estimates, stop_time, skipped):
+                pending.release()
+                if manifest is not None:
+                    manifest.forget(source_files)
+                continue
+            for f in source_files:
+                total_files += 1
+                logger.debug("Found: %s", f, extra={SAMPLE_KEY: f})
+            future = submit_task(
+                executor,
+                run_task,
+                config,
+                source_files,
+                task_id,
+                template=template,
+                spool_template=spool_template,
+                timestamp=timestamp,
+                batch_mode=batch_mode,
+                reaper=reaper,
+                limits=limits,
+                metrics=metrics,
+            )
+            metrics.add_tasks("submitted")
+            metrics.add_files("dispatched", len(source_files))
+            future.add_done_callback(lambda _: pending.release())
             future.add_done_callback(
-                ProcessCallback(f_map[future], queue=queue, logger=logger)
+                ProcessCallback(
+                    source_files,
+                    done=done,
+                    logger=logger,
+                    manifest=manifest,
+                    journal=journal,
+                    metrics=metrics,
+                    history=history,
+                    results=results,
+                    task_id=task_id,
+                )
             )
 
+        total_processed = wait_for_tasks(
+            executor,
+            done,
+            total_files,
+            stop_time=stop_time,
+            reaper=reaper if config.hard_stop else None,
+            logger=logger,
+        )
+
+    summary = [f"{total_processed} total files processed"]
+    summary.extend(skipped_summary(config, skipped))
+    snapshot = metrics.snapshot()
+    summary.extend(retry_summary(config, snapshot))
+    logger.info(f"Metrics: {metrics_summary(snapshot)}")
+    logger.info(f"Done: {', '.join(summary)}.")
+
+
+def log_stop_note(config: Config, logger: logging.Logger):
     if config.stop_after is None:
+        return
+    if config.hard_stop:
+        logger.info(f"Note: stopping, killing any tasks, after {config.stop_after}")
+    else:
+        logger.info(f"Note: stopping cleanly after {config.stop_after}")
+
+
+def check_config(config: Config, *, batch_mode: bool):
+    """Raise ValueError if the options cannot be used together"""
+    if config.files_from is not None and config.retry_failed_from is not None:
+        raise ValueError("Cannot use both --files-from and --retry-failed-from")
+    if config.resume and config.journal is None:
+        raise ValueError("Cannot resume without a journal")
+    if config.results is not None:
+        file_format(config.results)
+    if config.watch:
+        if config.files_from is not None:
+            raise ValueError("--files-from cannot be used with --watch")
+        if batch_mode:
+            # A batch would wait for more files to be written to fill it
+            raise ValueError(
+                f"Command with {{{BATCH_FIELD}}} cannot be used with --watch"
+            )
+    if config.auto_concurrency and config.min_concurrency > config.max_workers:
+        raise ValueError(
+            f"Min concurrency {config.min_concurrency} is more than max "
+            f"{config.max_workers}"
+        )
+
+
+def skipped_summary(config: Config, skipped: Counter) -> List[str]:
+    summary = []
+    if config.journal is not None and config.resume:
+        summary.append(f"{skipped['done']} already done files skipped")
+    if config.manifest is not None:
+        summary.append(f"{skipped['unchanged']} unchanged files skipped")
+    if skips_by_deadline(config):
+        summary.append(
+            f"{skipped['deadline']} files skipped, not expected to finish in time"
+        )
+    return summary
+
+
+def retry_summary(config: Config, snapshot: Dict[str, Any]) -> List[str]:
+    summary = []
+    if config.retry_failed_from is not None:
+        summary.append(
+            f"{snapshot['files']['dispatched']} failed files retried, "
+            f"{snapshot['files']['succeeded']} succeeded"
+        )
+    if len(config.retry_exit_codes) > 0:
+        summary.append(
+            f"{snapshot['files_retried']} files retried in the run, "
+            f"{snapshot['files_retry_succeeded']} succeeded on retry"
+        )
+    return summary
+
+
+def wait_for_tasks(
+    executor: Executor,
+    done: DoneCounter,
+    total_files: int,
+    *,
+    stop_time: Optional[float],
+    reaper: Optional[Reaper],
+    logger: logging.Logger,
+) -> int:
+    """
+    Wait for all tasks, or until stop_time, then shut down the executor. If a
+    reaper is given, tasks still running at stop_time are killed. Returns the
+    number of files processed.
+    """
+    if stop_time is None:
         # Wait for running futures and all pending futures to finish
         logger.info("Waiting for all tasks to complete")
         executor.shutdown(wait=True, cancel_futures=False)
@@ -199,49 +779,609 @@ def run(config: Config, timestamp: float):
     else:
         # Let the workers work until stop_after has elapsed
         # or until all found files have been processed
-        remain = stop_time - time()
-        while remain > 0 and total_processed < total_files:
-            try:
-                _ = queue.get_nowait()
-                queue.task_done()
-                total_processed += 1
-            except Empty:
-                sleep(0.1)
-            remain = stop_time - time()
-
-        # Wait for running futures, but cancel all pending futures
-        logger.info("Waiting for currently running tasks to complete")
+        done.wait_for(total_files, timeout=max(stop_time - time(), 0))
+
+        # Cancel all pending futures, and wait for (or kill) running futures
+        if reaper is None:
+            logger.info("Waiting for currently running tasks to complete")
+        else:
+            logger.info("Killing currently running tasks")
+            reaper.stop_all()
         executor.shutdown(wait=True, cancel_futures=True)
 
-    # Count those completed in the shutdown
-    while True:
+    # Including those completed in the shutdown
+    return done.count
+
+
+def find_files(
+    config: Config,
+    *,
+    journal: Optional[Journal],
+    manifest: Optional[Manifest],
+    skipped: Counter,
+    walk_cache: Optional[WalkCache] = None,
+    watcher: Optional[Watcher] = None,
+    stop_time: Optional[float] = None,
+) -> Iterable[str]:
+    """
+    Files to run the command on, counting those skipped by reason. Files the
+    `watcher` reports, until `stop_time`, are run on after those found.
+    """
+    logger = logging.getLogger(APP_NAME)
+    shard = shard_filter(config)
+    finder: Iterable[str]
+    if config.files_from is not None:
+        logger.info(f"Note: reading files to run on from {config.files_from}")
+        finder = listed_files(
+            (
+                os.path.join(config.root_dir, name)
+                for name in read_file_list(
+                    config.files_from, null=config.files_from_null
+                )
+            ),
+            config,
+        )
+    elif config.retry_failed_from is not None:
+        # paths are as they were run, so not relative to root_dir again
+        logger.info(f"Note: retrying files which failed in {config.retry_failed_from}")
+        finder = listed_files(read_failed(config.retry_failed_from), config)
+    else:
+        scandir: Optional[glob_.Scandir] = (
+            None if walk_cache is None else walk_cache.scandir
+        )
+        if watcher is not None:
+            scandir = watcher.watching(scandir)
+        if stop_time is not None:
+            # Stop the walk at the stop time, even if nothing has matched
+            scandir = listing_until(stop_time, scandir)
+        finder = iglob_with_omits(
+            os.path.join(config.root_dir, config.pattern),
+            config.compiled_omits(),
+            find_files=config.find_files,
+            find_dirs=config.find_dirs,
+            workers=config.walk_concurrency,
+            ordered=config.walk_ordered,
+            prune=None if shard is None else shard.pruned,
+            scandir=scandir,
+        )
+    if watcher is not None:
+        finder = chain(finder, watched_files(watcher, stop_time))
+    if shard is not None:
+        logger.info(f"Note: running on shard {config.shard} only")
+        finder = filter(shard, finder)
+    elif config.shard_depth is not None:
+        logger.warning("Shard depth ignored: no --shard")
+    if config.walk_concurrency > 1:
+        # Walk on its own thread, up to max_pending files ahead of dispatch
+        finder = background(finder, config.pending_limit)
+
+    if journal is not None and config.resume:
+
+        def _not_done(f: str) -> bool:
+            if f in journal:
+                skipped["done"] += 1
+                return False
+            return True
+
+        finder = filter(_not_done, finder)
+
+    if manifest is not None:
+
+        def _changed(f: str) -> bool:
+            if manifest.unchanged(f):
+                skipped["unchanged"] += 1
+                logger.debug("Unchanged: %s", f, extra={SAMPLE_KEY: f})
+                return False
+            return True
+
+        finder = filter(_changed, finder)
+
+    if config.limit is not None:
+        finder = islice(finder, config.limit * config.max_workers)
+    return finder
+
+
+def schedule_files(
+    finder: Iterable[str],
+    config: Config,
+    *,
+    history: Optional[History],
+    stop_time: Optional[float],
+    skipped: Counter,
+    estimates: Dict[str, float],
+) -> Iterable[str]:
+    """
+    Files in the order to start their tasks in, counting those skipped. The
+    expected durations of those yielded are put in `estimates`.
+    """
+    logger = logging.getLogger(APP_NAME)
+    if config.schedule != LONGEST_FIRST:
+        return finder
+    if config.watch:
+        # Reading ahead would hold up watched files until the window fills
+        logger.warning("Schedule ignored: --watch")
+        return finder
+    if stop_time is not None and history is None:
+        logger.warning(
+            "No files skipped for --stop-after: longest-first needs --history "
+            "to tell which will not finish in time"
+        )
+    return longest_first(
+        finder,
+        config.schedule_window,
+        history=history,
+        stop_time=stop_time,
+        skipped=skipped,
+        estimates=estimates,
+    )
+
+
+def longest_first(
+    finder: Iterable[str],
+    window: int,
+    *,
+    history: Optional[History],
+    stop_time: Optional[float],
+    skipped: Counter,
+    estimates: Dict[str, float],
+) -> Iterator[str]:
+    """
+    Of each `window` files, the one expected to take longest first: by its
+    estimated duration if there is history, then by size. With a stop time,
+    files whose estimate runs past it are skipped. The estimate is checked
+    again once a worker is free, see `past_stop_time`.
+    """
+    logger = logging.getLogger(APP_NAME)
+
+    def _expected(f: str) -> Tuple[float, int]:
+        size = file_size(f) or 0
+        seconds = None if history is None else history.estimate(f, size)
+        return (seconds or 0.0, size)
+
+    for (seconds, _), f in largest_first(finder, window, _expected):
+        if stop_time is not None and seconds > 0 and time() + seconds > stop_time:
+            skipped["deadline"] += 1
+            logger.debug(
+                "Not expected to finish by stop time (%.3gs): %s",
+                seconds,
+                f,
+                extra={SAMPLE_KEY: f},
+            )
+            continue
+        if stop_time is not None and seconds > 0:
+            estimates[f] = seconds
+        yield f
+
+
+def skips_by_deadline(config: Config) -> bool:
+    """Whether tasks are skipped if not expected to finish by the stop time"""
+    return (
+        config.schedule == LONGEST_FIRST
+        and not config.watch
+        and config.stop_after is not None
+        and config.history is not None
+    )
+
+
+def past_stop_time(
+    source_files: List[str],
+    estimates: Dict[str, float],
+    stop_time: Optional[float],
+    skipped: Counter,
+) -> bool:
+    """
+    True if a task on the files, started now, is not expected to finish by the
+    stop time, counting them as skipped. Their estimates are used up.
+    """
+    seconds = sum(estimates.pop(f, 0.0) for f in source_files)
+    if stop_time is None or seconds <= 0 or time() + seconds <= stop_time:
+        return False
+    skipped["deadline"] += len(source_files)
+    logging.getLogger(APP_NAME).debug(
+        "Not expected to finish by stop time (%.3gs): %s",
+        seconds,
+        Joined(source_files),
+        extra={SAMPLE_KEY: source_files[0]},
+    )
+    return True
+
+
+def shard_filter(config: Config) -> Optional[ShardFilter]:
+    if config.shard is None:
+        return None
+    return ShardFilter(config.shard, config.root_dir, config.shard_depth)
+
+
+def open_watcher(config: Config, logger: logging.Logger) -> Optional[Watcher]:
+    """Start watching, before the first search, so no file is missed between"""
+    if not config.watch:
+        return None
+    omits = config.compiled_omits()
+    shard = shard_filter(config)
+    prunes: List[Callable[[str], bool]] = [] if shard is None else [shard.pruned]
+    if len(omits) > 0:
+        prunes.append(omitted_subtree(omits))
+    watcher = Watcher(
+        os.path.join(config.root_dir, config.pattern),
+        find_files=config.find_files,
+        find_dirs=config.find_dirs,
+        debounce=config.watch_debounce.total_seconds(),
+        exclude=omits.match if len(omits) > 0 else None,
+        prune=any_of(*prunes) if len(prunes) > 0 else None,
+        on_error=lambda e: logger.warning(f"Cannot watch: {e}"),
+        # the first search adds the watches as it lists directories
+        walked=config.retry_failed_from is None,
+    )
+    return watcher
+
+
+def listing_until(
+    stop_time: float, scandir: Optional[glob_.Scandir]
+) -> glob_.Scandir:
+    """Directories listed as empty once the stop time passes"""
+    list_dir = glob_._scandir if scandir is None else scandir
+
+    def _until(dirname: str) -> Sequence[glob_.DirEntryLike]:
+        return [] if time() >= stop_time else list_dir(dirname)
+
+    return _until
+
+
+def watched_files(watcher: Watcher, stop_time: Optional[float]) -> Iterator[str]:
+    """New and changed files, once the first search (and its watches) is done"""
+    logger = logging.getLogger(APP_NAME)
+    logger.info(f"Note: watching {len(watcher)} directories for new files")
+    yield from watcher.events(stop_time)
+
+
+def open_walk_cache(config: Config, logger: logging.Logger) -> Optional[WalkCache]:
+    if config.walk_cache is None:
+        if config.rebuild_walk_cache:
+            logger.warning("Rebuild walk cache ignored: no --walk-cache")
+        return None
+    if config.files_from is not None:
+        logger.warning("Walk cache ignored: --files-from")
+        return None
+    return WalkCache(config.walk_cache, rebuild=config.rebuild_walk_cache)
+
+
+def close_walk_cache(walk_cache: Optional[WalkCache], logger: logging.Logger):
+    if walk_cache is None:
+        return
+    walk_cache.close()
+    logger.info(
+        f"Walk cache: {walk_cache.hits} listings reused, "
+        f"{walk_cache.misses} directories listed"
+    )
+
+
+def open_journal(config: Config, logger: logging.Logger) -> Optional[Journal]:
+    if config.journal is None:
+        return None
+    journal = Journal(config.journal, config.root_dir, resume=config.resume)
+    if config.resume:
+        logger.info(f"Note: resuming, {len(journal)} files already done")
+    return journal
+
+
+def open_manifest(config: Config, logger: logging.Logger) -> Optional[Manifest]:
+    if config.manifest is None:
+        return None
+    logger.info("Note: skipping files unchanged since the last run")
+    return Manifest(
+        config.manifest,
+        config.command if config.callable is None else config.callable,
+        use_hash=config.manifest_hash,
+    )
+
+
+def build_executor(config: Config) -> Tuple[Executor, Callable]:
+    """The executor to run tasks on, and the task function for it"""
+    if config.callable is not None:
+        load_callable(config.callable)  # fail now if it cannot be imported
+        ignored = [
+            k
+            for k in (
+                "spool",
+                "task_timeout",
+                "shell",
+                "batch_size",
+                "nice",
+                "ionice",
+                "rlimit_as",
+                "rlimit_cpu",
+                "cgroup",
+            )
+            if getattr(config, k) not in (None, False)
+        ]
+        if len(ignored) > 0:
+            logging.getLogger(APP_NAME).warning(
+                f"Ignored with callable: {', '.join(ignored)}"
+            )
+        return (
+            ProcessPoolExecutor(
+                max_workers=config.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_callable,
+                initargs=(config.callable,),
+            ),
+            run_callable,
+        )
+    elif config.engine == "thread":
+        return (ThreadPoolExecutor(max_workers=config.max_workers), run_in_subprocess)
+    elif config.engine == "asyncio":
+        return (AsyncioExecutor(max_workers=config.max_workers), run_in_subprocess_async)
+    else:
+        raise ValueError(f"Unknown engine: {config.engine}")
+
+
+def with_retries(
+    run_task: Callable, config: Config, stop_time: Optional[float]
+) -> Callable:
+    """The task function, retrying on --retry-exit-code if given"""
+    if len(config.retry_exit_codes) == 0:
+        return run_task
+    return retrying(
+        run_task,
+        exit_codes=frozenset(config.retry_exit_codes),
+        max_retries=config.max_retries,
+        backoff=config.retry_backoff.total_seconds(),
+        stop_time=stop_time,
+    )
+
+
+def submit_task(
+    executor: Executor,
+    run_task: Callable,
+    config: Config,
+    source_files: List[str],
+    task_id: int,
+    *,
+    template: CommandTemplate,
+    spool_template: Optional[Template],
+    timestamp: float,
+    batch_mode: bool,
+    reaper: Optional[Reaper],
+    metrics: Metrics,
+    limits: Optional[ChildLimits] = None,
+) -> Future:
+    try:
+        if config.callable is not None:
+            data = all_placeholders(source_files[0], timestamp, config.root_dir)
+        elif batch_mode:
+            command = template.render_batch(source_files)
+        else:
+            command = template.render(source_files[0])
+        spool = (
+            None
+            if spool_template is None
+            else render_spool(
+                spool_template, source_files, task_id, batch_mode=batch_mode
+            )
+        )
+    except OSError as e:
+        # e.g. the file is gone before its size could be filled in
+        failed: Future = Future()
+        failed.set_exception(e)
+        return failed
+
+    if config.callable is not None:
+        # Note: the call is timed in the worker, but counted as started here
+        t0 = metrics.task_started()
+        future = executor.submit(
+            run_task,
+            config.callable,
+            data,
+            relay_stdout=config.stdout,
+            relay_stderr=config.stderr,
+            tail_bytes=config.output_tail_bytes,
+        )
+        future.add_done_callback(lambda f: metrics.task_finished(call_seconds(f, t0)))
+        return future
+
+    return executor.submit(
+        run_task,
+        command,
+        shell=config.shell,
+        relay_stdout=config.stdout,
+        relay_stderr=config.stderr,
+        tail_bytes=config.output_tail_bytes,
+        spool=spool,
+        reaper=reaper,
+        limits=limits,
+        sample_key=source_files[0],
+    )
+
+
+def call_seconds(future: Future, t0: float) -> Optional[float]:
+    if future.cancelled():
+        return None
+    if future.exception() is not None:
+        return monotonic() - t0
+    return cast(CompletedCall, future.result()).seconds
+
+
+def build_reaper(config: Config) -> Optional[Reaper]:
+    if config.task_timeout is None and not config.hard_stop:
+        return None
+    return Reaper(
+        timeout=(
+            None
+            if config.task_timeout is None
+            else config.task_timeout.total_seconds()
+        ),
+        grace=config.kill_grace.total_seconds(),
+    )
+
+
+def open_cgroup(config: Config, logger: logging.Logger) -> Optional[Cgroup]:
+    """The cgroup to run tasks in, with its limits set, if one can be made"""
+    limits = {
+        "cpu.max": config.cgroup_cpu_max,
+        "memory.max": config.cgroup_memory_max,
+        "io.max": config.cgroup_io_max,
+    }
+    if config.cgroup is None:
+        if any(v is not None for v in limits.values()):
+            logger.warning("Cgroup limits ignored: no --cgroup")
+        return None
+    try:
+        cgroup = Cgroup(config.cgroup, f"{APP_NAME}-{os.getpid()}")
+    except OSError as e:
+        logger.warning(f"Not running tasks in a cgroup: {e}")
+        return None
+    for file_name, value in limits.items():
+        if value is not None:
+            try:
+                cgroup.set_limit(file_name, value)
+            except OSError as e:
+                logger.warning(f"Cgroup {file_name} not set: {e}")
+    logger.info(f"Note: running tasks in cgroup {cgroup.path}")
+    return cgroup
+
+
+def close_cgroup(cgroup: Optional[Cgroup], logger: logging.Logger):
+    if cgroup is None:
+        return
+    try:
+        cgroup.close()
+    except OSError as e:
+        logger.warning(f"Cgroup {cgroup.path} not removed: {e}")
+
+
+def child_limits(
+    config: Config, logger: logging.Logger, cgroup: Optional[Cgroup]
+) -> Optional[ChildLimits]:
+    """Limits to set on each task's process, leaving out any that cannot be set"""
+    nice = ioprio = None
+    rlimits = []
+    if config.nice is not None:
+        try:
+            check_nice(config.nice)
+            nice = config.nice
+        except OSError as e:
+            logger.warning(f"Nice not set for tasks: {e.strerror}")
+    if config.ionice is not None:
         try:
-            _ = queue.get_nowait()
-            queue.task_done()
-            total_processed += 1
-        except Empty:
-            break
-
-    logger.info(f"Done: {total_processed} total files processed.")
-
-
-def render_command(command: str, source_file: str, timestamp: float) -> List[str]:
-    file_name = os.path.abspath(source_file)
-    root, ext = os.path.splitext(file_name)
-    dir_name = os.path.dirname(file_name)
-    drive, path = os.path.splitdrive(dir_name)
-    data = {
-        "file_name": file_name,
-        "base_name": os.path.basename(file_name),
-        "dir_name": dir_name,
-        "drive": drive,
-        "drive_path": path,
-        "root_name": root,
-        "ext_name": ext,
-        "timestamp": from_posix(timestamp),
-        "utc_timestamp": utc_from_posix(timestamp),
+            ioprio = parse_ioprio(config.ionice)
+            check_ioprio(ioprio)
+        except OSError as e:
+            ioprio = None
+            logger.warning(f"I/O priority not set for tasks: {e.strerror}")
+    cpu_seconds = (
+        None if config.rlimit_cpu is None else int(config.rlimit_cpu.total_seconds())
+    )
+    for name, limit in (("RLIMIT_AS", config.rlimit_as), ("RLIMIT_CPU", cpu_seconds)):
+        if limit is not None:
+            try:
+                rlimits.append(check_rlimit(name, limit))
+            except OSError as e:
+                logger.warning(f"{name} not set for tasks: {e.strerror}")
+    procs = None if cgroup is None else cgroup.procs_path
+    if nice is None and ioprio is None and len(rlimits) == 0 and procs is None:
+        return None
+    return ChildLimits(nice, ioprio, tuple(rlimits), procs)
+
+
+def build_pending_limit(
+    config: Config, metrics: Metrics, logger: logging.Logger
+) -> Tuple[Union[BoundedSemaphore, AdjustableSemaphore], Optional[AimdController]]:
+    """
+    Bound the number of submitted-but-unfinished tasks, so that discovery only
+    runs ahead of the workers by a fixed amount. With auto_concurrency, the
+    bound is the number of workers to use, adjusted while running.
+    """
+    if not config.auto_concurrency:
+        # So a slot is only free once a worker is, for the deadline check
+        limit = config.max_workers if skips_by_deadline(config) else None
+        return (BoundedSemaphore(limit or config.pending_limit), None)
+
+    def _log_change(old: int, new: int, reason: str):
+        logger.info(f"Concurrency {old} -> {new}: {reason}")
+
+    sem = AdjustableSemaphore(config.min_concurrency)
+    controller = AimdController(
+        sem,
+        metrics,
+        min_limit=config.min_concurrency,
+        max_limit=config.max_workers,
+        interval=config.auto_interval.total_seconds(),
+        on_change=_log_change,
+    )
+    logger.info(
+        f"Note: adjusting concurrency between {config.min_concurrency} "
+        f"and {config.max_workers}"
+    )
+    controller.start()
+    return (sem, controller)
+
+
+def acquire_before(
+    sem: Union[BoundedSemaphore, AdjustableSemaphore], stop_time: Optional[float]
+) -> bool:
+    """Wait for a free slot, giving up if stop_time passes first"""
+    if stop_time is None:
+        return sem.acquire()
+    remain = stop_time - time()
+    return remain > 0 and sem.acquire(timeout=remain)
+
+
+def build_templates(
+    config: Config, timestamp: float
+) -> Tuple[CommandTemplate, Optional[Template]]:
+    """The command and spool path templates, parsed once for the run"""
+    template = CommandTemplate(config.command, timestamp, root_dir=config.root_dir)
+    spool = (
+        None
+        if config.spool is None
+        else Template(
+            config.spool,
+            timestamp,
+            root_dir=config.root_dir,
+            extra_fields=SPOOL_FIELDS,
+        )
+    )
+    if template.batch and config.callable is None:
+        # In batch mode, there is no single file to fill in per-file placeholders
+        for label, t in (("Command", template), ("Spool path", spool)):
+            if t is not None and len(t.per_file) > 0:
+                fields = ", ".join(f"{{{f}}}" for f in sorted(t.per_file))
+                raise ValueError(
+                    f"{label} with {{{BATCH_FIELD}}} cannot also use per-file {fields}"
+                )
+    return (template, spool)
+
+
+def batch_files(
+    files: Iterable[str], config: Config, template: CommandTemplate
+) -> Iterator[List[str]]:
+    """Group files into batches that fit on one command line"""
+    max_bytes = arg_budget() - args_size(template.render_batch([]))
+    size: Callable[[str], int] = lambda f: arg_size(os.path.abspath(f))
+    embedded = template.embedded_batch_args()
+    if len(embedded) > 0:
+        # All the names go in each such argument, quoted for a shell, and an
+        # argument may be limited in size, apart from the whole command line
+        max_bytes //= len(embedded)
+        strlen_max = arg_strlen_max()
+        if strlen_max is not None:
+            longest = max(len(os.fsencode(a)) for a in embedded)
+            max_bytes = min(max_bytes, strlen_max - longest - 1)
+        size = lambda f: len(os.fsencode(shlex.quote(os.path.abspath(f)))) + 1
+    if config.batch_max_bytes is not None:
+        max_bytes = min(max_bytes, config.batch_max_bytes)
+    return chunk_by_size(files, config.batch_size, max_bytes, size)
+
+
+def render_spool(
+    spool: Template, source_files: List[str], task_id: int, *, batch_mode: bool
+) -> Dict[str, str]:
+    """Spool file paths, by stream"""
+    source_file = None if batch_mode else source_files[0]
+    return {
+        stream: spool.format(source_file, task_id=task_id, stream=stream)
+        for stream in ("stdout", "stderr")
     }
-    return shlex.split(command.format(**data))
 
 
 def run_in_subprocess(
@@ -250,24 +1390,78 @@ def run_in_subprocess(
     shell: bool,
     relay_stdout: bool,
     relay_stderr: bool,
+    tail_bytes: int,
+    spool: Optional[Dict[str, str]] = None,
+    reaper: Optional[Reaper] = None,
+    limits: Optional[ChildLimits] = None,
+    sample_key: Optional[str] = None,
+) -> subprocess.CompletedProcess:
+    logger = logging.getLogger(APP_NAME)
+    logger.debug("Running: `%s`", Joined(command), extra={SAMPLE_KEY: sample_key})
+    t = monotonic()
+    result = run_captured(
+        command,
+        shell=shell,
+        relay_stdout=relay_stdout,
+        relay_stderr=relay_stderr,
+        tail_bytes=tail_bytes,
+        spool=spool,
+        reaper=reaper,
+        limits=limits,
+    )
+    return CompletedCall.timed(result, monotonic() - t)
+
+
+async def run_in_subprocess_async(
+    command: List[str],
+    *,
+    shell: bool,
+    relay_stdout: bool,
+    relay_stderr: bool,
+    tail_bytes: int,
+    spool: Optional[Dict[str, str]] = None,
+    reaper: Optional[Reaper] = None,
+    limits: Optional[ChildLimits] = None,
+    sample_key: Optional[str] = None,
 ) -> subprocess.CompletedProcess:
     logger = logging.getLogger(APP_NAME)
-    logger.debug(f"Running: `{shlex.join(command)}`")
-    return subprocess.run(
+    logger.debug("Running: `%s`", Joined(command), extra={SAMPLE_KEY: sample_key})
+    t = monotonic()
+    result = await run_captured_async(
         command,
         shell=shell,
-        stdout=sys.stdout if relay_stdout else subprocess.PIPE,
-        stderr=sys.stderr if relay_stderr else subprocess.PIPE,
-        encoding="utf-8",
-        errors="ignore",
+        relay_stdout=relay_stdout,
+        relay_stderr=relay_stderr,
+        tail_bytes=tail_bytes,
+        spool=spool,
+        reaper=reaper,
+        limits=limits,
     )
+    return CompletedCall.timed(result, monotonic() - t)
 
 
 class ProcessCallback:
-    def __init__(self, source_file: str, queue: Queue, logger: logging.Logger):
-        self.source_file = source_file
-        self.queue = queue
+    def __init__(
+        self,
+        source_files: List[str],
+        done: DoneCounter,
+        logger: logging.Logger,
+        manifest: Optional[Manifest] = None,
+        journal: Optional[Journal] = None,
+        metrics: Optional[Metrics] = None,
+        history: Optional[History] = None,
+        results: Optional[ResultsWriter] = None,
+        task_id: Optional[int] = None,
+    ):
+        self.source_files = source_files
+        self.done = done
         self.logger = logger
+        self.manifest = manifest
+        self.journal = journal
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.history = history
+        self.results = results
+        self.task_id = task_id
 
     def __call__(self, future: Future):
         logger = self.logger
@@ -276,25 +1470,142 @@ class ProcessCallback:
             result = future.result()
 
         except CancelledError:
-            logger.debug(f"Task cancelled for {self.source_file}")
+            self.metrics.add_tasks("cancelled")
+            self.metrics.add_files("cancelled", len(self.source_files))
+            self.report("cancelled")
+            for f in self.source_files:
+                logger.debug("Task cancelled for %s", f, extra={SAMPLE_KEY: f})
+            if self.manifest is not None:
+                self.manifest.forget(self.source_files)
+            return
+
+        except Stopped:
+            self.metrics.add_files("cancelled", len(self.source_files))
+            self.report("killed")
+            for f in self.source_files:
+                logger.info("Task killed at stop time for %s", f, extra={SAMPLE_KEY: f})
+            if self.manifest is not None:
+                self.manifest.forget(self.source_files)
+            return
+
+        except subprocess.TimeoutExpired as e:
+            self.finish(succeeded=False)
+            self.report("timeout", args=e.cmd, stdout=e.output, stderr=e.stderr)
+            logger.error(f"Timeout ({e.timeout:g}s): `{shlex.join(e.cmd)}`")
+            self.log_output(e.output, e.stderr)
             return
 
         except Exception as e:
             # Rare, but log if any other error
-            logger.warning(f"Error running task for {self.source_file}: {e}")
+            self.metrics.add_files("failed", len(self.source_files))
+            self.report("error")
+            logger.warning(f"Error running task for {self.describe()}: {e}")
             logger.exception(e)
+            if self.manifest is not None:
+                self.manifest.forget(self.source_files)
+            self.done.add(len(self.source_files))
             return
 
-        self.queue.put(None)  # notify process done
-        if result.returncode > 0:
+        self.finish(succeeded=result.returncode == 0)
+        seconds = getattr(result, "seconds", None)
+        attempts = getattr(result, "attempts", 1)
+        if attempts > 1:
+            self.metrics.add_files("retried", len(self.source_files))
+            if result.returncode == 0:
+                self.metrics.add_files("retry_succeeded", len(self.source_files))
+        self.report(
+            "succeeded" if result.returncode == 0 else "failed",
+            args=result.args,
+            returncode=result.returncode,
+            attempts=attempts,
+            stdout=result.stdout,
+            stderr=result.stderr,
+            seconds=seconds,
+        )
+        if (
+            self.history is not None
+            and result.returncode == 0
+            and seconds is not None
+            and len(self.source_files) == 1  # a batch's time is not per file
+        ):
+            self.history.record(self.source_files[0], seconds)
+        if result.returncode != 0:
             # log subprocess error, including stdout and stderr
-            logger.error(f"Failure ({result.returncode}): `{shlex.join(result.args)}`")
-            if result.stdout is not None and len(result.stdout) > 0:
-                logger.info(f"STDOUT:\n-------\n{result.stdout}")
-            if result.stderr is not None and len(result.stderr) > 0:
-                logger.info(f"STDERR:\n-------\n{result.stderr}")
+            logger.error(
+                "Failure (%d)%s: `%s`",
+                result.returncode,
+                tries(attempts),
+                Joined(result.args),
+            )
+            self.log_output(result.stdout, result.stderr)
         else:
-            logger.info(f"Success ({result.returncode}): `{shlex.join(result.args)}`")
+            logger.info(
+                "Success (%d)%s: `%s`",
+                result.returncode,
+                tries(attempts),
+                Joined(result.args),
+                extra={SAMPLE_KEY: self.source_files[0]},
+            )
+
+    def finish(self, *, succeeded: bool):
+        self.metrics.add_files(
+            "succeeded" if succeeded else "failed", len(self.source_files)
+        )
+        if self.manifest is not None:
+            if succeeded:
+                self.manifest.record(self.source_files)
+            else:
+                self.manifest.forget(self.source_files)
+
+        if self.journal is not None:
+            self.journal.append(self.source_files)
+        self.done.add(len(self.source_files))
+
+    def report(
+        self,
+        status: str,
+        *,
+        args: Optional[List[str]] = None,
+        returncode: Optional[int] = None,
+        attempts: Optional[int] = None,
+        stdout=None,
+        stderr=None,
+        seconds: Optional[float] = None,
+    ):
+        """Queue the task's outcome for the results file, if any"""
+        if self.results is None:
+            return
+        end = time()
+        self.results.put(
+            TaskResult(
+                task=self.task_id,
+                status=status,
+                exit_code=returncode,
+                attempts=attempts,
+                start=None if seconds is None else end - seconds,
+                end=end,
+                seconds=seconds,
+                stdout_bytes=None if stdout is None else len(stdout),
+                stderr_bytes=None if stderr is None else len(stderr),
+                paths=self.source_files,
+                argv=None if args is None else list(args),
+            )
+        )
+
+    def log_output(self, stdout, stderr):
+        if stdout is not None and len(stdout) > 0:
+            self.logger.info("STDOUT:\n-------\n%s", stdout)
+        if stderr is not None and len(stderr) > 0:
+            self.logger.info("STDERR:\n-------\n%s", stderr)
+
+    def describe(self) -> str:
+        if len(self.source_files) == 1:
+            return self.source_files[0]
+        return f"{len(self.source_files)} files from {self.source_files[0]}"
+
+
+def tries(attempts: int) -> str:
+    return "" if attempts == 1 else f" after {attempts} attempts"
 
 
 if __name__ == "__main__":
@@ -1,5 +1,5 @@
 from datetime import timedelta
-from typing import TypeVar, Tuple, Optional, List, cast
+from typing import Any, Dict, Type, TypeVar, Tuple, Optional, List, Union, cast
 
 import durationpy  # type: ignore
 
@@ -9,11 +9,13 @@ except ImportError:
     import tomli as tomllib
 
 
-from ..model.config import Config
+from ..model.config import ENGINES, SCHEDULES, Config
 from ..util.dict_ import assert_has_field
+from ..util.shard import Shard
 
 TOP = "xfind"
 LOGGING = "logging"
+AUTO = "auto"
 
 
 def parse_file(file_name: str) -> Tuple[Config, Optional[dict]]:
@@ -24,26 +26,84 @@ def parse_file(file_name: str) -> Tuple[Config, Optional[dict]]:
 def parse(raw: dict) -> Tuple[Config, Optional[dict]]:
     assert_has_field(TOP, "config", raw)
     top = raw[TOP]
-    args = {
+    args: Dict[str, Any] = {
         "pattern": parse_optional_string(top, "pattern"),
         "omits": parse_optional_string_list(top, "omits"),
         "find_files": parse_optional_bool(top, "find_files"),
         "find_dirs": parse_optional_bool(top, "find_dirs"),
+        "files_from": parse_optional_string(top, "files_from"),
+        "files_from_null": parse_optional_bool(top, "files_from_null"),
+        "retry_failed_from": parse_optional_string(top, "retry_failed_from"),
         "root_dir": parse_optional_string(top, "root_dir"),
         "command": parse_optional_string(top, "command"),
-        "concurrency": parse_optional_int(top, "concurrency"),
+        "callable": parse_optional_string(top, "callable"),
+        "concurrency": parse_optional_concurrency(top, "concurrency"),
+        "min_concurrency": parse_optional_int(top, "min_concurrency"),
+        "max_concurrency": parse_optional_int(top, "max_concurrency"),
+        "auto_interval": parse_optional_duration(top, "auto_interval"),
+        "engine": parse_optional_choice(top, "engine", ENGINES),
+        "max_pending": parse_optional_int(top, "max_pending"),
+        "walk_concurrency": parse_optional_int(top, "walk_concurrency"),
+        "walk_ordered": parse_optional_bool(top, "walk_ordered"),
+        "walk_cache": parse_optional_string(top, "walk_cache"),
+        "rebuild_walk_cache": parse_optional_bool(top, "rebuild_walk_cache"),
+        "batch_size": parse_optional_int(top, "batch_size"),
+        "batch_max_bytes": parse_optional_int(top, "batch_max_bytes"),
         "stop_after": parse_optional_duration(top, "stop_after"),
+        "hard_stop": parse_optional_bool(top, "hard_stop"),
+        "task_timeout": parse_optional_duration(top, "task_timeout"),
+        "kill_grace": parse_optional_duration(top, "kill_grace"),
+        "nice": parse_optional_int(top, "nice"),
+        "ionice": parse_optional_string(top, "ionice"),
+        "rlimit_as": parse_optional_size(top, "rlimit_as"),
+        "rlimit_cpu": parse_optional_duration(top, "rlimit_cpu"),
+        "cgroup": parse_optional_string(top, "cgroup"),
+        "cgroup_cpu_max": parse_optional_string(top, "cgroup_cpu_max"),
+        "cgroup_memory_max": parse_optional_string(top, "cgroup_memory_max"),
+        "cgroup_io_max": parse_optional_string(top, "cgroup_io_max"),
+        "retry_exit_codes": parse_optional_int_list(top, "retry_exit_codes"),
+        "max_retries": parse_optional_int(top, "max_retries"),
+        "retry_backoff": parse_optional_duration(top, "retry_backoff"),
         "limit": parse_optional_int(top, "limit"),
+        "watch": parse_optional_bool(top, "watch"),
+        "watch_debounce": parse_optional_duration(top, "watch_debounce"),
+        "schedule": parse_optional_choice(top, "schedule", SCHEDULES),
+        "schedule_window": parse_optional_int(top, "schedule_window"),
+        "history": parse_optional_string(top, "history"),
+        "shard": parse_optional_shard(top, "shard"),
+        "shard_depth": parse_optional_int(top, "shard_depth"),
+        "manifest": parse_optional_string(top, "manifest"),
+        "manifest_hash": parse_optional_bool(top, "manifest_hash"),
+        "journal": parse_optional_string(top, "journal"),
+        "resume": parse_optional_bool(top, "resume"),
+        "output_tail_bytes": parse_optional_int(top, "output_tail_bytes"),
+        "spool": parse_optional_string(top, "spool"),
+        "metrics": parse_optional_string(top, "metrics"),
+        "metrics_interval": parse_optional_duration(top, "metrics_interval"),
+        "results": parse_optional_string(top, "results"),
+        "log_level": parse_optional_string(top, "log_level"),
+        "log_sample": parse_optional_int(top, "log_sample"),
         "stdout": parse_optional_bool(top, "stdout"),
         "stderr": parse_optional_bool(top, "stderr"),
         "shell": parse_optional_bool(top, "shell"),
     }
+    args = concurrency_args(args)
     return (
         Config(**{k: args[k] for k in args if not args[k] is None}),
         parse_logging(raw),
     )
 
 
+def concurrency_args(args: dict) -> dict:
+    """`concurrency = "auto"` turns on auto_concurrency, and a number turns it off"""
+    concurrency = args.get("concurrency", None)
+    if concurrency == AUTO:
+        return {**args, "concurrency": None, "auto_concurrency": True}
+    if concurrency is not None:
+        return {**args, "auto_concurrency": False}
+    return args
+
+
 def parse_logging(raw) -> Optional[dict]:
     return strict(dict, LOGGING, raw[LOGGING]) if LOGGING in raw else None
 
@@ -53,6 +113,14 @@ def parse_optional_string(raw, key: str) -> Optional[str]:
     return None if v is None else strict(str, key, v)
 
 
+def parse_optional_choice(raw, key: str, choices: Tuple[str, ...]) -> Optional[str]:
+    v = parse_optional_string(raw, key)
+    if v is not None and v not in choices:
+        allowed = ", ".join(choices)
+        raise ValueError(f"Value of {key} must be one of {allowed}, not {v!r}")
+    return v
+
+
 def parse_optional_int(raw, key: str) -> Optional[int]:
     v = raw.get(key, None)
     return None if v is None else strict(int, key, v)
@@ -68,6 +136,31 @@ def parse_optional_string_list(raw, key: str) -> Optional[List[str]]:
     return [] if v is None else strict(list, key, v)
 
 
+def parse_optional_int_list(raw, key: str) -> Optional[List[int]]:
+    v = raw.get(key, None)
+    return None if v is None else [strict(int, key, n) for n in strict(list, key, v)]
+
+
+def parse_optional_concurrency(raw, key: str) -> Union[int, str, None]:
+    v = raw.get(key, None)
+    return None if v is None else parse_concurrency(v)
+
+
+def parse_concurrency(v: Union[int, str]) -> Union[int, str]:
+    if v == AUTO:
+        return AUTO
+    if isinstance(v, str) and v.isdigit():
+        return int(v)
+    if isinstance(v, int) and not isinstance(v, bool):
+        return v
+    raise ValueError(f"Concurrency must be a number or '{AUTO}', not {v!r}")
+
+
+def parse_optional_shard(raw, key: str) -> Optional[Shard]:
+    v = raw.get(key, None)
+    return None if v is None else Shard.parse(strict(str, key, v))
+
+
 def parse_optional_duration(raw, key: str) -> Optional[timedelta]:
     v = raw.get(key, None)
     return None if v is None else parse_duration(str(v))
@@ -77,13 +170,32 @@ def parse_duration(s: str) -> timedelta:
     return cast(timedelta, durationpy.from_str(s))
 
 
+def parse_optional_size(raw, key: str) -> Optional[int]:
+    v = raw.get(key, None)
+    if v is None:
+        return None
+    return v if isinstance(v, int) and not isinstance(v, bool) else parse_size(v)
+
+
+def parse_size(s: str) -> int:
+    """A number of bytes, e.g. 512M; suffixes K, M, G, T are powers of 1024"""
+    units = "KMGT"
+    v = str(s).strip().upper().removesuffix("B")
+    scale = 1
+    if v[-1:] in units:
+        scale = 1024 ** (units.index(v[-1]) + 1)
+        v = v[:-1]
+    if not v.isdigit():
+        raise ValueError(f"Size must be a number of bytes, e.g. 512M, not {s!r}")
+    return int(v) * scale
+
+
 # TODO: move
 
 T = TypeVar("T")
 
 
-def strict(t: T, label: str, value) -> T:
+def strict(t: Type[T], label: str, value) -> T:
     if not isinstance(value, t):
         raise ValueError(f"Value of {label} is not a {t.__name__}")
-    cast(T, value)
     return value
@@ -0,0 +1,46 @@
+"""
+Reading a list of file names, e.g. from `git ls-files` or `find -print0`, one
+chunk at a time, so a list of any length is never held in memory.
+
+Names are separated by newlines (a trailing carriage return is dropped, for
+lists written on Windows), or with `null` by NUL bytes, so names can contain
+newlines. Empty names are skipped. Names are decoded as the OS does paths,
+so undecodable bytes round-trip.
+"""
+
+import os
+import sys
+from typing import BinaryIO, Iterator
+
+READ_CHUNK_SIZE = 1024 * 1024
+STDIN = "-"
+
+
+def read_file_list(file_name: str, *, null: bool = False) -> Iterator[str]:
+    """Names in the file, or on stdin if the file name is `-`"""
+    if file_name == STDIN:
+        yield from read_names(sys.stdin.buffer, null=null)
+        return
+    with open(file_name, "rb") as f:
+        yield from read_names(f, null=null)
+
+
+def read_names(
+    f: BinaryIO, *, null: bool = False, chunk_size: int = READ_CHUNK_SIZE
+) -> Iterator[str]:
+    sep = b"\0" if null else b"\n"
+    # read1, so names from a pipe come as they are written, not a chunk later
+    read = getattr(f, "read1", f.read)
+    rest = b""
+    while chunk := read(chunk_size):
+        names = (rest + chunk).split(sep)
+        rest = names.pop()
+        for name in names:
+            if name := _strip(name, null):
+                yield os.fsdecode(name)
+    if name := _strip(rest, null):
+        yield os.fsdecode(name)
+
+
+def _strip(name: bytes, null: bool) -> bytes:
+    return name if null or not name.endswith(b"\r") else name[:-1]
@@ -0,0 +1,124 @@
+"""
+A persistent record of how long tasks took, to estimate how long they will
+take next time.
+
+Each file's duration is kept as a moving average, keyed by its absolute path.
+For files not seen before, durations are also totalled by extension (with the
+bytes processed), so a new file is estimated at the rate for its extension
+times its size, or failing that the rate over all extensions.
+"""
+
+import os
+import os.path
+import sqlite3
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS durations (
+    key TEXT PRIMARY KEY,
+    seconds REAL NOT NULL,
+    bytes INTEGER NOT NULL,
+    count INTEGER NOT NULL
+)
+"""
+
+# Weight of the latest duration in a file's moving average
+SMOOTHING = 0.5
+COMMIT_EVERY = 1000
+# Keys of per-extension rows, which cannot clash with absolute paths
+EXT_PREFIX = "ext:"
+
+
+class History:
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self._lock = Lock()
+        self._uncommitted = 0
+        self._db = sqlite3.connect(file_name, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+        self._db.commit()
+        # There are few extensions, so keep their totals in memory
+        self._exts: Dict[str, Tuple[float, int, int]] = {
+            key[len(EXT_PREFIX) :]: (seconds, n_bytes, n)
+            for (key, seconds, n_bytes, n) in self._db.execute(
+                "SELECT key, seconds, bytes, count FROM durations WHERE key LIKE ?",
+                (EXT_PREFIX + "%",),
+            )
+        }
+
+    def estimate(self, source_file: str, size: Optional[int]) -> Optional[float]:
+        """Expected seconds for a task on the file, or None if no idea"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT seconds FROM durations WHERE key = ?",
+                (os.path.abspath(source_file),),
+            ).fetchone()
+            if row is not None:
+                return float(row[0])
+            totals = self._exts.get(ext_of(source_file))
+            if totals is None:
+                if len(self._exts) == 0:
+                    return None
+                totals = _sum(self._exts.values())
+        seconds, n_bytes, n = totals
+        if size is not None and n_bytes > 0:
+            return seconds / n_bytes * size
+        return seconds / n
+
+    def record(self, source_file: str, seconds: float):
+        """
+        Record the duration of a successful task on one file. Note the size is
+        taken after the task, so is its output size if it rewrote the file.
+        """
+        path = os.path.abspath(source_file)
+        size = file_size(path) or 0
+        with self._lock:
+            row = self._db.execute(
+                "SELECT seconds, count FROM durations WHERE key = ?", (path,)
+            ).fetchone()
+            average = (
+                seconds
+                if row is None
+                else row[0] * (1 - SMOOTHING) + seconds * SMOOTHING
+            )
+            ext = ext_of(path)
+            ext_seconds, ext_bytes, ext_n = self._exts.get(ext, (0.0, 0, 0))
+            self._exts[ext] = (ext_seconds + seconds, ext_bytes + size, ext_n + 1)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO durations (key, seconds, bytes, count) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (path, average, size, 1 if row is None else row[1] + 1),
+                    (EXT_PREFIX + ext, *self._exts[ext]),
+                ],
+            )
+            self._uncommitted += 1
+            if self._uncommitted >= COMMIT_EVERY:
+                self._db.commit()
+                self._uncommitted = 0
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+
+def file_size(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
+
+
+def ext_of(path: str) -> str:
+    return os.path.splitext(path)[1].lower()
+
+
+def _sum(rows) -> Tuple[float, int, int]:
+    seconds, n_bytes, n = 0.0, 0, 0
+    for s, b, c in rows:
+        seconds, n_bytes, n = seconds + s, n_bytes + b, n + c
+    return (seconds, n_bytes, n)
@@ -0,0 +1,102 @@
+"""
+An append-only journal of the files tasks have finished on, so that a run cut
+short (e.g. by `stop_after`) can be resumed later without repeating them.
+
+The journal file is a sequence of NUL-terminated paths, relative to the root
+directory. Entries are buffered and written, then fsync'd, in batches. On
+resume, an entry without its terminating NUL (from a crash mid-write) is
+ignored.
+
+On resume, the entries are loaded as 64-bit hashes into a sorted array, so
+the lookup costs 8 bytes per journaled file rather than a set of strings.
+The hashes are sorted in runs of at most `SORT_RUN`, then the runs merged, so
+loading never holds them all in a list (about 36 bytes per entry) at once.
+"""
+
+from array import array
+from bisect import bisect_left
+import hashlib
+from heapq import merge
+import os
+import os.path
+from threading import Lock
+from time import monotonic
+from typing import List
+
+FLUSH_EVERY = 1000
+FLUSH_SECS = 1.0
+READ_CHUNK_SIZE = 1024 * 1024
+SORT_RUN = 1 << 20
+
+
+class Journal:
+    def __init__(self, file_name: str, root_dir: str, *, resume: bool = False):
+        self.file_name = file_name
+        self._prefix = os.path.join(os.path.abspath(root_dir), "")
+        self._done = load_hashes(file_name) if resume else array("Q")
+        self._lock = Lock()
+        self._buffer: List[bytes] = []
+        self._last_flush = monotonic()
+        self._file = open(file_name, "ab" if resume else "wb")
+
+    def __len__(self) -> int:
+        """Number of entries loaded on resume"""
+        return len(self._done)
+
+    def __contains__(self, source_file: str) -> bool:
+        h = path_hash(self._encode(source_file))
+        i = bisect_left(self._done, h)
+        return i < len(self._done) and self._done[i] == h
+
+    def append(self, source_files: List[str]):
+        with self._lock:
+            for f in source_files:
+                self._buffer.append(self._encode(f) + b"\0")
+            if (
+                len(self._buffer) >= FLUSH_EVERY
+                or monotonic() - self._last_flush >= FLUSH_SECS
+            ):
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._file.close()
+
+    def _flush(self):
+        if len(self._buffer) > 0:
+            self._file.write(b"".join(self._buffer))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._buffer = []
+        self._last_flush = monotonic()
+
+    def _encode(self, source_file: str) -> bytes:
+        path = os.path.abspath(source_file)
+        if path.startswith(self._prefix):
+            path = path[len(self._prefix) :]
+        return os.fsencode(path)
+
+
+def load_hashes(file_name: str) -> array:
+    if not os.path.exists(file_name):
+        return array("Q")
+    runs: List[array] = []
+    run = array("Q")
+    with open(file_name, "rb") as f:
+        rest = b""
+        while chunk := f.read(READ_CHUNK_SIZE):
+            entries = (rest + chunk).split(b"\0")
+            rest = entries.pop()
+            run.extend(path_hash(e) for e in entries)
+            if len(run) >= SORT_RUN:
+                runs.append(array("Q", sorted(run)))
+                run = array("Q")
+    runs.append(array("Q", sorted(run)))
+    if len(runs) == 1:
+        return runs[0]
+    return array("Q", merge(*runs))
+
+
+def path_hash(path: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(path, digest_size=8).digest(), "little")
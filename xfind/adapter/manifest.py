@@ -0,0 +1,124 @@
+"""
+A persistent record of files the command last completed successfully on, so
+that later runs can skip files which have not changed since.
+
+A file is unchanged if its size and mtime are the same, and the command
+template is the same. In `use_hash` mode, the SHA-256 of the file contents is
+compared instead of the mtime, for filesystems where mtimes are not reliable.
+Note this means every candidate file is read in full, on every run.
+"""
+
+import hashlib
+import os
+import os.path
+import sqlite3
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT,
+    command TEXT NOT NULL
+)
+"""
+
+COMMIT_EVERY = 1000
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class Fingerprint(NamedTuple):
+    size: int
+    mtime_ns: int
+    hash: Optional[str]
+
+
+class Manifest:
+    def __init__(self, file_name: str, command: str, *, use_hash: bool = False):
+        self.file_name = file_name
+        self.command = command
+        self.use_hash = use_hash
+        self._lock = Lock()
+        self._pending: Dict[str, Fingerprint] = {}
+        self._uncommitted = 0
+        self._db = sqlite3.connect(file_name, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+        self._db.commit()
+
+    def unchanged(self, source_file: str) -> bool:
+        """
+        True if the file is unchanged since it was last recorded. Otherwise
+        remember its current fingerprint, to record if the task succeeds.
+        """
+        path = os.path.abspath(source_file)
+        try:
+            fp = self.fingerprint(path)
+        except OSError:
+            return False
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, hash, command FROM files WHERE path = ?",
+                (path,),
+            ).fetchone()
+            if row is not None and self._matches(fp, row):
+                return True
+            self._pending[path] = fp
+            return False
+
+    def record(self, source_files: List[str]):
+        """Record files the command has completed successfully on"""
+        with self._lock:
+            rows = []
+            for f in source_files:
+                path = os.path.abspath(f)
+                fp = self._pending.pop(path, None)
+                if fp is not None:
+                    rows.append((path, fp.size, fp.mtime_ns, fp.hash, self.command))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash, command) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._uncommitted += len(rows)
+            if self._uncommitted >= COMMIT_EVERY:
+                self._db.commit()
+                self._uncommitted = 0
+
+    def forget(self, source_files: List[str]):
+        """Drop the fingerprints of files whose task did not succeed"""
+        with self._lock:
+            for f in source_files:
+                self._pending.pop(os.path.abspath(f), None)
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def fingerprint(self, path: str) -> Fingerprint:
+        st = os.stat(path)
+        return Fingerprint(
+            size=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            hash=file_hash(path) if self.use_hash else None,
+        )
+
+    def _matches(self, fp: Fingerprint, row) -> bool:
+        size, mtime_ns, hash, command = row
+        if command != self.command or size != fp.size:
+            return False
+        if self.use_hash:
+            return hash is not None and bool(hash == fp.hash)
+        return bool(mtime_ns == fp.mtime_ns)
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
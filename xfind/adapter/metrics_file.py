@@ -0,0 +1,146 @@
+"""
+Periodic export of run metrics to a file, for a Prometheus node exporter
+textfile collector (`.prom`) or anything else that can read JSON (`.json`).
+
+The file is written to a temporary name and renamed into place, so readers
+never see a partial file.
+"""
+
+import json
+import os
+import os.path
+from threading import Event, Thread
+from typing import Any, Callable, Dict, List
+
+from ..util.metrics import FILE_STATES, Histogram, Metrics
+
+PREFIX = "xfind"
+
+
+class MetricsWriter:
+    def __init__(self, file_name: str, metrics: Metrics, interval: float):
+        self.file_name = file_name
+        self.metrics = metrics
+        self.interval = interval
+        self._format = formatter(file_name)
+        self._closed = Event()
+        self._thread = Thread(target=self._run, name="metrics", daemon=True)
+        self._thread.start()
+
+    def write(self):
+        tmp = f"{self.file_name}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self._format(self.metrics.snapshot()))
+        os.replace(tmp, self.file_name)
+
+    def close(self):
+        """Stop writing periodically, and write the final values"""
+        self._closed.set()
+        self._thread.join()
+        self.write()
+
+    def _run(self):
+        while not self._closed.wait(self.interval):
+            self.write()
+
+
+def formatter(file_name: str) -> Callable[[Dict[str, Any]], str]:
+    ext = os.path.splitext(file_name)[1].lower()
+    if ext == ".json":
+        return to_json
+    elif ext in (".prom", ".txt"):
+        return to_prometheus
+    else:
+        raise ValueError(f"Metrics file must end in .prom or .json: {file_name}")
+
+
+def to_json(snapshot: Dict[str, Any]) -> str:
+    hist: Histogram = snapshot["task_seconds"]
+    data = {
+        **snapshot,
+        "task_seconds": {
+            "buckets": [[bound(b), n] for (b, n) in hist.cumulative()],
+            "sum": hist.sum,
+            "count": hist.count,
+            "max": hist.max,
+        },
+    }
+    return json.dumps(data, indent=2) + "\n"
+
+
+def to_prometheus(snapshot: Dict[str, Any]) -> str:
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help: str, samples: List[str]):
+        lines.append(f"# HELP {PREFIX}_{name} {help}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+        lines.extend(f"{PREFIX}_{s}" for s in samples)
+
+    files = snapshot["files"]
+    metric(
+        "files_total",
+        "counter",
+        "Files by state",
+        [f'files_total{{state="{s}"}} {files[s]}' for s in FILE_STATES],
+    )
+    metric(
+        "tasks_submitted_total",
+        "counter",
+        "Tasks submitted to the executor",
+        [f"tasks_submitted_total {snapshot['tasks_submitted']}"],
+    )
+    metric(
+        "tasks_pending",
+        "gauge",
+        "Tasks submitted but not yet started",
+        [f"tasks_pending {snapshot['tasks_pending']}"],
+    )
+    metric(
+        "tasks_running",
+        "gauge",
+        "Tasks running now",
+        [f"tasks_running {snapshot['tasks_running']}"],
+    )
+    metric(
+        "walk_files_per_second",
+        "gauge",
+        "Files discovered per second of the run",
+        [f"walk_files_per_second {snapshot['walk_files_per_second']:g}"],
+    )
+    metric(
+        "discover_seconds_total",
+        "counter",
+        "Time spent waiting on file discovery",
+        [f"discover_seconds_total {snapshot['discover_seconds']:g}"],
+    )
+    metric(
+        "dispatch_wait_seconds_total",
+        "counter",
+        "Time spent waiting for a free worker",
+        [f"dispatch_wait_seconds_total {snapshot['dispatch_wait_seconds']:g}"],
+    )
+    metric(
+        "elapsed_seconds",
+        "gauge",
+        "Time since the run started",
+        [f"elapsed_seconds {snapshot['elapsed_seconds']:g}"],
+    )
+    hist: Histogram = snapshot["task_seconds"]
+    metric(
+        "task_duration_seconds",
+        "histogram",
+        "Wall time of each task",
+        [
+            f'task_duration_seconds_bucket{{le="{bound(b)}"}} {n}'
+            for (b, n) in hist.cumulative()
+        ]
+        + [
+            f"task_duration_seconds_sum {hist.sum:g}",
+            f"task_duration_seconds_count {hist.count}",
+        ],
+    )
+    return "\n".join(lines) + "\n"
+
+
+def bound(b: float) -> str:
+    return "+Inf" if b == float("inf") else f"{b:g}"
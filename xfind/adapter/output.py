@@ -0,0 +1,284 @@
+"""
+Bounded-memory capture of task output.
+
+Output which is not relayed is either read from a pipe into a `RingBuffer`,
+which keeps only the last `tail_bytes`, or written by the child straight into
+a spool file, of which only the last `tail_bytes` are read back. Either way the
+task result holds an `Output`, which is only decoded when it is logged.
+
+Given a `Reaper`, the child is started in its own process group and killed if
+it runs past its timeout (raising `subprocess.TimeoutExpired`) or the hard
+stop time (raising `Stopped`).
+"""
+
+import asyncio
+from collections import deque
+from contextlib import nullcontext
+import os
+import selectors
+import subprocess
+import sys
+from threading import Thread
+from typing import IO, Any, ContextManager, Deque, Dict, List, Optional, Tuple, cast
+
+from ..util.limits import ChildLimits
+from ..util.reaper import STOP, TIMEOUT, Reaper, Stopped, Watch, new_group_kwargs
+
+READ_SIZE = 64 * 1024
+STREAMS = ("stdout", "stderr")
+
+
+class RingBuffer:
+    """Keeps the last `size` bytes written to it"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.total = 0
+        self._chunks: Deque[bytes] = deque()
+        self._len = 0
+
+    def write(self, b: bytes):
+        self.total += len(b)
+        if self.size <= 0:
+            return
+        if len(b) >= self.size:
+            b = b[-self.size :]
+            self._chunks.clear()
+            self._len = 0
+        self._chunks.append(b)
+        self._len += len(b)
+        while self._len - len(self._chunks[0]) >= self.size:
+            self._len -= len(self._chunks.popleft())
+
+    def getvalue(self) -> bytes:
+        b = b"".join(self._chunks)
+        return b[-self.size :] if self.size > 0 else b""
+
+
+class Output:
+    """The captured tail of a task's output stream, decoded only when logged"""
+
+    __slots__ = ("tail", "total", "spool_path")
+
+    def __init__(self, tail: bytes, total: int, spool_path: Optional[str] = None):
+        self.tail = tail
+        self.total = total
+        self.spool_path = spool_path
+
+    @classmethod
+    def from_buffer(cls, buf: RingBuffer) -> "Output":
+        return cls(buf.getvalue(), buf.total)
+
+    @classmethod
+    def from_spool(cls, path: str, tail_bytes: int) -> "Output":
+        return cls(read_tail(path, tail_bytes), os.path.getsize(path), path)
+
+    def __len__(self) -> int:
+        return self.total
+
+    def __str__(self) -> str:
+        s = decode(self.tail)
+        omitted = self.total - len(self.tail)
+        if omitted > 0:
+            where = "" if self.spool_path is None else f", see {self.spool_path}"
+            s = f"[{omitted} bytes omitted{where}]\n{s}"
+        return s
+
+
+def decode(b: bytes) -> str:
+    """Decode as subprocess.run does with encoding='utf-8', errors='ignore'"""
+    s = b.decode("utf-8", errors="ignore")
+    return s.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def read_tail(path: str, n: int) -> bytes:
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(size - n, 0))
+        return f.read()
+
+
+def open_spools(spool: Dict[str, str]) -> Dict[str, IO[bytes]]:
+    files: Dict[str, IO[bytes]] = {}
+    for stream, path in spool.items():
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        files[stream] = open(path, "wb")
+    return files
+
+
+def run_captured(
+    command: List[str],
+    *,
+    shell: bool,
+    relay_stdout: bool,
+    relay_stderr: bool,
+    tail_bytes: int,
+    spool: Optional[Dict[str, str]] = None,
+    reaper: Optional[Reaper] = None,
+    limits: Optional[ChildLimits] = None,
+) -> subprocess.CompletedProcess:
+    """Like subprocess.run, but with bounded capture of output"""
+    relay = {"stdout": relay_stdout, "stderr": relay_stderr}
+    spools = open_spools({k: v for (k, v) in (spool or {}).items() if not relay[k]})
+    args, shell = _limited(command, shell, limits)
+    try:
+        with subprocess.Popen(
+            args,
+            shell=shell,
+            stdout=_sink("stdout", relay, spools),
+            stderr=_sink("stderr", relay, spools),
+            **({} if reaper is None else new_group_kwargs()),
+        ) as proc:
+            with _watch(reaper, proc.pid) as watch:
+                buffers = pump(proc, tail_bytes)
+                proc.wait()
+    finally:
+        for f in spools.values():
+            f.close()
+    out, err = (_output(s, buffers, spools, tail_bytes) for s in STREAMS)
+    return _result(command, proc.returncode, out, err, reaper, watch)
+
+
+async def run_captured_async(
+    command: List[str],
+    *,
+    shell: bool,
+    relay_stdout: bool,
+    relay_stderr: bool,
+    tail_bytes: int,
+    spool: Optional[Dict[str, str]] = None,
+    reaper: Optional[Reaper] = None,
+    limits: Optional[ChildLimits] = None,
+) -> subprocess.CompletedProcess:
+    """As run_captured, but run on an asyncio event loop"""
+    relay = {"stdout": relay_stdout, "stderr": relay_stderr}
+    spools = open_spools({k: v for (k, v) in (spool or {}).items() if not relay[k]})
+    args, shell = _limited(command, shell, limits)
+    try:
+        kwargs = {
+            "stdout": _sink("stdout", relay, spools),
+            "stderr": _sink("stderr", relay, spools),
+            **({} if reaper is None else new_group_kwargs()),
+        }
+        if not shell:
+            proc = await asyncio.create_subprocess_exec(*args, **kwargs)
+        elif sys.platform == "win32":
+            proc = await asyncio.create_subprocess_shell(
+                subprocess.list2cmdline(args), **kwargs
+            )
+        else:
+            # as subprocess.run(command, shell=True)
+            proc = await asyncio.create_subprocess_exec(
+                "/bin/sh", "-c", *args, **kwargs
+            )
+        with _watch(reaper, proc.pid) as watch:
+            buffers: Dict[str, RingBuffer] = {}
+            pumps = []
+            for s, reader in (("stdout", proc.stdout), ("stderr", proc.stderr)):
+                if reader is not None:
+                    buffers[s] = RingBuffer(tail_bytes)
+                    pumps.append(_pump_stream(reader, buffers[s]))
+            await asyncio.gather(*pumps)
+            await proc.wait()
+    finally:
+        for f in spools.values():
+            f.close()
+    out, err = (_output(s, buffers, spools, tail_bytes) for s in STREAMS)
+    return _result(command, cast(int, proc.returncode), out, err, reaper, watch)
+
+
+def _limited(
+    command: List[str], shell: bool, limits: Optional[ChildLimits]
+) -> Tuple[List[str], bool]:
+    """The command line to start, and whether by the shell, with any limits"""
+    if limits is None:
+        return (command, shell)
+    return (limits.wrap(["/bin/sh", "-c", *command] if shell else command), False)
+
+
+def _watch(reaper: Optional[Reaper], pid: int) -> ContextManager[Optional[Watch]]:
+    return nullcontext() if reaper is None else reaper.watch(pid)
+
+
+def _result(
+    command: List[str],
+    returncode: int,
+    out: Optional[Output],
+    err: Optional[Output],
+    reaper: Optional[Reaper],
+    watch: Optional[Watch],
+) -> subprocess.CompletedProcess:
+    if reaper is not None and watch is not None:
+        if watch.reason == TIMEOUT:
+            # with the captured Outputs, not bytes, as for a CompletedProcess
+            raise subprocess.TimeoutExpired(
+                command, cast(float, reaper.timeout), cast(Any, out), cast(Any, err)
+            )
+        if watch.reason == STOP:
+            raise Stopped(command)
+    return subprocess.CompletedProcess(command, returncode, out, err)
+
+
+def _sink(stream: str, relay: Dict[str, bool], spools: Dict[str, IO[bytes]]) -> Any:
+    if relay[stream]:
+        return sys.stdout if stream == "stdout" else sys.stderr
+    return spools.get(stream, subprocess.PIPE)
+
+
+def _output(
+    stream: str,
+    buffers: Dict[str, RingBuffer],
+    spools: Dict[str, IO[bytes]],
+    tail_bytes: int,
+) -> Optional[Output]:
+    if stream in buffers:
+        return Output.from_buffer(buffers[stream])
+    if stream in spools:
+        return Output.from_spool(spools[stream].name, tail_bytes)
+    return None
+
+
+def pump(proc: subprocess.Popen, tail_bytes: int) -> Dict[str, RingBuffer]:
+    """Read the child's piped output streams until closed"""
+    pipes: List[Tuple[str, IO[bytes]]] = [
+        (s, f) for (s, f) in (("stdout", proc.stdout), ("stderr", proc.stderr)) if f
+    ]
+    buffers = {s: RingBuffer(tail_bytes) for (s, _) in pipes}
+    if len(pipes) == 0:
+        return buffers
+
+    if sys.platform == "win32":
+        # Note: pipes on Windows cannot be used with select
+        threads = [
+            Thread(target=_pump_file, args=(f, buffers[s]), daemon=True)
+            for (s, f) in pipes
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return buffers
+
+    with selectors.DefaultSelector() as sel:
+        for s, f in pipes:
+            sel.register(f, selectors.EVENT_READ, buffers[s])
+        while len(sel.get_map()) > 0:
+            for key, _ in sel.select():
+                data = os.read(key.fd, READ_SIZE)
+                if data:
+                    key.data.write(data)
+                else:
+                    sel.unregister(key.fileobj)
+    return buffers
+
+
+def _pump_file(f: IO[bytes], buf: RingBuffer):
+    while data := f.read(READ_SIZE):
+        buf.write(data)
+
+
+async def _pump_stream(reader: asyncio.StreamReader, buf: RingBuffer):
+    while data := await reader.read(READ_SIZE):
+        buf.write(data)
@@ -0,0 +1,217 @@
+"""
+A structured record of every task's outcome, for post-processing without
+parsing logs: one JSON object per line (`.jsonl`) or one CSV row (`.csv`),
+optionally compressed (`.jsonl.gz`, `.csv.zst`, ...). Zstandard compression
+needs the `zstandard` package.
+
+Tasks only put their result on a queue, from whichever thread finished them.
+A single writer thread formats and writes the results in batches, so workers
+never wait on the file. Closing the writer writes whatever is still queued,
+including the results of tasks cancelled at the stop time.
+
+A task retried in the run is recorded once, with its last result and the
+number of attempts. The paths of tasks which did not succeed can be read back
+from a results file, to run on again.
+"""
+
+import csv
+from datetime import datetime, timezone
+import gzip
+import io
+import json
+import os.path
+from queue import Empty, SimpleQueue
+import shlex
+from threading import Thread
+from time import monotonic
+from typing import (
+    IO,
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    cast,
+)
+
+FIELDS = (
+    "task",
+    "status",
+    "exit_code",
+    "attempts",
+    "start",
+    "end",
+    "seconds",
+    "stdout_bytes",
+    "stderr_bytes",
+    "paths",
+    "argv",
+)
+
+# Not succeeded, nor stopped before it could finish
+FAILED_STATUSES = ("failed", "timeout", "error")
+
+BATCH_SIZE = 1000
+FLUSH_SECS = 1.0
+
+
+class TaskResult(NamedTuple):
+    task: Optional[int]
+    status: str
+    exit_code: Optional[int]
+    attempts: Optional[int]
+    start: Optional[float]
+    end: float
+    seconds: Optional[float]
+    stdout_bytes: Optional[int]
+    stderr_bytes: Optional[int]
+    paths: List[str]
+    argv: Optional[List[str]]
+
+
+_CLOSE = object()
+
+
+class ResultsWriter:
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        format, compression = file_format(file_name)
+        self._file = io.TextIOWrapper(
+            open_compressed(file_name, compression, "wb"),
+            encoding="utf-8",
+            newline="",
+        )
+        self._write = (csv_writer if format == "csv" else jsonl_writer)(self._file)
+        self._queue: SimpleQueue = SimpleQueue()
+        self._error: Optional[Exception] = None
+        self._thread = Thread(target=self._run, name="results", daemon=True)
+        self._thread.start()
+
+    def put(self, result: TaskResult):
+        self._queue.put(result)
+
+    def close(self):
+        """Write the results still queued, and close the file"""
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        last_flush = monotonic()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            results = [r for r in batch if r is not _CLOSE]
+            if self._error is None:
+                try:
+                    self._write(results)
+                    if monotonic() - last_flush >= FLUSH_SECS:
+                        self._file.flush()
+                        last_flush = monotonic()
+                except Exception as e:
+                    # raised on close; until then, results are dropped
+                    self._error = e
+            if len(results) < len(batch):
+                return
+
+
+def file_format(file_name: str) -> Tuple[str, Optional[str]]:
+    base, ext = os.path.splitext(file_name.lower())
+    compression = None
+    if ext in (".gz", ".zst"):
+        compression = ext
+        base, ext = os.path.splitext(base)
+    if ext not in (".jsonl", ".csv"):
+        raise ValueError(
+            f"Results file must end in .jsonl or .csv, optionally .gz or .zst: "
+            f"{file_name}"
+        )
+    return (ext[1:], compression)
+
+
+def read_failed(file_name: str) -> Iterator[str]:
+    """Paths of the tasks in a results file which did not succeed"""
+    format, compression = file_format(file_name)
+    with io.TextIOWrapper(
+        open_compressed(file_name, compression, "rb"), encoding="utf-8", newline=""
+    ) as f:
+        if format == "csv":
+            for row in csv.DictReader(f):
+                if row["status"] in FAILED_STATUSES:
+                    yield from shlex.split(row["paths"])
+        else:
+            for line in f:
+                r = json.loads(line)
+                if r["status"] in FAILED_STATUSES:
+                    yield from r["paths"]
+
+
+def open_compressed(file_name: str, compression: Optional[str], mode: str) -> BinaryIO:
+    if compression == ".gz":
+        return gzip.open(file_name, mode)  # type: ignore
+    if compression == ".zst":
+        try:
+            import zstandard  # type: ignore
+        except ImportError:
+            raise ValueError(
+                f"Zstandard compression needs the zstandard package: {file_name}"
+            )
+        if mode == "rb":
+            reader = zstandard.ZstdDecompressor().stream_reader(open(file_name, "rb"))
+            return cast(BinaryIO, reader)
+        writer = zstandard.ZstdCompressor().stream_writer(open(file_name, "wb"))
+        return cast(BinaryIO, writer)
+    return cast(BinaryIO, open(file_name, mode))
+
+
+def csv_writer(f: IO[str]) -> Callable[[List[TaskResult]], None]:
+    w = csv.writer(f)
+    w.writerow(FIELDS)
+
+    def _write(results: List[TaskResult]):
+        w.writerows(
+            [
+                *r[:4],
+                format_time(r.start),
+                format_time(r.end),
+                r.seconds,
+                r.stdout_bytes,
+                r.stderr_bytes,
+                shlex.join(r.paths),
+                None if r.argv is None else shlex.join(r.argv),
+            ]
+            for r in results
+        )
+
+    return _write
+
+
+def jsonl_writer(f: IO[str]) -> Callable[[List[TaskResult]], None]:
+    def _write(results: List[TaskResult]):
+        f.write("".join(json.dumps(as_dict(r)) + "\n" for r in results))
+
+    return _write
+
+
+def as_dict(r: TaskResult) -> Dict[str, Any]:
+    return {
+        **r._asdict(),
+        "start": format_time(r.start),
+        "end": format_time(r.end),
+    }
+
+
+def format_time(t: Optional[float]) -> Optional[str]:
+    if t is None:
+        return None
+    return datetime.fromtimestamp(t, timezone.utc).isoformat(timespec="milliseconds")
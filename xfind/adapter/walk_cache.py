@@ -0,0 +1,178 @@
+"""
+A persistent cache of directory listings, so that a walk of a tree which has
+mostly not changed costs a `stat` per directory rather than a `readdir`.
+
+Each listing is stored with the directory's mtime, and reused while the mtime
+is the same: adding, removing or renaming an entry changes the mtime of its
+directory. Only the names and types of entries are stored, not their sizes or
+mtimes, since writing to a file does not change its directory's mtime; so
+nothing cached can go stale that way. The type of a symlink's target is not
+cached either, but checked when needed, as the target can change.
+
+A listing is not stored if the directory changed in the last RACY_SECONDS, as
+it could change again within the same mtime tick of a coarse filesystem clock.
+
+The entries are stored as one blob per directory: a type flag character and
+the name, for each entry, each ended by a NUL (which names cannot contain).
+"""
+
+import os
+import os.path
+import sqlite3
+from threading import Lock
+from time import time_ns
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    entries BLOB NOT NULL
+)
+"""
+
+COMMIT_EVERY = 1000
+RACY_SECONDS = 2
+
+IS_DIR = 1
+IS_FILE = 2
+IS_SYMLINK = 4
+# So the flag byte is printable, and never NUL
+FLAG_BASE = ord("0")
+
+
+class CachedEntry:
+    """Stands in for an `os.DirEntry`, from a cached listing"""
+
+    __slots__ = ("name", "_dirname", "_flags")
+
+    def __init__(self, dirname: str, name: str, flags: int):
+        self.name = name
+        self._dirname = dirname
+        self._flags = flags
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self._dirname, self.name)
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        if follow_symlinks and self._flags & IS_SYMLINK:
+            return os.path.isdir(self.path)
+        return bool(self._flags & IS_DIR)
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool:
+        if follow_symlinks and self._flags & IS_SYMLINK:
+            return os.path.isfile(self.path)
+        return bool(self._flags & IS_FILE)
+
+    def is_symlink(self) -> bool:
+        return bool(self._flags & IS_SYMLINK)
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        return os.stat(self.path, follow_symlinks=follow_symlinks)
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __repr__(self) -> str:
+        return f"<CachedEntry {self.name!r}>"
+
+
+Listing = Sequence[Union[os.DirEntry, CachedEntry]]
+
+
+class WalkCache:
+    def __init__(self, file_name: str, *, rebuild: bool = False):
+        self.file_name = file_name
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        # not yet written; a walk can list a directory more than once
+        self._pending: Dict[str, Tuple[int, bytes]] = {}
+        self._db = sqlite3.connect(file_name, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+        if rebuild:
+            self._db.execute("DELETE FROM dirs")
+        self._db.commit()
+
+    def scandir(self, dirname: str) -> Listing:
+        """List a directory, from the cache if it has not changed"""
+        key = os.path.abspath(dirname)
+        try:
+            mtime_ns = os.stat(dirname or os.curdir).st_mtime_ns
+        except OSError:
+            return []
+        with self._lock:
+            blob = self._lookup(key, mtime_ns)
+            if blob is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if blob is not None:
+            return decode(dirname, blob)
+
+        try:
+            with os.scandir(dirname or os.curdir) as it:
+                entries: Listing = list(it)
+        except OSError:
+            return []
+        if time_ns() - mtime_ns > RACY_SECONDS * 1_000_000_000:
+            self._store(key, mtime_ns, encode(entries))
+        return entries
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.commit()
+            self._db.close()
+
+    def _lookup(self, key: str, mtime_ns: int) -> Optional[bytes]:
+        pending = self._pending.get(key)
+        if pending is not None:
+            return pending[1] if pending[0] == mtime_ns else None
+        row = self._db.execute(
+            "SELECT entries FROM dirs WHERE path = ? AND mtime_ns = ?",
+            (key, mtime_ns),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _store(self, key: str, mtime_ns: int, blob: bytes):
+        with self._lock:
+            self._pending[key] = (mtime_ns, blob)
+            if len(self._pending) >= COMMIT_EVERY:
+                self._flush()
+                self._db.commit()
+
+    def _flush(self):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO dirs (path, mtime_ns, entries) VALUES (?, ?, ?)",
+            [(k, m, b) for (k, (m, b)) in self._pending.items()],
+        )
+        self._pending = {}
+
+
+def encode(entries: Listing) -> bytes:
+    return b"".join(
+        bytes([FLAG_BASE + _flags(e)]) + os.fsencode(e.name) + b"\0" for e in entries
+    )
+
+
+def decode(dirname: str, blob: bytes) -> List[CachedEntry]:
+    # the flag characters are ASCII, so decode the whole blob at once
+    return [
+        CachedEntry(dirname, item[1:], ord(item[0]) - FLAG_BASE)
+        for item in os.fsdecode(blob).split("\0")[:-1]
+    ]
+
+
+def _flags(e) -> int:
+    try:
+        return (
+            (IS_DIR if e.is_dir(follow_symlinks=False) else 0)
+            | (IS_FILE if e.is_file(follow_symlinks=False) else 0)
+            | (IS_SYMLINK if e.is_symlink() else 0)
+        )
+    except OSError:
+        return 0
@@ -1,7 +1,15 @@
 from dataclasses import dataclass, field, replace
 from datetime import timedelta
+import os.path
 from typing import Optional, List
 
+from ..util.fnmatch_ import PatternSet
+from ..util.shard import Shard
+
+ENGINES = ("thread", "asyncio")
+LONGEST_FIRST = "longest-first"
+SCHEDULES = ("walk", LONGEST_FIRST)
+
 
 @dataclass
 class Config:
@@ -10,14 +18,81 @@ class Config:
     omits: List[str] = field(default_factory=list)
     find_files: bool = True
     find_dirs: bool = True
+    files_from: Optional[str] = None
+    files_from_null: bool = False
+    retry_failed_from: Optional[str] = None
     command: str = 'echo "{file_name}"'
+    callable: Optional[str] = None
     concurrency: int = 1
+    auto_concurrency: bool = False
+    min_concurrency: int = 1
+    max_concurrency: Optional[int] = None
+    auto_interval: timedelta = timedelta(seconds=2)
+    engine: str = "thread"
+    walk_concurrency: int = 1
+    walk_ordered: bool = False
+    walk_cache: Optional[str] = None
+    rebuild_walk_cache: bool = False
+    max_pending: Optional[int] = None
+    batch_size: Optional[int] = None
+    batch_max_bytes: Optional[int] = None
     stop_after: Optional[timedelta] = None
+    hard_stop: bool = False
+    task_timeout: Optional[timedelta] = None
+    kill_grace: timedelta = timedelta(seconds=5)
+    nice: Optional[int] = None
+    ionice: Optional[str] = None
+    rlimit_as: Optional[int] = None
+    rlimit_cpu: Optional[timedelta] = None
+    cgroup: Optional[str] = None
+    cgroup_cpu_max: Optional[str] = None
+    cgroup_memory_max: Optional[str] = None
+    cgroup_io_max: Optional[str] = None
+    retry_exit_codes: List[int] = field(default_factory=list)
+    max_retries: int = 3
+    retry_backoff: timedelta = timedelta(seconds=1)
     limit: Optional[int] = None
+    watch: bool = False
+    watch_debounce: timedelta = timedelta(seconds=1)
+    schedule: str = "walk"
+    schedule_window: int = 1000
+    history: Optional[str] = None
+    shard: Optional[Shard] = None
+    shard_depth: Optional[int] = None
+    manifest: Optional[str] = None
+    manifest_hash: bool = False
+    journal: Optional[str] = None
+    resume: bool = False
+    output_tail_bytes: int = 64 * 1024
+    spool: Optional[str] = None
+    metrics: Optional[str] = None
+    log_level: Optional[str] = None
+    log_sample: int = 1
+    results: Optional[str] = None
+    metrics_interval: timedelta = timedelta(seconds=10)
     stdout: bool = False
     stderr: bool = False
     shell: bool = False
 
+    @property
+    def max_workers(self) -> int:
+        """Number of workers; with auto_concurrency, the most that can be used"""
+        if not self.auto_concurrency:
+            return self.concurrency
+        if self.max_concurrency is not None:
+            return self.max_concurrency
+        return max((os.cpu_count() or 1) * 4, self.min_concurrency)
+
+    @property
+    def pending_limit(self) -> int:
+        """Maximum number of tasks submitted but not yet completed"""
+        if self.max_pending is None:
+            return self.max_workers * 4
+        return max(self.max_pending, self.max_workers)
+
+    def compiled_omits(self) -> PatternSet:
+        return PatternSet(os.path.join(self.root_dir, o) for o in self.omits)
+
     @classmethod
     def from_args(cls, args) -> "Config":
         return cls(
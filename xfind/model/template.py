@@ -0,0 +1,186 @@
+"""
+Command (and path) templates, parsed once per run.
+
+A command template is split into arguments with `shlex` before anything is
+substituted, so a file name containing spaces or quotes is always exactly one
+argument, however the placeholder is quoted in the template. Then for each
+file, only the placeholders the template uses are computed; those that are
+the same for every file (timestamps) are computed once.
+
+An argument which is exactly `{file_names}` expands to one argument per file.
+Within a longer argument (e.g. `sh -c "wc {file_names}"`), the file names are
+quoted for a shell and joined with spaces.
+"""
+
+import os
+import os.path
+import re
+import shlex
+from string import Formatter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..util.datetime import from_posix, utc_from_posix
+
+BATCH_FIELD = "file_names"
+
+
+class FileInfo:
+    """
+    One file's path, with its absolute path and stat computed on demand, so a
+    file is stat'd at most once however many of {size}, {mtime}, ... are used
+    """
+
+    __slots__ = ("source", "root_dir", "_abs", "_stat")
+
+    def __init__(self, source: str, root_dir: str):
+        self.source = source
+        self.root_dir = root_dir
+        self._abs: Optional[str] = None
+        self._stat: Optional[os.stat_result] = None
+
+    @property
+    def abs(self) -> str:
+        if self._abs is None:
+            self._abs = os.path.abspath(self.source)
+        return self._abs
+
+    def stat(self) -> os.stat_result:
+        if self._stat is None:
+            self._stat = os.stat(self.source)
+        return self._stat
+
+
+FILE_PLACEHOLDERS: Dict[str, Callable[[FileInfo], Any]] = {
+    "file_name": lambda f: f.abs,
+    "base_name": lambda f: os.path.basename(f.abs),
+    "dir_name": lambda f: os.path.dirname(f.abs),
+    "drive": lambda f: os.path.splitdrive(os.path.dirname(f.abs))[0],
+    "drive_path": lambda f: os.path.splitdrive(os.path.dirname(f.abs))[1],
+    "root_name": lambda f: os.path.splitext(f.abs)[0],
+    "ext_name": lambda f: os.path.splitext(f.abs)[1],
+    "rel_path": lambda f: os.path.relpath(f.abs, f.root_dir),
+    "size": lambda f: f.stat().st_size,
+    "mtime": lambda f: from_posix(f.stat().st_mtime),
+    "utc_mtime": lambda f: utc_from_posix(f.stat().st_mtime),
+}
+
+RUN_PLACEHOLDERS: Dict[str, Callable[[float], Any]] = {
+    "timestamp": from_posix,
+    "utc_timestamp": utc_from_posix,
+}
+
+
+class Template:
+    """A format string, e.g. a path, with the same placeholders as commands"""
+
+    def __init__(
+        self,
+        text: str,
+        timestamp: float,
+        *,
+        root_dir: str = "",
+        extra_fields: Iterable[str] = (),
+    ):
+        self.text = text
+        self.fields = fields_of(text)
+        self.root_dir = os.path.abspath(root_dir)
+        self.check_fields(set(extra_fields) | {BATCH_FIELD})
+        self._file_fields = [f for f in FILE_PLACEHOLDERS if f in self.fields]
+        self._run_data = {
+            k: fn(timestamp)
+            for (k, fn) in RUN_PLACEHOLDERS.items()
+            if k in self.fields
+        }
+
+    @property
+    def per_file(self) -> Set[str]:
+        """The placeholders used which differ per file"""
+        return set(self._file_fields)
+
+    def check_fields(self, allowed: Set[str]):
+        known = allowed | set(FILE_PLACEHOLDERS) | set(RUN_PLACEHOLDERS)
+        unknown = self.fields - known
+        if len(unknown) > 0:
+            names = ", ".join(f"{{{f}}}" for f in sorted(unknown))
+            raise ValueError(f"Unknown placeholder(s) {names} in: {self.text}")
+
+    def data(self, source_file: Optional[str], **extra) -> Dict[str, Any]:
+        """Values of the placeholders used"""
+        data = dict(self._run_data)
+        if source_file is not None:
+            info = FileInfo(source_file, self.root_dir)
+            for k in self._file_fields:
+                data[k] = FILE_PLACEHOLDERS[k](info)
+        data.update(extra)
+        return data
+
+    def format(self, source_file: Optional[str], **extra) -> str:
+        return self.text.format_map(self.data(source_file, **extra))
+
+
+class CommandTemplate(Template):
+    def __init__(self, command: str, timestamp: float, *, root_dir: str = ""):
+        super().__init__(command, timestamp, root_dir=root_dir)
+        # an argument without placeholders is unescaped (`{{` to `{`) once here
+        self._args: List[Tuple[str, bool]] = [
+            (arg, True) if len(fields_of(arg)) > 0 else (arg.format_map({}), False)
+            for arg in shlex.split(command)
+        ]
+
+    @property
+    def batch(self) -> bool:
+        return BATCH_FIELD in self.fields
+
+    def embedded_batch_args(self) -> List[str]:
+        """
+        Arguments with {file_names} within a longer argument, rendered with no
+        files: each of them holds the names of all files in a batch
+        """
+        data = self.data(None, **{BATCH_FIELD: ""})
+        return [
+            arg.format_map(data)
+            for (arg, has_fields) in self._args
+            if has_fields
+            and arg != f"{{{BATCH_FIELD}}}"
+            and BATCH_FIELD in fields_of(arg)
+        ]
+
+    def render(self, source_file: str) -> List[str]:
+        data = self.data(source_file)
+        return [
+            arg.format_map(data) if has_fields else arg
+            for (arg, has_fields) in self._args
+        ]
+
+    def render_batch(self, source_files: List[str]) -> List[str]:
+        file_names = [os.path.abspath(f) for f in source_files]
+        data = self.data(None, **{BATCH_FIELD: shlex.join(file_names)})
+        args = []
+        for arg, has_fields in self._args:
+            if arg == f"{{{BATCH_FIELD}}}":
+                args.extend(file_names)
+            elif has_fields:
+                args.append(arg.format_map(data))
+            else:
+                args.append(arg)
+        return args
+
+
+def fields_of(text: str) -> Set[str]:
+    """Names of the placeholders in a format string"""
+    return {
+        re.split(r"[.\[]", field)[0]
+        for (_, field, _, _) in Formatter().parse(text)
+        if field is not None
+    }
+
+
+def all_placeholders(
+    source_file: str, timestamp: float, root_dir: str = ""
+) -> Dict[str, Any]:
+    """Values of every placeholder, e.g. to pass to a Python callable"""
+    info = FileInfo(source_file, os.path.abspath(root_dir))
+    return {
+        **{k: fn(info) for (k, fn) in FILE_PLACEHOLDERS.items()},
+        **{k: fn(timestamp) for (k, fn) in RUN_PLACEHOLDERS.items()},
+    }
@@ -0,0 +1,129 @@
+"""
+An `Executor` for coroutine functions, run on one event loop in a background
+thread. Like `ThreadPoolExecutor`, `submit` returns a `concurrent.futures.Future`
+and at most `max_workers` tasks run at once. But a waiting task costs only a
+coroutine, not a thread, so `max_workers` can be in the thousands.
+"""
+
+import asyncio
+from concurrent.futures import Executor, Future, wait
+import os
+import sys
+from threading import Event, Lock, Thread
+from typing import Any, Awaitable, Callable, Optional, Set
+
+
+class AsyncioExecutor(Executor):
+    def __init__(self, max_workers: int, thread_name: str = "AsyncioExecutor"):
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        self._max_workers = max_workers
+        self._loop = asyncio.new_event_loop()
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._waiting: Set[asyncio.Task] = set()
+        self._futures: Set[Future] = set()
+        self._lock = Lock()
+        self._shutdown = False
+        self._cancelling = False
+        self._ready = Event()
+        self._thread = Thread(target=self._run_loop, name=thread_name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def submit(  # type: ignore[override]
+        self, fn: Callable[..., Awaitable[Any]], /, *args, **kwargs
+    ) -> Future:
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            future = asyncio.run_coroutine_threadsafe(
+                self._run(fn, *args, **kwargs), self._loop
+            )
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            self._shutdown = True
+        if not self._thread.is_alive():
+            return  # already shut down, as a second call to an Executor's is
+        if cancel_futures:
+            asyncio.run_coroutine_threadsafe(
+                self._cancel_waiting(), self._loop
+            ).result()
+        if wait:
+            self._wait_all()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        else:
+            Thread(target=self._stop_when_done, daemon=True).start()
+
+    async def _run(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        assert self._sem is not None
+        if self._cancelling:
+            raise asyncio.CancelledError()
+        task = asyncio.current_task()
+        assert task is not None
+        self._waiting.add(task)
+        try:
+            await self._sem.acquire()
+        finally:
+            self._waiting.discard(task)
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            self._sem.release()
+
+    async def _cancel_waiting(self):
+        # Note: runs on the loop thread, so no task can start meanwhile
+        self._cancelling = True
+        for task in list(self._waiting):
+            task.cancel()
+
+    def _forget(self, future: Future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _wait_all(self):
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if len(futures) == 0:
+                return
+            wait(futures)
+
+    def _stop_when_done(self):
+        self._wait_all()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        use_pidfd_child_watcher(self._loop)
+        self._sem = asyncio.Semaphore(self._max_workers)
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+
+
+def use_pidfd_child_watcher(loop: asyncio.AbstractEventLoop):
+    """
+    Before Python 3.12, asyncio waits for each child process on a thread of its
+    own, which defeats the point of running many children on one loop. Where
+    Linux supports pidfds, use the watcher that waits on the loop instead (the
+    default from 3.12).
+    """
+    if sys.platform != "linux" or sys.version_info >= (3, 12):
+        return
+    if not hasattr(os, "pidfd_open"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    asyncio.set_child_watcher(watcher)
+    watcher.attach_loop(loop)
@@ -0,0 +1,62 @@
+"""
+A cgroup v2 for the children of a run, so that limits on CPU, memory and I/O
+hold for all of them together, e.g. `cpu.max = "200000 100000"` for at most
+two CPUs.
+
+The cgroup is created under a parent cgroup given by the user, which must be
+writable by them and have no processes of its own (cgroup v2 does not allow
+controllers to be enabled for the children of a cgroup with processes), e.g.
+a delegated, empty slice. It is removed at the end of the run.
+
+Children move themselves into the cgroup, before running the command, by
+writing to its `cgroup.procs` file (see `limits.py`).
+"""
+
+import errno
+import os
+import os.path
+from time import sleep
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+# Time to wait, in all, for the last children to leave before removing it
+REMOVE_WAIT = 1.0
+
+
+class Cgroup:
+    def __init__(self, parent: str, name: str):
+        if not os.path.exists(os.path.join(CGROUP_ROOT, "cgroup.controllers")):
+            raise OSError(errno.ENOSYS, f"cgroup v2 is not mounted at {CGROUP_ROOT}")
+        self.parent = os.path.join(CGROUP_ROOT, parent.lstrip("/"))
+        self.path = os.path.join(self.parent, name)
+        os.makedirs(self.path, exist_ok=True)
+        self.procs_path = os.path.join(self.path, "cgroup.procs")
+        # fail now, rather than silently in each child, if it is not writable
+        os.close(os.open(self.procs_path, os.O_WRONLY))
+
+    def set_limit(self, file_name: str, value: str):
+        """Write a limit, e.g. `memory.max`, enabling its controller if needed"""
+        controller = file_name.partition(".")[0]
+        enabled = self._read("cgroup.controllers").split()
+        if controller not in enabled:
+            with open(os.path.join(self.parent, "cgroup.subtree_control"), "w") as f:
+                f.write(f"+{controller}")
+        with open(os.path.join(self.path, file_name), "w") as f:
+            f.write(value)
+
+    def close(self):
+        """Remove the cgroup, once its processes have all exited"""
+        waited = 0.0
+        while True:
+            try:
+                os.rmdir(self.path)
+                return
+            except OSError as e:
+                # busy until the last (killed) children are gone
+                if e.errno != errno.EBUSY or waited >= REMOVE_WAIT:
+                    raise
+            sleep(0.1)
+            waited += 0.1
+
+    def _read(self, file_name: str) -> str:
+        with open(os.path.join(self.path, file_name)) as f:
+            return f.read()
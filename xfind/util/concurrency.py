@@ -0,0 +1,171 @@
+"""
+Adaptive concurrency: an AIMD (additive increase, multiplicative decrease)
+controller, which adjusts the limit of an `AdjustableSemaphore` every
+`interval` seconds.
+
+The limit is cut by a quarter when the system is under pressure (Linux PSI for
+cpu or io above HIGH_PRESSURE), or when task throughput fell after the last
+increase. It is raised only when all the permitted workers are busy, and
+throughput did not fall, and pressure (if known) is below LOW_PRESSURE.
+Until the first cut, it doubles instead of adding one ("slow start"), so it
+reaches a high limit quickly.
+"""
+
+from threading import Condition, Event, Thread
+from time import monotonic
+from typing import Callable, Optional, Tuple
+
+from .metrics import Metrics
+from .os_ import read_pressure
+
+HIGH_PRESSURE = 40.0
+LOW_PRESSURE = 20.0
+DECREASE_FACTOR = 0.75
+THROUGHPUT_TOLERANCE = 0.1
+
+Pressure = Optional[Tuple[str, float]]
+
+
+class AdjustableSemaphore:
+    """A semaphore whose limit can be changed while in use"""
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._count = 0
+        self._cond = Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def set_limit(self, limit: int):
+        with self._cond:
+            self._limit = limit
+            self._cond.notify_all()
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            if not blocking and self._count >= self._limit:
+                return False
+            if not self._cond.wait_for(lambda: self._count < self._limit, timeout):
+                return False
+            self._count += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
+
+
+class DoneCounter:
+    """A count of things done, which can be waited on to reach a number"""
+
+    def __init__(self):
+        self._count = 0
+        self._cond = Condition()
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def add(self, n: int = 1):
+        with self._cond:
+            self._count += n
+            self._cond.notify_all()
+
+    def wait_for(self, n: int, timeout: Optional[float] = None) -> bool:
+        """Wait until the count is at least n; False if timed out first"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._count >= n, timeout)
+
+
+class AimdController:
+    def __init__(
+        self,
+        sem: AdjustableSemaphore,
+        metrics: Metrics,
+        *,
+        min_limit: int,
+        max_limit: int,
+        interval: float,
+        on_change: Callable[[int, int, str], None],
+        pressure: Optional[Callable[[], Pressure]] = None,
+    ):
+        self.sem = sem
+        self.metrics = metrics
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.interval = interval
+        self.on_change = on_change
+        self.pressure = system_pressure if pressure is None else pressure
+        self._slow_start = True
+        self._increased = False
+        self._last_rate: Optional[float] = None
+        self._last_done = 0
+        self._last_time = monotonic()
+        self._closed = Event()
+        self._thread = Thread(target=self._run, name="concurrency", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._closed.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def tick(self):
+        """Measure throughput since the last tick, and adjust the limit"""
+        snapshot = self.metrics.snapshot()
+        now = monotonic()
+        done = snapshot["task_seconds"].count
+        rate = (done - self._last_done) / max(now - self._last_time, 1e-9)
+        self._last_done, self._last_time = done, now
+
+        old = self.sem.limit
+        new, reason = self.decide(old, rate, snapshot["tasks_running"], self.pressure())
+        self._increased = new > old
+        if new < old:
+            self._slow_start = False
+        if new != old:
+            self.sem.set_limit(new)
+            self.on_change(old, new, reason)
+
+    def decide(
+        self, limit: int, rate: float, running: int, pressure: Pressure
+    ) -> Tuple[int, str]:
+        """The new limit, and the reason for it"""
+        last_rate, self._last_rate = self._last_rate, rate
+        decreased = max(self.min_limit, int(limit * DECREASE_FACTOR))
+        if pressure is not None and pressure[1] >= HIGH_PRESSURE:
+            return (decreased, f"{pressure[0]} pressure {pressure[1]:.0f}%")
+        if (
+            self._increased
+            and last_rate is not None
+            and rate < last_rate * (1 - THROUGHPUT_TOLERANCE)
+        ):
+            return (
+                decreased,
+                f"throughput fell from {last_rate:.1f} to {rate:.1f} tasks/s",
+            )
+        if running < limit:
+            return (limit, "workers not all busy")
+        if pressure is not None and pressure[1] >= LOW_PRESSURE:
+            return (limit, f"{pressure[0]} pressure {pressure[1]:.0f}%")
+        increased = min(self.max_limit, limit * 2 if self._slow_start else limit + 1)
+        return (increased, f"all workers busy, throughput {rate:.1f} tasks/s")
+
+    def _run(self):
+        while not self._closed.wait(self.interval):
+            self.tick()
+
+
+def system_pressure() -> Pressure:
+    """The highest of cpu and io pressure, where known"""
+    known = [
+        (resource, p)
+        for resource in ("cpu", "io")
+        if (p := read_pressure(resource)) is not None
+    ]
+    return max(known, key=lambda rp: rp[1]) if len(known) > 0 else None
@@ -0,0 +1,85 @@
+"""
+Matching against many `fnmatch` patterns at once.
+
+A `PatternSet` gives the same answer as `any(fnmatch(name, p) for p in
+patterns)`, but the patterns are normalized and compiled once up front:
+
+- patterns without wildcards are looked up in a set;
+- patterns of the form `literal*` or `*literal` are tested with a single
+  `str.startswith` / `str.endswith` call on a tuple of literals;
+- all other patterns are combined into one alternation regex.
+
+Note the `*` wildcard in `fnmatch` matches any characters including path
+separators.
+"""
+
+from fnmatch import translate
+import os.path
+import re
+from typing import Iterable, List, Optional, Set, Tuple
+
+MAGIC_CHECK = re.compile("[*?[]")
+
+
+class PatternSet:
+    __slots__ = ("patterns", "_exact", "_prefixes", "_suffixes", "_regex")
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = list(patterns)
+        exact: Set[str] = set()
+        prefixes: List[str] = []
+        suffixes: List[str] = []
+        others: List[str] = []
+        for p in self.patterns:
+            p = os.path.normcase(p)
+            kind, literal = _classify(p)
+            if kind == "exact":
+                exact.add(literal)
+            elif kind == "prefix":
+                prefixes.append(literal)
+            elif kind == "suffix":
+                suffixes.append(literal)
+            else:
+                others.append(p)
+
+        self._exact = exact
+        self._prefixes: Optional[Tuple[str, ...]] = (
+            tuple(prefixes) if len(prefixes) > 0 else None
+        )
+        self._suffixes: Optional[Tuple[str, ...]] = (
+            tuple(suffixes) if len(suffixes) > 0 else None
+        )
+        self._regex = (
+            re.compile("|".join(translate(p) for p in others)).match
+            if len(others) > 0
+            else None
+        )
+
+    def match(self, name: str) -> bool:
+        name = os.path.normcase(name)
+        return (
+            name in self._exact
+            or (self._prefixes is not None and name.startswith(self._prefixes))
+            or (self._suffixes is not None and name.endswith(self._suffixes))
+            or (self._regex is not None and self._regex(name) is not None)
+        )
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def __repr__(self) -> str:
+        return f"PatternSet({self.patterns!r})"
+
+
+def _classify(p: str) -> Tuple[str, str]:
+    if MAGIC_CHECK.search(p) is None:
+        return ("exact", p)
+    if "?" in p or "[" in p:
+        return ("regex", p)
+    head = p.rstrip("*")
+    if len(head) < len(p) and "*" not in head:
+        return ("prefix", head)
+    tail = p.lstrip("*")
+    if len(tail) < len(p) and "*" not in tail:
+        return ("suffix", tail)
+    return ("regex", p)
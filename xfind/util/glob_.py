@@ -0,0 +1,470 @@
+"""
+A port of the standard library `glob.iglob` onto `os.scandir`.
+
+Matches are the same, and in the same order, as `glob.iglob` (hidden names
+are skipped unless the pattern itself starts with a dot). But each match is
+yielded as an `Entry` which keeps the `os.DirEntry` it was listed from, so
+`is_file()` / `is_dir()` are answered from the cached directory listing
+instead of another `stat` per path. As well, `**` only descends into entries
+known to be directories, instead of trying to list every file.
+
+The one intended difference from `glob.iglob` is with symlink loops: `**`
+does not follow a symlink back to a directory it is already inside, where
+`glob.iglob` keeps descending until the OS refuses the path.
+
+An optional `prune` predicate is called before each directory is listed, with
+the directory path plus trailing separator (i.e. the prefix of every path
+below it). If it returns True the directory is not listed, so nothing below
+it is matched. The directory itself can still be matched.
+
+With `workers` > 1, directories are listed ahead of time on a thread pool,
+up to a fixed window of listings. If `ordered`, matches come out in exactly
+the same order as the sequential walk. Otherwise, the walk descends first
+into whichever directory listing is ready, so a slow directory does not hold
+up the others; the set of matches is the same.
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import os
+import os.path
+from fnmatch import translate
+import re
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+
+class DirEntryLike(Protocol):
+    """What the walk uses of an `os.DirEntry`, so listings can come from a cache"""
+
+    @property
+    def name(self) -> str: ...
+
+    @property
+    def path(self) -> str: ...
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool: ...
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool: ...
+
+    def is_symlink(self) -> bool: ...
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result: ...
+
+
+Found = Tuple[str, Optional[DirEntryLike]]
+Prune = Optional[Callable[[str], bool]]
+# Lists a directory, like `list(os.scandir(dirname or os.curdir))`
+Scandir = Callable[[str], Sequence[DirEntryLike]]
+
+T = TypeVar("T")
+
+MAGIC_CHECK = re.compile("([*?[])")
+
+
+class Entry:
+    __slots__ = ("path", "_dir_entry")
+
+    def __init__(self, path: str, dir_entry: Optional[DirEntryLike] = None):
+        self.path = path
+        self._dir_entry = dir_entry
+
+    def is_dir(self) -> bool:
+        if self._dir_entry is None:
+            return os.path.isdir(self.path)
+        try:
+            return self._dir_entry.is_dir()
+        except OSError:
+            return False
+
+    def is_file(self) -> bool:
+        if self._dir_entry is None:
+            return os.path.isfile(self.path)
+        try:
+            return self._dir_entry.is_file()
+        except OSError:
+            return False
+
+    def stat(self) -> os.stat_result:
+        if self._dir_entry is None:
+            return os.stat(self.path)
+        return self._dir_entry.stat()
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __repr__(self) -> str:
+        return f"<Entry {self.path!r}>"
+
+
+def iglob(
+    pathname: str,
+    *,
+    recursive: bool = False,
+    prune: Prune = None,
+    workers: int = 1,
+    ordered: bool = False,
+    scandir: Optional[Scandir] = None,
+) -> Iterator[Entry]:
+    scandir = _scandir if scandir is None else scandir
+    walker = (
+        _Walker(prune, scandir)
+        if workers <= 1
+        else _ParallelWalker(prune, scandir, workers, ordered)
+    )
+    return _entries(pathname, recursive, walker)
+
+
+def has_magic(s: str) -> bool:
+    return MAGIC_CHECK.search(s) is not None
+
+
+class PathMatcher:
+    """
+    Whether paths would be matched by `iglob(pathname, recursive=True)`,
+    without listing any directories, e.g. for paths of files as they are
+    created. Paths must be spelled as the walk would yield them, i.e. start
+    with the same literal prefix as `pathname`.
+    """
+
+    def __init__(self, pathname: str):
+        self._parts: List[Optional[Callable[[str], bool]]] = [
+            None if _isrecursive(p) else _part_matcher(p)
+            for p in _split(pathname)
+        ]
+
+    def match(self, path: str) -> bool:
+        return self._match(0, _split(path), 0, prefix=False)
+
+    def could_contain(self, dirname: str) -> bool:
+        """Whether anything below the directory could match"""
+        return self._match(0, _split(dirname), 0, prefix=True)
+
+    def _match(self, i: int, names: List[str], j: int, *, prefix: bool) -> bool:
+        parts = self._parts
+        while True:
+            if j == len(names):
+                # with prefix, something more must be left to match below
+                return (
+                    i < len(parts)
+                    if prefix
+                    else all(p is None for p in parts[i:])
+                )
+            if i == len(parts):
+                return False
+            part = parts[i]
+            if part is None:
+                # `**` matches no names, or one more visible one
+                if self._match(i + 1, names, j, prefix=prefix):
+                    return True
+                if _ishidden(names[j]):
+                    return False
+                j += 1
+            elif part(names[j]):
+                i += 1
+                j += 1
+            else:
+                return False
+
+
+def _split(path: str) -> List[str]:
+    return os.path.normcase(path).split(os.sep)
+
+
+def _part_matcher(part: str) -> Callable[[str], bool]:
+    part = os.path.normcase(part)
+    if not has_magic(part):
+        return part.__eq__
+    match = re.compile(translate(part)).match
+    if _ishidden(part):
+        return lambda name: match(name) is not None
+    return lambda name: name[:1] != "." and match(name) is not None
+
+
+class _Walker:
+    """Lists directories one at a time, as the walk reaches them"""
+
+    ordered = True
+
+    def __init__(self, prune: Prune, scandir: Scandir):
+        self.prune = prune
+        self.scandir = scandir
+
+    def pruned(self, dirname: str) -> bool:
+        return self.prune is not None and self.prune(os.path.join(dirname, ""))
+
+    def listdir(self, dirname: str, dironly: bool) -> Sequence[DirEntryLike]:
+        return _listdir(dirname, dironly, self.scandir)
+
+    def prefetch(self, dirname: str, dironly: bool):
+        pass
+
+    def schedule(
+        self, items: Iterable[T], key: Callable[[T], str], dironly: bool
+    ) -> Iterator[T]:
+        """Order in which to visit directories (each item has a dir path key)"""
+        return iter(items)
+
+    def close(self):
+        pass
+
+
+class _ParallelWalker(_Walker):
+    """Lists directories ahead of the walk on a thread pool"""
+
+    def __init__(self, prune: Prune, scandir: Scandir, workers: int, ordered: bool):
+        super().__init__(prune, scandir)
+        self.ordered = ordered
+        self._window = workers * 4
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="walk"
+        )
+        self._pending: Dict[Tuple[str, bool], "Future[Sequence[DirEntryLike]]"] = {}
+
+    def listdir(self, dirname: str, dironly: bool) -> Sequence[DirEntryLike]:
+        future = self._pending.pop((dirname, dironly), None)
+        if future is None:
+            return _listdir(dirname, dironly, self.scandir)
+        return future.result()
+
+    def prefetch(self, dirname: str, dironly: bool):
+        k = (dirname, dironly)
+        if k in self._pending or len(self._pending) >= self._window:
+            return
+        self._pending[k] = self._executor.submit(
+            _listdir, dirname, dironly, self.scandir
+        )
+
+    def schedule(
+        self, items: Iterable[T], key: Callable[[T], str], dironly: bool
+    ) -> Iterator[T]:
+        it = iter(items)
+        buf: Deque[T] = deque()
+
+        def _fill():
+            while len(buf) < self._window:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                self.prefetch(key(item), dironly)
+                buf.append(item)
+
+        _fill()
+        while buf:
+            if self.ordered:
+                yield buf.popleft()
+            else:
+                yield self._take_ready(buf, key, dironly)
+            _fill()
+
+    def _take_ready(
+        self, buf: Deque[T], key: Callable[[T], str], dironly: bool
+    ) -> T:
+        for item in buf:
+            self.prefetch(key(item), dironly)  # in case the window has room now
+        futures = {}
+        for item in buf:
+            future = self._pending.get((key(item), dironly), None)
+            if future is None:
+                continue
+            if future.done():
+                buf.remove(item)
+                return item
+            futures[future] = item
+        if len(futures) == 0:
+            return buf.popleft()
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        item = futures[next(iter(done))]
+        buf.remove(item)
+        return item
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
+
+
+def _entries(pathname: str, recursive: bool, walker: _Walker) -> Iterator[Entry]:
+    try:
+        it = _iglob(pathname, recursive, False, walker)
+        if recursive and _isrecursive(pathname):
+            s, _ = next(it)  # skip empty string
+            assert not s
+        for path, dir_entry in it:
+            yield Entry(path, dir_entry)
+    finally:
+        walker.close()
+
+
+def _iglob(
+    pathname: str, recursive: bool, dironly: bool, walker: _Walker
+) -> Iterator[Found]:
+    dirname, basename = os.path.split(pathname)
+    if not has_magic(pathname):
+        if basename:
+            if os.path.lexists(pathname):
+                yield (pathname, None)
+        else:
+            # Patterns ending with a slash should match only directories
+            if os.path.isdir(dirname):
+                yield (pathname, None)
+        return
+
+    if not dirname:
+        if walker.pruned(dirname):
+            return
+        if recursive and _isrecursive(basename):
+            yield from _glob2(dirname, basename, dironly, walker)
+        else:
+            yield from _glob1(dirname, basename, dironly, walker)
+        return
+
+    # `os.path.split()` returns the argument itself as a dirname if it is a
+    # drive or UNC path. Prevent an infinite recursion if a drive or UNC path
+    # contains magic characters (i.e. r'\\?\C:').
+    dirs: Iterable[str]
+    if dirname != pathname and has_magic(dirname):
+        dirs = (d for (d, _) in _iglob(dirname, recursive, True, walker))
+    else:
+        dirs = [dirname]
+
+    glob_in_dir: Callable[[str, str, bool, _Walker], Iterable[Found]]
+    if has_magic(basename):
+        if recursive and _isrecursive(basename):
+            glob_in_dir = _glob2
+        else:
+            glob_in_dir = _glob1
+        dirs = walker.schedule(
+            (d for d in dirs if not walker.pruned(d)), _identity, dironly
+        )
+    else:
+        glob_in_dir = _glob0
+        dirs = (d for d in dirs if not walker.pruned(d))
+
+    for dirname in dirs:
+        for name, dir_entry in glob_in_dir(dirname, basename, dironly, walker):
+            yield (os.path.join(dirname, name), dir_entry)
+
+
+def _glob0(
+    dirname: str, basename: str, dironly: bool, walker: _Walker
+) -> List[Found]:
+    if basename:
+        if os.path.lexists(os.path.join(dirname, basename)):
+            return [(basename, None)]
+    else:
+        # `os.path.split()` returns an empty basename for paths ending with a
+        # directory separator. 'q*x/' should match only directories.
+        if os.path.isdir(dirname):
+            return [(basename, None)]
+    return []
+
+
+def _glob1(
+    dirname: str, pattern: str, dironly: bool, walker: _Walker
+) -> List[Found]:
+    entries: Iterable[DirEntryLike] = walker.listdir(dirname, dironly)
+    if not _ishidden(pattern):
+        entries = (e for e in entries if not _ishidden(e.name))
+    match = re.compile(translate(os.path.normcase(pattern))).match
+    return [(e.name, e) for e in entries if match(os.path.normcase(e.name))]
+
+
+def _glob2(
+    dirname: str, pattern: str, dironly: bool, walker: _Walker
+) -> Iterator[Found]:
+    assert _isrecursive(pattern)
+    yield (pattern[:0], None)
+    yield from _rlistdir(dirname, dironly, walker)
+
+
+def _rlistdir(dirname: str, dironly: bool, walker: _Walker) -> Iterator[Found]:
+    entries = []
+    subdirs: Dict[str, str] = {}
+    for e in walker.listdir(dirname, dironly):
+        if _ishidden(e.name):
+            continue
+        if _is_dir(e):
+            if _is_loop(dirname, e):
+                if dironly:
+                    # don't match anything inside the loop either
+                    continue
+            else:
+                path = os.path.join(dirname, e.name) if dirname else e.name
+                if not walker.pruned(path):
+                    subdirs[e.name] = path
+                    walker.prefetch(path, dironly)
+        entries.append(e)
+
+    if walker.ordered:
+        for e in entries:
+            yield (e.name, e)
+            if e.name in subdirs:
+                for y, dir_entry in _rlistdir(subdirs[e.name], dironly, walker):
+                    yield (os.path.join(e.name, y), dir_entry)
+    else:
+        for e in entries:
+            yield (e.name, e)
+        for x in walker.schedule(subdirs, subdirs.__getitem__, dironly):
+            for y, dir_entry in _rlistdir(subdirs[x], dironly, walker):
+                yield (os.path.join(x, y), dir_entry)
+
+
+def _listdir(
+    dirname: str, dironly: bool, scandir: Scandir
+) -> Sequence[DirEntryLike]:
+    entries = scandir(dirname)
+    return [e for e in entries if _is_dir(e)] if dironly else entries
+
+
+def _scandir(dirname: str) -> List[os.DirEntry]:
+    try:
+        with os.scandir(dirname or os.curdir) as it:
+            return list(it)
+    except OSError:
+        return []
+
+
+def _is_loop(dirname: str, e: DirEntryLike) -> bool:
+    """True if e is a symlink to dirname or to any directory above it"""
+    if not e.is_symlink():
+        return False
+    target = os.path.realpath(e.path)
+    d = dirname or os.curdir
+    while True:
+        if os.path.realpath(d) == target:
+            return True
+        parent = os.path.dirname(d) or os.curdir
+        if parent == d:
+            return False
+        d = parent
+
+
+def _is_dir(e: DirEntryLike) -> bool:
+    try:
+        return e.is_dir()
+    except OSError:
+        return False
+
+
+def _identity(x: T) -> T:
+    return x
+
+
+def _ishidden(name: str) -> bool:
+    return name[0] == "."
+
+
+def _isrecursive(pattern: str) -> bool:
+    return pattern == "**"
@@ -1,9 +1,122 @@
-from itertools import islice
-from typing import TypeVar, Iterator, List
+import heapq
+from itertools import count, islice
+from queue import Queue, Empty
+from threading import Event, Thread
+from typing import (
+    Any,
+    Callable,
+    Generator,
+    TypeVar,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
 A = TypeVar("A")
+K = TypeVar("K")
 
 
 def chunk(it: Iterator[A], n: int) -> Iterator[List[A]]:
     while c := list(islice(it, n)):
         yield c
+
+
+def background(it: Iterable[A], maxsize: int) -> Generator[A, None, None]:
+    """
+    Run the iterator in a separate thread, buffering up to maxsize items ahead
+    of the consumer. Errors raised by the iterator are re-raised to the
+    consumer. If the consumer stops early, the thread is stopped too.
+    """
+    q: Queue = Queue(maxsize=maxsize)
+    stop = Event()
+
+    def _produce():
+        try:
+            for x in it:
+                if stop.is_set():
+                    break
+                q.put((True, x))
+            q.put((False, None))
+        except BaseException as e:
+            q.put((False, e))
+        finally:
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()
+
+    t = Thread(target=_produce, name="background", daemon=True)
+    t.start()
+    try:
+        while True:
+            ok, x = q.get()
+            if not ok:
+                if x is not None:
+                    raise x
+                return
+            yield x
+    finally:
+        stop.set()
+        while t.is_alive():
+            try:
+                q.get(timeout=0.1)
+            except Empty:
+                pass
+
+
+def chunk_by_size(
+    it: Iterable[A], n: Optional[int], max_size: int, size: Callable[[A], int]
+) -> Iterator[List[A]]:
+    """
+    Like chunk, but also limit the total size of each chunk. An item bigger
+    than max_size on its own still gets a chunk of its own.
+    """
+    c: List[A] = []
+    total = 0
+    for x in it:
+        s = size(x)
+        if len(c) > 0 and ((n is not None and len(c) >= n) or total + s > max_size):
+            yield c
+            c = []
+            total = 0
+        c.append(x)
+        total += s
+    if len(c) > 0:
+        yield c
+
+
+def largest_first(
+    it: Iterable[A], window: int, key: Callable[[A], K]
+) -> Iterator[Tuple[K, A]]:
+    """
+    Reorder items so that of each `window` items read ahead, the one with the
+    largest key comes next. Yields (key, item). Items with equal keys keep
+    their order.
+    """
+    heap: List[Tuple[Any, int, K, A]] = []
+    seq = count()
+    for x in it:
+        k = key(x)
+        heapq.heappush(heap, (Reversed(k), next(seq), k, x))
+        if len(heap) >= window:
+            _, _, k, x = heapq.heappop(heap)
+            yield (k, x)
+    while len(heap) > 0:
+        _, _, k, x = heapq.heappop(heap)
+        yield (k, x)
+
+
+class Reversed:
+    """Orders the wrapped value in reverse, for a max-heap with heapq"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other: "Reversed") -> bool:
+        return bool(other.value < self.value)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Reversed) and self.value == other.value
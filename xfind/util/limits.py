@@ -0,0 +1,161 @@
+"""
+Limits on the resources each task's child process may use, so a run does not
+starve other work on the host: CPU niceness, I/O scheduling class and priority
+(Linux), and rlimits.
+
+The limits must hold before the command runs any code, so that anything it
+starts is limited too. Setting them between fork and exec (a `preexec_fn`) is
+not safe in a process with threads, and stops subprocess from using vfork;
+setting them from the parent once the child has started leaves a moment in
+which the command runs unlimited. So instead the command is wrapped: run by
+`/bin/sh`, which moves itself into the cgroup (by writing to its
+`cgroup.procs`, see `cgroup.py`) and sets the rlimits with `ulimit`, then
+execs the command through `nice` and `ionice`. This costs a shell and up to
+two more execs per task, only when limits are set.
+
+The parent checks beforehand, with the `check_*` functions, what it can set,
+so the wrapper ignores failures (e.g. the cgroup was removed) and runs the
+command regardless.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import platform
+import shlex
+import shutil
+import sys
+from typing import List, NamedTuple, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None  # type: ignore
+
+IOPRIO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+
+# ioprio_set and ioprio_get system call numbers, by machine
+IOPRIO_SYSCALLS = {
+    "x86_64": (251, 252),
+    "i386": (289, 290),
+    "i686": (289, 290),
+    "aarch64": (30, 31),
+    "riscv64": (30, 31),
+    "armv7l": (314, 315),
+    "ppc64le": (273, 274),
+    "s390x": (282, 283),
+}
+
+# The `ulimit` option for each rlimit, and the bytes in each of its units
+ULIMIT_OPTIONS = {"RLIMIT_AS": ("-v", 1024), "RLIMIT_CPU": ("-t", 1)}
+
+
+class ChildLimits(NamedTuple):
+    nice: Optional[int] = None
+    ioprio: Optional[int] = None
+    # (resource, soft limit, hard limit)
+    rlimits: Tuple[Tuple[int, int, int], ...] = ()
+    cgroup_procs: Optional[str] = None
+
+    def wrap(self, argv: List[str]) -> List[str]:
+        """The command line to run argv with the limits set before it starts"""
+        script = []
+        if self.cgroup_procs is not None:
+            # "0" is the process writing it: the shell, then what it execs
+            script.append(f"echo 0 2>/dev/null >{shlex.quote(self.cgroup_procs)}")
+        options = {getattr(resource, k): v for k, v in ULIMIT_OPTIONS.items()}
+        for res, soft, _ in self.rlimits:
+            option, unit = options[res]
+            script.append(f"ulimit -S {option} {soft // unit} 2>/dev/null")
+        script.append('exec "$@"')
+        prefix = []
+        if self.nice is not None:
+            # nice takes an increment, which may be negative (if privileged)
+            increment = self.nice - os.getpriority(os.PRIO_PROCESS, 0)
+            prefix += ["nice", "-n", str(increment)]
+        if self.ioprio is not None:
+            io_class = self.ioprio >> IOPRIO_CLASS_SHIFT
+            prefix += ["ionice", "-c", str(io_class)]
+            if io_class != IOPRIO_CLASSES["idle"]:
+                prefix += ["-n", str(self.ioprio & ((1 << IOPRIO_CLASS_SHIFT) - 1))]
+        return ["/bin/sh", "-c", "; ".join(script), "sh", *prefix, *argv]
+
+
+def parse_ioprio(spec: str) -> int:
+    """`CLASS[:LEVEL]`, as ionice: idle, best-effort:0-7 or realtime:0-7"""
+    name, sep, level = spec.partition(":")
+    if name not in IOPRIO_CLASSES:
+        raise ValueError(
+            f"I/O class must be one of {', '.join(IOPRIO_CLASSES)}, not {name!r}"
+        )
+    n = 0
+    if sep:
+        if name == "idle" or not level.isdigit() or int(level) > 7:
+            raise ValueError(f"I/O priority level must be from 0 to 7: {spec!r}")
+        n = int(level)
+    elif name != "idle":
+        n = 4  # the kernel's default level
+    return (IOPRIO_CLASSES[name] << IOPRIO_CLASS_SHIFT) | n
+
+
+def check_nice(nice: int):
+    """Raise OSError if the nice value cannot be set on children"""
+    if not hasattr(os, "setpriority"):
+        raise OSError(errno.ENOSYS, "niceness is not supported on this platform")
+    if shutil.which("nice") is None:
+        raise OSError(errno.ENOENT, "nice is not installed")
+    current = os.getpriority(os.PRIO_PROCESS, 0)
+    if nice < current and os.geteuid() != 0:
+        raise OSError(
+            errno.EPERM,
+            f"only a privileged process can lower niceness, from {current} to {nice}",
+        )
+
+
+def check_ioprio(ioprio: int):
+    """Raise OSError if the I/O priority cannot be set on children"""
+    ioprio_get()
+    if shutil.which("ionice") is None:
+        raise OSError(errno.ENOENT, "ionice is not installed")
+    if ioprio >> IOPRIO_CLASS_SHIFT == IOPRIO_CLASSES["realtime"] and os.geteuid() != 0:
+        raise OSError(errno.EPERM, "only a privileged process can use realtime I/O")
+
+
+def check_rlimit(name: str, limit: int) -> Tuple[int, int, int]:
+    """
+    The resource, and soft and hard limits to set for a limit on it. Raise
+    OSError if the limit cannot be set on children.
+    """
+    if resource is None or not hasattr(resource, name) or name not in ULIMIT_OPTIONS:
+        raise OSError(errno.ENOSYS, f"{name} is not supported on this platform")
+    res = getattr(resource, name)
+    _, hard = resource.getrlimit(res)
+    if hard != resource.RLIM_INFINITY and limit > hard:
+        raise OSError(errno.EPERM, f"{name} {limit} is over the hard limit {hard}")
+    return (res, limit, hard)
+
+
+_libc = None
+
+
+def _syscall(i: int, *args: int) -> int:
+    global _libc
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.ENOSYS, "ioprio is only available on Linux")
+    numbers = IOPRIO_SYSCALLS.get(platform.machine())
+    if numbers is None:
+        raise OSError(errno.ENOSYS, f"ioprio is not known on {platform.machine()}")
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    ret: int = _libc.syscall(numbers[i], *args)
+    if ret < 0:
+        e = ctypes.get_errno()
+        raise OSError(e, os.strerror(e))
+    return ret
+
+
+def ioprio_get(pid: int = 0) -> int:
+    return _syscall(1, IOPRIO_WHO_PROCESS, pid)
@@ -0,0 +1,94 @@
+"""
+Logging kept off the hot path of tasks. Records are put on a queue by the
+thread which logs them, and handled (formatted, written to the console or a
+file) by a single listener thread, so workers never wait on a handler's lock
+or a slow console. The queue is in-process, so records go on it as they are,
+unformatted, not prepared for pickling as `QueueHandler` would.
+
+Lines logged per file can be sampled: a record logged with the file as its
+`sample_key` extra is only kept for about 1 in `every` files, chosen by a
+stable hash of the path, so the lines for a file are kept or dropped
+together. Warnings and errors are always kept.
+"""
+
+from contextlib import ExitStack, contextmanager
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+import shlex
+from typing import Iterator, List, Sequence
+
+from .shard import shard_of
+
+SAMPLE_KEY = "sample_key"
+
+
+class Joined:
+    """A command, shell-quoted only if the record it is logged in is formatted"""
+
+    __slots__ = ("args",)
+
+    def __init__(self, args: Sequence[str]):
+        self.args = args
+
+    def __str__(self) -> str:
+        return shlex.join(self.args)
+
+
+class LocalQueueHandler(QueueHandler):
+    """A QueueHandler for a queue in the same process"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SampleFilter(logging.Filter):
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, SAMPLE_KEY, None)
+        return (
+            key is None
+            or record.levelno >= logging.WARNING
+            or sampled(key, self.every)
+        )
+
+
+def sampled(key: str, every: int) -> bool:
+    return every <= 1 or shard_of(key, every) == 1
+
+
+@contextmanager
+def queued(loggers: List[logging.Logger], *, sample_every: int = 1) -> Iterator[None]:
+    """
+    Move the handlers of the loggers to a queue listener while in the context.
+    On leaving, the records still queued are handled, and the handlers put back.
+    """
+    with ExitStack() as stack:
+        for logger in loggers:
+            if len(logger.handlers) > 0:
+                stack.enter_context(_queued(logger, sample_every))
+        yield
+
+
+@contextmanager
+def _queued(logger: logging.Logger, sample_every: int) -> Iterator[None]:
+    handlers = list(logger.handlers)
+    queue: SimpleQueue = SimpleQueue()
+    listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    handler = LocalQueueHandler(queue)
+    if sample_every > 1:
+        handler.addFilter(SampleFilter(sample_every))
+    for h in handlers:
+        logger.removeHandler(h)
+    logger.addHandler(handler)
+    listener.start()
+    try:
+        yield
+    finally:
+        logger.removeHandler(handler)
+        listener.stop()
+        for h in handlers:
+            logger.addHandler(h)
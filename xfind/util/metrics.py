@@ -0,0 +1,203 @@
+"""
+Runtime counters for a run, cheap enough to leave on: each update is a few
+integer additions under one lock, and task durations go into a histogram with
+fixed buckets (as Prometheus does), not a list of samples.
+"""
+
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from functools import wraps
+import inspect
+from threading import Lock
+from time import monotonic
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+    900.0,
+    3600.0,
+)
+
+FILE_STATES = ("discovered", "dispatched", "succeeded", "failed", "cancelled")
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, v: float):
+        self.counts[bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+        self.max = max(self.max, v)
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, count of observations <= bound), as Prometheus buckets"""
+        out = []
+        total = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (at most the max)"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def copy(self) -> "Histogram":
+        h = Histogram(self.buckets)
+        h.counts = list(self.counts)
+        h.sum, h.count, h.max = self.sum, self.count, self.max
+        return h
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = Lock()
+        self._start = monotonic()
+        self._files: Counter = Counter()
+        self._tasks: Counter = Counter()
+        self._seconds: Dict[str, float] = defaultdict(float)
+        self._task_seconds = Histogram()
+
+    def add_files(self, state: str, n: int = 1):
+        with self._lock:
+            self._files[state] += n
+
+    def add_tasks(self, state: str, n: int = 1):
+        with self._lock:
+            self._tasks[state] += n
+
+    def add_seconds(self, phase: str, seconds: float):
+        with self._lock:
+            self._seconds[phase] += seconds
+
+    def timed_iter(self, it: Iterable[T], phase: str) -> Iterator[T]:
+        """Count the time spent waiting on `next(it)` to `phase`"""
+        it = iter(it)
+        while True:
+            t0 = monotonic()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add_seconds(phase, monotonic() - t0)
+                return
+            self.add_seconds(phase, monotonic() - t0)
+            yield item
+
+    def timed_task(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap a task function (or coroutine function) to count and time it"""
+        if inspect.iscoroutinefunction(fn):
+
+            @wraps(fn)
+            async def _async(*args, **kwargs):
+                t0 = self.task_started()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.task_finished(monotonic() - t0)
+
+            return _async
+
+        @wraps(fn)
+        def _sync(*args, **kwargs):
+            t0 = self.task_started()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.task_finished(monotonic() - t0)
+
+        return _sync
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = monotonic() - self._start
+            files = {s: self._files[s] for s in FILE_STATES}
+            retried = self._files["retried"]
+            retry_succeeded = self._files["retry_succeeded"]
+            tasks = dict(self._tasks)
+            seconds = dict(self._seconds)
+            hist = self._task_seconds.copy()
+        submitted = tasks.get("submitted", 0)
+        started = tasks.get("started", 0)
+        finished = tasks.get("finished", 0)
+        cancelled = tasks.get("cancelled", 0)
+        return {
+            "elapsed_seconds": elapsed,
+            "files": files,
+            "tasks_submitted": submitted,
+            "tasks_pending": max(submitted - started - cancelled, 0),
+            "tasks_running": started - finished,
+            "walk_files_per_second": files["discovered"] / elapsed if elapsed else 0.0,
+            "discover_seconds": seconds.get("discover", 0.0),
+            "dispatch_wait_seconds": seconds.get("dispatch_wait", 0.0),
+            "files_retried": retried,
+            "files_retry_succeeded": retry_succeeded,
+            "task_seconds": hist,
+        }
+
+    def task_started(self) -> float:
+        with self._lock:
+            self._tasks["started"] += 1
+        return monotonic()
+
+    def task_finished(self, seconds: Optional[float]):
+        """Count a task finished, and its wall time if it ran"""
+        with self._lock:
+            self._tasks["finished"] += 1
+            if seconds is not None:
+                self._task_seconds.observe(seconds)
+
+
+def summary(snapshot: Dict[str, Any]) -> str:
+    files = snapshot["files"]
+    hist: Histogram = snapshot["task_seconds"]
+    parts = [
+        ", ".join(f"{files[s]} {s}" for s in FILE_STATES),
+        f"discovery {snapshot['discover_seconds']:.1f}s "
+        f"({snapshot['walk_files_per_second']:.0f} files/s)",
+        f"waiting for workers {snapshot['dispatch_wait_seconds']:.1f}s",
+    ]
+    if hist.count > 0:
+        parts.append(
+            f"task time mean {hist.sum / hist.count:.3g}s, "
+            f"p50 <= {hist.quantile(0.5):.3g}s, "
+            f"p95 <= {hist.quantile(0.95):.3g}s, "
+            f"max {hist.max:.3g}s"
+        )
+    return "; ".join(parts)
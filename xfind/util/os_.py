@@ -0,0 +1,71 @@
+import os
+import sys
+from typing import Iterable, Optional
+
+# Windows command line limit, in characters
+WIN_COMMAND_LINE_MAX = 32767
+
+# Headroom left for the exec call itself, following xargs
+ARG_HEADROOM = 2048
+
+
+def arg_max() -> int:
+    """Bytes available for a child process's arguments and environment"""
+    if sys.platform == "win32":
+        return WIN_COMMAND_LINE_MAX
+    try:
+        n = os.sysconf("SC_ARG_MAX")
+    except (AttributeError, ValueError, OSError):
+        n = -1
+    return n if n > 0 else 128 * 1024
+
+
+def arg_strlen_max() -> Optional[int]:
+    """
+    Bytes allowed in any one argument, including its NUL, where the OS limits
+    it: on Linux, MAX_ARG_STRLEN is 32 pages (128 KiB)
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        page = os.sysconf("SC_PAGESIZE")
+    except (AttributeError, ValueError, OSError):
+        page = -1
+    return 32 * (page if page > 0 else 4096)
+
+
+def arg_size(arg: str) -> int:
+    """Bytes taken by one argument in an exec call: string, NUL and pointer"""
+    if sys.platform == "win32":
+        return len(arg) + 3  # quotes and separating space
+    return len(os.fsencode(arg)) + 1 + 8
+
+
+def args_size(args: Iterable[str]) -> int:
+    return sum(arg_size(a) for a in args)
+
+
+def arg_budget() -> int:
+    """Bytes available for a child process's arguments in this environment"""
+    env = args_size(f"{k}={v}" for (k, v) in os.environ.items())
+    return max(arg_max() - env - ARG_HEADROOM, 4096)
+
+
+def read_pressure(resource: str) -> Optional[float]:
+    """
+    Linux pressure stall information: the percentage of the last 10 seconds in
+    which some tasks were stalled waiting on `resource` ("cpu", "io" or
+    "memory"). None where PSI is not available.
+    """
+    try:
+        with open(f"/proc/pressure/{resource}", encoding="ascii") as f:
+            for line in f:
+                kind, *fields = line.split()
+                if kind == "some":
+                    for field in fields:
+                        k, _, v = field.partition("=")
+                        if k == "avg10":
+                            return float(v)
+    except (OSError, ValueError):
+        pass
+    return None
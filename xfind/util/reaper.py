@@ -0,0 +1,142 @@
+"""
+Kills child process groups which run past their deadline.
+
+Each child to watch must be started as the leader of its own process group
+(`start_new_session=True`), so that its own children are killed along with it.
+A child still running at its deadline is sent SIGTERM, then SIGKILL if it is
+still running `grace` seconds later. `stop_all` applies the same escalation to
+every child at once, e.g. at a hard stop time.
+
+On Windows, CTRL_BREAK_EVENT is sent to the group instead of SIGTERM, and the
+child (only) is terminated instead of SIGKILL.
+"""
+
+from contextlib import contextmanager
+import os
+import signal
+import subprocess
+import sys
+from threading import Condition, Thread
+from time import monotonic
+from typing import Dict, Iterator, Optional
+
+TIMEOUT = "timeout"
+STOP = "stop"
+
+
+class Stopped(Exception):
+    """The task's process was killed at the hard stop time"""
+
+
+class Watch:
+    __slots__ = ("pid", "deadline", "reason", "_stage")
+
+    def __init__(self, pid: int, deadline: Optional[float]):
+        self.pid = pid
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+        self._stage = 0
+
+
+class Reaper:
+    def __init__(self, timeout: Optional[float], grace: float):
+        self.timeout = timeout
+        self.grace = grace
+        self._watches: Dict[int, Watch] = {}
+        self._cond = Condition()
+        self._stopping = False
+        self._closed = False
+        self._thread = Thread(target=self._run, name="reaper", daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def watch(self, pid: int) -> Iterator[Watch]:
+        """Watch the child with `pid` until it has exited"""
+        now = monotonic()
+        w = Watch(pid, None if self.timeout is None else now + self.timeout)
+        with self._cond:
+            if self._stopping:
+                w.reason = STOP
+                w.deadline = now
+            self._watches[pid] = w
+            self._cond.notify()
+        try:
+            yield w
+        finally:
+            with self._cond:
+                del self._watches[pid]
+
+    def stop_all(self):
+        """Kill all children now, and any started from now on"""
+        now = monotonic()
+        with self._cond:
+            self._stopping = True
+            for w in self._watches.values():
+                if w._stage == 0:
+                    w.reason = STOP
+                    w.deadline = now
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                now = monotonic()
+                next_deadline: Optional[float] = None
+                for w in self._watches.values():
+                    if w.deadline is not None and w.deadline <= now:
+                        self._escalate(w, now)
+                    if w.deadline is not None:
+                        next_deadline = (
+                            w.deadline
+                            if next_deadline is None
+                            else min(next_deadline, w.deadline)
+                        )
+                self._cond.wait(
+                    None if next_deadline is None else max(next_deadline - now, 0)
+                )
+
+    def _escalate(self, w: Watch, now: float):
+        if w._stage == 0:
+            w.reason = w.reason or TIMEOUT
+            w._stage = 1
+            w.deadline = now + self.grace
+            terminate_group(w.pid)
+        else:
+            w._stage = 2
+            w.deadline = None
+            kill_group(w.pid)
+
+
+def new_group_kwargs() -> dict:
+    """Keyword arguments to Popen, to start the child in a new process group"""
+    if sys.platform == "win32":
+        flags = subprocess.CREATE_NEW_PROCESS_GROUP  # type: ignore[attr-defined]
+        return {"creationflags": flags}
+    return {"start_new_session": True}
+
+
+def terminate_group(pid: int):
+    try:
+        if sys.platform == "win32":
+            os.kill(pid, signal.CTRL_BREAK_EVENT)  # type: ignore[attr-defined]
+        else:
+            os.killpg(pid, signal.SIGTERM)
+    except OSError:
+        pass  # already gone
+
+
+def kill_group(pid: int):
+    try:
+        if sys.platform == "win32":
+            os.kill(pid, signal.SIGTERM)  # i.e. TerminateProcess
+        else:
+            os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass  # already gone
+
@@ -0,0 +1,74 @@
+"""
+Retrying a task function when its result has one of the given return codes,
+for failures known to be transient (e.g. `EX_TEMPFAIL`, 75). The task is run
+again in the same worker, after a backoff which doubles with each retry,
+with jitter so that tasks which failed together do not all retry together.
+
+The result of the last attempt is returned, with the number of attempts set
+on it as `attempts`. No retry is started which would begin after `stop_time`.
+
+The wrapped function is a `partial` of a module function, so it can be sent
+to a process pool as the unwrapped one can.
+"""
+
+import asyncio
+from functools import partial
+import inspect
+from random import random
+from time import sleep, time
+from typing import Any, Callable, FrozenSet, Optional
+
+
+def retrying(
+    fn: Callable[..., Any],
+    *,
+    exit_codes: FrozenSet[int],
+    max_retries: int,
+    backoff: float,
+    stop_time: Optional[float] = None,
+) -> Callable[..., Any]:
+    """Wrap a task function (or coroutine function) to retry it"""
+    call = _retry_async if inspect.iscoroutinefunction(fn) else _retry
+    return partial(
+        call,
+        fn,
+        exit_codes=exit_codes,
+        max_retries=max_retries,
+        backoff=backoff,
+        stop_time=stop_time,
+    )
+
+
+def _retry(fn, *args, exit_codes, max_retries, backoff, stop_time, **kwargs):
+    attempts = 1
+    result = fn(*args, **kwargs)
+    while result.returncode in exit_codes and attempts <= max_retries:
+        delay = backoff_delay(backoff, attempts)
+        if stop_time is not None and time() + delay >= stop_time:
+            break
+        sleep(delay)
+        attempts += 1
+        result = fn(*args, **kwargs)
+    result.attempts = attempts
+    return result
+
+
+async def _retry_async(
+    fn, *args, exit_codes, max_retries, backoff, stop_time, **kwargs
+):
+    attempts = 1
+    result = await fn(*args, **kwargs)
+    while result.returncode in exit_codes and attempts <= max_retries:
+        delay = backoff_delay(backoff, attempts)
+        if stop_time is not None and time() + delay >= stop_time:
+            break
+        await asyncio.sleep(delay)
+        attempts += 1
+        result = await fn(*args, **kwargs)
+    result.attempts = attempts
+    return result
+
+
+def backoff_delay(backoff: float, attempts: int) -> float:
+    """Delay before the next attempt: half to all of backoff * 2^(attempts-1)"""
+    return backoff * 2.0 ** (attempts - 1) * (0.5 + random() / 2)
@@ -0,0 +1,78 @@
+"""
+Deterministic sharding of paths, so that N runs over the same tree (on one or
+many machines) split it between them with no coordination.
+
+A path is assigned to a shard by a stable hash of its path relative to the
+root directory, with `/` separators, so every run, platform and Python version
+agrees on it. (`hash()` is salted per process, so cannot be used.)
+
+With a `depth`, a path is assigned by its first `depth` components instead,
+so everything below a directory at that depth is in the same shard as the
+directory, and other shards can skip the subtree without listing it.
+"""
+
+from hashlib import blake2b
+import os
+import os.path
+from typing import List, NamedTuple, Optional
+
+
+class Shard(NamedTuple):
+    """Shard `number` of `total`, numbered from 1"""
+
+    number: int
+    total: int
+
+    @classmethod
+    def parse(cls, s: str) -> "Shard":
+        """Parse `K/N`, e.g. `2/8`"""
+        k, sep, n = s.partition("/")
+        if sep and k.strip().isdigit() and n.strip().isdigit():
+            shard = cls(int(k), int(n))
+            if 1 <= shard.number <= shard.total:
+                return shard
+        raise ValueError(f"Shard must be K/N, with 1 <= K <= N, not {s!r}")
+
+    def __str__(self) -> str:
+        return f"{self.number}/{self.total}"
+
+
+def shard_of(key: str, count: int) -> int:
+    """The shard (from 1) of a relative path with `/` separators"""
+    digest = blake2b(key.encode("utf-8", "surrogateescape"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count + 1
+
+
+class ShardFilter:
+    def __init__(self, shard: Shard, root_dir: str, depth: Optional[int] = None):
+        self.shard = shard
+        self.root_dir = root_dir
+        self.depth = depth
+        # Walked paths start with the root dir as given, so it can be cut off
+        self._prefix = os.path.join(root_dir, "") if root_dir else ""
+
+    def __call__(self, path: str) -> bool:
+        """Whether the path is in this shard"""
+        parts = self._parts(path)
+        if self.depth is not None:
+            parts = parts[: self.depth]
+        return shard_of("/".join(parts), self.shard.total) == self.shard.number
+
+    def pruned(self, dir_path: str) -> bool:
+        """
+        Whether a directory (with a trailing separator, as `glob_` prunes) is
+        at `depth` and in another shard, so nothing below it is in this shard
+        """
+        if self.depth is None:
+            return False
+        parts = self._parts(dir_path)
+        return len(parts) == self.depth and not self(dir_path)
+
+    def _parts(self, path: str) -> List[str]:
+        if self._prefix and path.startswith(self._prefix):
+            rel = path[len(self._prefix) :]
+        else:
+            rel = os.path.relpath(path, self.root_dir or os.curdir)
+        if os.altsep is not None:
+            rel = rel.replace(os.altsep, os.sep)
+        return [p for p in rel.split(os.sep) if p not in ("", os.curdir)]
@@ -0,0 +1,271 @@
+"""
+Watching a tree for new and changed paths matching a glob pattern, with
+Linux inotify.
+
+A watch is added on each directory below the pattern's literal prefix which
+could contain a match: so `src/*/*.py` watches `src` and its subdirectories
+only, and hidden directories are skipped unless the pattern names them. New
+directories are watched as they appear, and anything already in them is
+reported, since it was created before the watch. Watches are kept in dicts
+both ways (descriptor to path, and path to descriptor), so events cost a
+lookup however many directories are watched.
+
+The first search walks the same tree, so rather than walk it again, the
+watcher can be `walked`: watches are then added as the search lists each
+directory (by wrapping its scandir with `watching`), just before listing it.
+This needs every part of the pattern below its literal prefix to have magic,
+so that the search lists each directory which could contain a match; for
+other patterns, e.g. `*/setup.py`, where the search only checks whether paths
+exist, the watcher still walks the tree itself.
+
+A file is reported once it is closed after writing, or moved in, and then
+left alone for `debounce` seconds; more writes in that time restart the wait.
+If the kernel's event queue overflows, events were lost, so the tree is
+walked again for anything modified since the last events read.
+"""
+
+import errno
+import os
+import os.path
+from threading import Lock
+from time import monotonic, time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from .glob_ import DirEntryLike, PathMatcher, Prune, Scandir, _scandir, has_magic
+from .inotify import (
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_DONT_FOLLOW,
+    IN_EXCL_UNLINK,
+    IN_IGNORED,
+    IN_ISDIR,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    IN_ONLYDIR,
+    IN_Q_OVERFLOW,
+    Event,
+    Inotify,
+)
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_TO
+    | IN_MOVED_FROM
+    | IN_CREATE
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+    | IN_EXCL_UNLINK
+)
+
+
+class Watcher:
+    def __init__(
+        self,
+        pathname: str,
+        *,
+        find_files: bool,
+        find_dirs: bool,
+        debounce: float,
+        exclude: Optional[Callable[[str], bool]] = None,
+        prune: Prune = None,
+        on_error: Optional[Callable[[OSError], None]] = None,
+        walked: bool = False,
+    ):
+        self.matcher = PathMatcher(pathname)
+        self.find_files = find_files
+        self.find_dirs = find_dirs
+        self.debounce = debounce
+        self.exclude = exclude
+        self.prune = prune
+        self.on_error = on_error
+        self.root = literal_dir(pathname)
+        self._inotify = Inotify()
+        self._wds: Dict[int, str] = {}
+        self._paths: Dict[str, int] = {}
+        # path: when to report it, in order of (increasing) deadline
+        self._pending: Dict[str, float] = {}
+        self._no_space = False
+        self._last_read = time()
+        # the search's walk may list directories from several threads
+        self._lock = Lock()
+        below = pathname[len(self.root) :].lstrip(os.sep).split(os.sep)
+        if walked and all(has_magic(part) for part in below):
+            self._add(self.root)
+        else:
+            for _ in self._add_tree(self.root, since=None):
+                pass
+
+    def __len__(self) -> int:
+        """Number of directories watched"""
+        return len(self._wds)
+
+    def events(self, stop_time: Optional[float] = None) -> Iterator[str]:
+        """New and changed paths, as they settle, until stop_time if given"""
+        while True:
+            yield from self._due(monotonic())
+            if stop_time is not None and time() >= stop_time:
+                return
+            timeouts: List[float] = []
+            if len(self._pending) > 0:
+                timeouts.append(next(iter(self._pending.values())) - monotonic())
+            if stop_time is not None:
+                timeouts.append(stop_time - time())
+            since = self._last_read
+            self._last_read = time()
+            events = self._inotify.read(min(timeouts) if timeouts else None)
+            overflowed = False
+            for event in events:
+                if event.mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                else:
+                    self._handle(event)
+            if overflowed:
+                self._changed(self._add_tree(self.root, since=since))
+
+    def close(self):
+        self._inotify.close()
+
+    def watching(self, scandir: Optional[Scandir] = None) -> Scandir:
+        """
+        Wrap the scandir of a walk of the pattern, to watch each directory
+        which could contain a match before listing it
+        """
+        list_dir = _scandir if scandir is None else scandir
+
+        def _watching(dirname: str) -> Sequence[DirEntryLike]:
+            # `**` lists the directory it starts from as `dirname/`
+            path = dirname.rstrip(os.sep) or dirname
+            with self._lock:
+                if path not in self._paths and self._watchable(path):
+                    self._add(path)
+            return list_dir(dirname)
+
+        return _watching
+
+    def _due(self, now: float) -> Iterator[str]:
+        while len(self._pending) > 0:
+            path, deadline = next(iter(self._pending.items()))
+            if deadline > now:
+                return
+            del self._pending[path]
+            if os.path.lexists(path):
+                yield path
+
+    def _changed(self, paths: Iterator[str]):
+        deadline = monotonic() + self.debounce
+        for path in paths:
+            self._pending.pop(path, None)  # to move it to the end
+            self._pending[path] = deadline
+
+    def _handle(self, event: Event):
+        if event.mask & IN_IGNORED:
+            path = self._wds.pop(event.wd, None)
+            if path is not None and self._paths.get(path) == event.wd:
+                del self._paths[path]
+            return
+        dirname = self._wds.get(event.wd)
+        if dirname is None:
+            return
+        path = os.path.join(dirname, event.name)
+        if event.mask & IN_ISDIR:
+            if event.mask & (IN_CREATE | IN_MOVED_TO):
+                if self._wanted(path, is_dir=True):
+                    self._changed(iter([path]))
+                self._changed(self._add_tree(path, since=None))
+            elif event.mask & IN_MOVED_FROM:
+                self._forget_tree(path)
+        elif event.mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            if self._wanted(path, is_dir=False):
+                self._changed(iter([path]))
+
+    def _wanted(self, path: str, *, is_dir: bool) -> bool:
+        return (
+            (self.find_dirs if is_dir else self.find_files)
+            and self.matcher.match(path)
+            and not (self.exclude is not None and self.exclude(path))
+        )
+
+    def _watchable(self, dirname: str) -> bool:
+        if self.prune is not None and self.prune(os.path.join(dirname, "")):
+            return False
+        return dirname == self.root or self.matcher.could_contain(dirname)
+
+    def _add_tree(self, top: str, *, since: Optional[float]) -> Iterator[str]:
+        """
+        Watch a directory and those below it. Yields the wanted paths below it
+        (modified since `since`, if given).
+        """
+        stack = [top]
+        while len(stack) > 0:
+            dirname = stack.pop()
+            if not self._watchable(dirname) or not self._add(dirname):
+                continue
+            try:
+                with os.scandir(dirname or os.curdir) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for e in entries:
+                path = os.path.join(dirname, e.name)
+                is_dir = _is_dir(e)
+                if is_dir:
+                    stack.append(path)
+                if self._wanted(path, is_dir=is_dir) and (
+                    since is None or _mtime(e) >= since
+                ):
+                    yield path
+
+    def _add(self, dirname: str) -> bool:
+        try:
+            wd = self._inotify.add_watch(dirname or os.curdir, WATCH_MASK)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                # over fs.inotify.max_user_watches: report once, keep going
+                if not self._no_space and self.on_error is not None:
+                    self.on_error(e)
+                self._no_space = True
+            elif e.errno not in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                if self.on_error is not None:
+                    self.on_error(e)
+            return False
+        old = self._wds.get(wd)
+        if old is not None and self._paths.get(old) == wd:
+            del self._paths[old]
+        self._wds[wd] = dirname
+        self._paths[dirname] = wd
+        return True
+
+    def _forget_tree(self, top: str):
+        """Stop watching a directory (moved away) and those below it"""
+        prefix = os.path.join(top, "")
+        for path in [p for p in self._paths if p == top or p.startswith(prefix)]:
+            wd = self._paths.pop(path)
+            self._wds.pop(wd, None)
+            self._inotify.rm_watch(wd)
+        for path in [p for p in self._pending if p.startswith(prefix)]:
+            del self._pending[path]
+
+
+def literal_dir(pathname: str) -> str:
+    """
+    The directory a glob pattern starts from: its longest literal prefix, or
+    "" for the current directory
+    """
+    dirname = os.path.dirname(pathname)
+    while has_magic(dirname):
+        dirname = os.path.dirname(dirname)
+    return dirname
+
+
+def _is_dir(e: os.DirEntry) -> bool:
+    try:
+        return e.is_dir(follow_symlinks=False)
+    except OSError:
+        return False
+
+
+def _mtime(e: os.DirEntry) -> float:
+    try:
+        return e.stat(follow_symlinks=False).st_mtime
+    except OSError:
+        return 0.0